@@ -0,0 +1,198 @@
+import DbFormatConfig
+from DbDecoder import unpackUint
+from DbInfoBinary import writeDbinfoBinary, DbInfoBinaryReader
+from SQLiteAnalyzer import SQLiteAnalyzer
+from Profiler import nullProfiler
+from WalIndex import getWalPath
+import binascii
+import hashlib
+import json
+import os
+
+
+class AnalysisCache(object):
+    """
+    @desc  On-disk cache of SQLiteAnalyzer results in binary dbinfo form
+      (See DbInfoBinary.py).
+      An entry is keyed by DB file identity: real path, size, mtime and
+      the file change counter in the DB header, and those of its WAL
+      (size, mtime and the header; the change counter of a WAL mode DB
+      does not change until checkpoint). Least recently used
+      entries are evicted when the cache grows above maxBytes.
+      When a DB changed since its last analysis, the last result is
+      used for incremental analysis (See SQLiteAnalyzer previousDbinfo).
+
+    @usage
+    cache = AnalysisCache()
+    dbinfo = cache.analyze('/path/to/db.sqlite')  # Analyzes only if needed
+    """
+    def __init__(self,
+                 cacheDir=DbFormatConfig.main["analysisCacheDir"],
+                 maxBytes=DbFormatConfig.main["analysisCacheMaxBytes"]):
+        self._cacheDir = cacheDir
+        self._maxBytes = maxBytes
+
+    def analyze(self, dbpath, preallocDb=False, jobs=1,
+                previousDbinfo=None, filterBtrees=None, readFreelist=True,
+                traverse=False, profiler=None, readWal=True):
+        """
+        @param previousDbinfo  See SQLiteAnalyzer. If None, the latest
+          cached result of dbpath is used if any.
+        @param traverse  See SQLiteAnalyzer. Not a part of the key since
+          the result is the same.
+        @param filterBtrees, readFreelist  See SQLiteAnalyzer.
+          Results of filtered analysis are cached separately, and never
+          used for incremental analysis.
+        @param profiler  See SQLiteAnalyzer. Whether the cache is hit is
+          recorded as info "analysisCache" (no analyzer stage on hit).
+        @param readWal  See SQLiteAnalyzer.
+
+        @return  dbinfo of dbpath (See DbInfoTemplate.py).
+          Pages are read lazily from the cache entry on cache hit.
+        """
+        filterOptions = None
+        if filterBtrees:
+            filterOptions = [sorted(filterBtrees), readFreelist]
+        key = self._key(dbpath, preallocDb, filterOptions, readWal)
+        binPath = self.lookup(key)
+        if profiler is None:
+            profiler = nullProfiler
+        profiler.setInfo("analysisCache",
+                         "miss" if binPath is None else "hit")
+        if binPath is not None:
+            return DbInfoBinaryReader(binPath).getDbinfo()
+
+        latestKeyPath = self._latestKeyPath(dbpath, preallocDb)
+        if previousDbinfo is None and filterOptions is None:
+            previousBinPath = self._lookupLatest(latestKeyPath)
+            if previousBinPath is not None:
+                previousDbinfo = DbInfoBinaryReader(
+                    previousBinPath).getDbinfo()
+
+        analyzer = SQLiteAnalyzer(dbpath, preallocDb=preallocDb, jobs=jobs,
+                                  previousDbinfo=previousDbinfo,
+                                  filterBtrees=filterBtrees,
+                                  readFreelist=readFreelist,
+                                  traverse=traverse,
+                                  profiler=profiler,
+                                  readWal=readWal)
+        # Do not cache a result of DB modified while analysis
+        if self._key(dbpath, preallocDb, filterOptions, readWal) == key:
+            with profiler.stage("store"):
+                self.store(key, analyzer.getDbinfo())
+            if filterOptions is None:
+                with open(latestKeyPath, "w") as f_latest:
+                    f_latest.write(key)
+        return analyzer.getDbinfo()
+
+    def lookup(self, key):
+        """
+        @return  Path to cached binary dbinfo, or None
+        """
+        binPath = self._entryPath(key)
+        if not os.path.exists(binPath):
+            return None
+        os.utime(binPath, None)  # Mark as recently used
+        return binPath
+
+    def store(self, key, dbinfo):
+        if not os.path.isdir(self._cacheDir):
+            os.makedirs(self._cacheDir)
+        binPath = self._entryPath(key)
+        # Readers never see half-written entries
+        tmpPath = "%s.%d.tmp" % (binPath, os.getpid())
+        writeDbinfoBinary(tmpPath, dbinfo)
+        os.rename(tmpPath, binPath)
+        self._evict()
+
+    def _lookupLatest(self, latestKeyPath):
+        if not os.path.exists(latestKeyPath):
+            return None
+        with open(latestKeyPath) as f_latest:
+            return self.lookup(f_latest.read().strip())
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self._cacheDir):
+            if name.endswith(_latestSuffix):
+                with open(os.path.join(self._cacheDir, name)) as f_latest:
+                    key = f_latest.read().strip()
+                if not os.path.exists(self._entryPath(key)):
+                    os.remove(os.path.join(self._cacheDir, name))
+                continue
+            if not name.endswith(_entrySuffix):
+                continue
+            st = os.stat(os.path.join(self._cacheDir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+        totalBytes = sum(size for (mtime, size, name) in entries)
+        # Keep at least the newest entry even if it alone is too big
+        for (mtime, size, name) in sorted(entries)[:-1]:
+            if totalBytes <= self._maxBytes:
+                break
+            os.remove(os.path.join(self._cacheDir, name))
+            totalBytes -= size
+
+    def _key(self, dbpath, preallocDb, filterOptions=None, readWal=True):
+        """
+        @param filterOptions  [sorted filterBtrees, readFreelist], or None
+          for analysis of all pages
+        """
+        keyItems = [_formatVersion, _fileIdentity(dbpath), preallocDb]
+        if filterOptions is not None:
+            keyItems.append(filterOptions)
+        if readWal:
+            keyItems.append(_walIdentity(getWalPath(dbpath)))
+        else:
+            keyItems.append("noWal")
+        return hashlib.sha1(json.dumps(keyItems)).hexdigest()
+
+    def _entryPath(self, key):
+        return os.path.join(self._cacheDir, key + _entrySuffix)
+
+    def _latestKeyPath(self, dbpath, preallocDb):
+        """
+        @return  Path to the file holding the key of the latest entry of
+          dbpath, whatever its content is now
+        """
+        pathKey = hashlib.sha1(json.dumps(
+            [_formatVersion,
+             os.path.realpath(dbpath),
+             preallocDb])).hexdigest()
+        return os.path.join(self._cacheDir, pathKey + _latestSuffix)
+
+
+# Bump when SQLiteAnalyzer output changes to invalidate old entries
+_formatVersion = 4
+
+_entrySuffix = ".dbinfo.bin"
+_latestSuffix = ".latest"
+
+
+def _fileIdentity(path):
+    """
+    @return  [realpath, size, mtime, file change counter]
+    """
+    hFormat = DbFormatConfig.dbHeaderFormat
+    st = os.stat(path)
+    with open(path, "rb") as f_db:
+        f_db.seek(hFormat["fileChangeCounterOffset"])
+        counterData = f_db.read(hFormat["fileChangeCounterLen"])
+    changeCounter = None
+    if len(counterData) == hFormat["fileChangeCounterLen"]:
+        changeCounter = unpackUint(counterData, 0,
+                                   hFormat["fileChangeCounterLen"])
+    return [os.path.realpath(path), st.st_size, st.st_mtime, changeCounter]
+
+
+def _walIdentity(walPath):
+    """
+    @return  [size, mtime, hex of WAL header (with salts and checkpoint
+      sequence)], or None if there is no WAL
+    """
+    try:
+        st = os.stat(walPath)
+        with open(walPath, "rb") as f_wal:
+            header = f_wal.read(DbFormatConfig.walHeaderFormat["len"])
+    except (IOError, OSError):  # Ex: removed by checkpoint meanwhile
+        return None
+    return [st.st_size, st.st_mtime, binascii.hexlify(header)]
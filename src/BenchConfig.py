@@ -0,0 +1,66 @@
+import os
+
+main = {
+    # Synthetic DBs are generated here once and reused
+    # (See Benchmark.py)
+    "workDir": os.path.expanduser("~/.cache/sqlite-visualizer/bench"),
+    # Each case is run this many times. Fastest times are reported.
+    "repeat": 3,
+
+    # Comparison with a baseline reports a regression when a result is
+    # worse by more than this ratio ...
+    "tolerance": 0.2,
+    # ... and, for times, by more than this many seconds (noise)
+    "minSeconds": 0.05,
+}
+
+# Benchmark cases.
+#   "params": arguments of SyntheticDb.createSyntheticDb
+#   "analyzerOptions": (optional) arguments of SQLiteAnalyzer
+#     (preallocDb is given from params)
+suites = {
+    "quick": [
+        {"name": "small-1k",
+         "params": {"pageSize": 1024, "nTables": 2, "nIndexesPerTable": 1,
+                    "nRows": 2000, "blobSize": 100}},
+        {"name": "overflow-1k",
+         "params": {"pageSize": 1024, "nTables": 2, "nIndexesPerTable": 1,
+                    "nRows": 500, "blobSize": 5000}},
+        {"name": "fragmented-4k",
+         "params": {"pageSize": 4096, "nTables": 4, "nIndexesPerTable": 2,
+                    "nRows": 2000, "blobSize": 300, "deleteRatio": 0.5}},
+        {"name": "prealloc-1k",
+         "params": {"pageSize": 1024, "nTables": 3, "nIndexesPerTable": 1,
+                    "nRows": 1000, "blobSize": 500, "deleteRatio": 0.4,
+                    "prealloc": True}},
+    ],
+    "full": [
+        {"name": "rows-4k",
+         "params": {"pageSize": 4096, "nTables": 4, "nIndexesPerTable": 2,
+                    "nRows": 20000, "blobSize": 200}},
+        {"name": "rows-4k-traverse",
+         "params": {"pageSize": 4096, "nTables": 4, "nIndexesPerTable": 2,
+                    "nRows": 20000, "blobSize": 200},
+         "analyzerOptions": {"traverse": True}},
+        {"name": "rows-4k-jobs4",
+         "params": {"pageSize": 4096, "nTables": 4, "nIndexesPerTable": 2,
+                    "nRows": 20000, "blobSize": 200},
+         "analyzerOptions": {"jobs": 4}},
+        {"name": "many-tables-1k",
+         "params": {"pageSize": 1024, "nTables": 50, "nIndexesPerTable": 1,
+                    "nRows": 200, "blobSize": 100}},
+        {"name": "overflow-4k",
+         "params": {"pageSize": 4096, "nTables": 2, "nIndexesPerTable": 1,
+                    "nRows": 5000, "blobSize": 20000}},
+        {"name": "fragmented-1k",
+         "params": {"pageSize": 1024, "nTables": 4, "nIndexesPerTable": 2,
+                    "nRows": 20000, "blobSize": 200, "deleteRatio": 0.6}},
+        {"name": "prealloc-4k",
+         "params": {"pageSize": 4096, "nTables": 8, "nIndexesPerTable": 1,
+                    "nRows": 5000, "blobSize": 1000, "deleteRatio": 0.5,
+                    "prealloc": True}},
+        {"name": "large-pages-64k",
+         "params": {"pageSize": 65536, "nTables": 2, "nIndexesPerTable": 1,
+                    "nRows": 20000, "blobSize": 1000}},
+    ],
+}
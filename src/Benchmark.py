@@ -0,0 +1,252 @@
+import BenchConfig
+from SQLiteAnalyzer import SQLiteAnalyzer
+from SyntheticDb import createSyntheticDb
+from Json2Svg import Json2Svg
+from Profiler import Profiler
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+
+# Stages of SQLiteAnalyzer (recorded by Profiler), in the order they run
+analyzerStages = [
+    "_read_wal",
+    "_read_db_metadata",
+    "_listBtrees",
+    "_read_db_pages",
+    "_read_db_pages_by_traversing",  # Instead of above (traverse=True)
+    "_summarize_dbinfo",
+]
+# Stages timed in each case
+stages = analyzerStages + ["dumpJson", "dumpSvg"]
+
+# Bump when the report format changes
+_formatVersion = 1
+
+
+def runSuite(suiteName, workDir=BenchConfig.main["workDir"],
+             repeat=BenchConfig.main["repeat"], caseNames=None,
+             log=sys.stderr):
+    """
+    @desc  Runs benchmark cases in BenchConfig.suites[suiteName].
+      Each run of a case is measured in a new process, so that peak RSS
+      is of the case alone.
+
+    @param caseNames  Names of cases to run. All cases if None.
+
+    @return  Report (See _measureCase for each case):
+      {"formatVersion": ..., "suite": ..., "python": ..., "platform": ...,
+       "createdAt": ..., "cases": {caseName: result, ...},
+       "failedCases": {caseName: error message, ...}}
+      A failed case is left out of "cases" and the others are still run.
+    """
+    assert repeat >= 1
+    cases = BenchConfig.suites[suiteName]
+    if caseNames is not None:
+        cases = [case for case in cases if case["name"] in caseNames]
+    report = {
+        "formatVersion": _formatVersion,
+        "suite": suiteName,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "createdAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": {},
+        "failedCases": {},
+    }
+    for case in cases:
+        dbPath = prepareDb(case, workDir)
+        results = []
+        for i in range(repeat):
+            (ok, ret) = _callInNewProcess(_measureCase,
+                                          case, dbPath, workDir)
+            if not ok:
+                break
+            results.append(ret)
+        if not ok:
+            report["failedCases"][case["name"]] = ret
+            log.write("%-20s FAILED: %s\n" % (case["name"], ret))
+            continue
+        result = _bestResult(results)
+        report["cases"][case["name"]] = result
+        log.write("%s\n" % (_formatResult(case["name"], result)))
+    return report
+
+
+def prepareDb(case, workDir):
+    """
+    @return  Path to synthetic DB of the case, created if not yet
+    """
+    dbDir = os.path.join(workDir, "dbs")
+    if not os.path.isdir(dbDir):
+        os.makedirs(dbDir)
+    paramsHash = hashlib.sha1(json.dumps(
+        case["params"], sort_keys=True)).hexdigest()[:10]
+    dbPath = os.path.join(dbDir, "%s-%s.db" % (case["name"], paramsHash))
+    if not os.path.exists(dbPath):
+        # Never leave a half-created DB
+        tmpPath = "%s.%d.tmp" % (dbPath, os.getpid())
+        createSyntheticDb(tmpPath, **case["params"])
+        os.rename(tmpPath, dbPath)
+    return dbPath
+
+
+def compareReports(baseline, report,
+                   tolerance=BenchConfig.main["tolerance"],
+                   minSeconds=BenchConfig.main["minSeconds"]):
+    """
+    @return  [message, ...] of regressions of report from baseline.
+      Cases not in both, or with different params, are not compared.
+
+    >>> base = {"cases": {"a": {"params": {}, "analyzerOptions": {},
+    ...     "stageSeconds": {"dumpJson": 1.0}, "pagesPerSec": 100.0,
+    ...     "peakRssKb": 1000}}}
+    >>> new = json.loads(json.dumps(base))
+    >>> compareReports(base, new)
+    []
+    >>> new["cases"]["a"]["stageSeconds"]["dumpJson"] = 1.5
+    >>> new["cases"]["a"]["peakRssKb"] = 1100
+    >>> for regression in compareReports(base, new): print regression
+    a: dumpJson 1.000s -> 1.500s (+50%)
+    """
+    regressions = []
+    for name, result in sorted(report["cases"].iteritems()):
+        baseResult = baseline["cases"].get(name)
+        if (baseResult is None or
+            baseResult["params"] != result["params"] or
+            baseResult["analyzerOptions"] != result["analyzerOptions"]):
+            continue
+        for stage in stages:
+            (old, new) = (baseResult["stageSeconds"].get(stage),
+                          result["stageSeconds"].get(stage))
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > minSeconds:
+                regressions.append("%s: %s %.3fs -> %.3fs (%+d%%)" % (
+                    name, stage, old, new, _percent(old, new)))
+        (old, new) = (baseResult["pagesPerSec"], result["pagesPerSec"])
+        if new * (1 + tolerance) < old:
+            regressions.append("%s: pagesPerSec %.0f -> %.0f (%+d%%)" % (
+                name, old, new, _percent(old, new)))
+        (old, new) = (baseResult["peakRssKb"], result["peakRssKb"])
+        if new > old * (1 + tolerance):
+            regressions.append("%s: peakRssKb %d -> %d (%+d%%)" % (
+                name, old, new, _percent(old, new)))
+    return regressions
+
+
+def _callInNewProcess(func, *args):
+    """
+    @desc  Unlike a process pool, the process may start processes by
+      itself (ex: SQLiteAnalyzer jobs)
+
+    @return  (True, func(*args) called in a new process), or
+      (False, error message) if it raised or died
+    """
+    (receiver, sender) = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_callAndSend,
+                                      args=(sender, func, args))
+    process.start()
+    sender.close()
+    try:
+        (ok, ret) = receiver.recv()
+    except EOFError:  # Died without sending anything
+        (ok, ret) = (False, "process exited with %s" % (process.exitcode))
+    process.join()
+    return (ok, ret)
+
+
+def _callAndSend(sender, func, args):
+    try:
+        sender.send((True, func(*args)))
+    except Exception as e:
+        sender.send((False, repr(e)))
+        raise
+
+
+def _measureCase(case, dbPath, workDir):
+    """
+    @desc  Entry point of a process of runSuite
+
+    @return  {"params": ..., "analyzerOptions": ..., "nPages": ...,
+              "stageSeconds": {stage: seconds, ...},
+              "counters": Profiler counters (pages, cells, ...),
+              "pagesPerSec": pages analyzed per second,
+              "peakRssKb": peak RSS of the process in KB}
+    """
+    analyzerOptions = case.get("analyzerOptions", {})
+    # (Varints are not counted not to slow down _read_db_pages)
+    profiler = Profiler(countVarints=False)
+    analyzer = SQLiteAnalyzer(
+        dbPath, preallocDb=case["params"].get("prealloc", False),
+        profiler=profiler, **analyzerOptions)
+    dbinfo = analyzer.getDbinfo()
+
+    outPath = os.path.join(workDir, "%s.%d" % (case["name"], os.getpid()))
+    try:
+        with profiler.stage("dumpJson"):
+            analyzer.dumpJson(outPath + ".json")
+
+        json2Svg = Json2Svg()
+        json2Svg.initByDbinfo(dbinfo, outPath + ".svg", profiler=profiler)
+        json2Svg.dumpSvg()  # Recorded as stage "dumpSvg"
+    finally:
+        for ext in (".json", ".svg"):
+            if os.path.exists(outPath + ext):
+                os.remove(outPath + ext)
+
+    profile = profiler.getReport()
+    stageSeconds = dict((stage, profile["stages"][stage]["seconds"])
+                        for stage in stages if stage in profile["stages"])
+    nPages = dbinfo["dbMetadata"]["nPages"]
+    analysisSeconds = sum(stageSeconds[stage] for stage in analyzerStages
+                          if stage in stageSeconds)
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # In bytes, in KB on Linux
+        peakRss /= 1024
+    return {
+        "params": case["params"],
+        "analyzerOptions": analyzerOptions,
+        "nPages": nPages,
+        "stageSeconds": stageSeconds,
+        "counters": profile["counters"],
+        "pagesPerSec": nPages / max(analysisSeconds, 1e-9),
+        "peakRssKb": peakRss,
+    }
+
+
+def _bestResult(results):
+    """
+    @return  Result with fastest time of each stage and largest peak RSS
+      of results, which are of the same case
+    """
+    best = dict(results[0])
+    best["stageSeconds"] = dict(
+        (stage, min(result["stageSeconds"][stage] for result in results))
+        for stage in results[0]["stageSeconds"])
+    best["pagesPerSec"] = max(result["pagesPerSec"] for result in results)
+    best["peakRssKb"] = max(result["peakRssKb"] for result in results)
+    return best
+
+
+def _formatResult(name, result):
+    return "%-20s %8d pages %10.0f pages/s %8d KB  %s" % (
+        name, result["nPages"], result["pagesPerSec"], result["peakRssKb"],
+        " ".join("%s=%.3fs" % (stage, result["stageSeconds"][stage])
+                 for stage in stages if stage in result["stageSeconds"]))
+
+
+def _percent(old, new):
+    return int(round(100.0 * (new - old) / old)) if old else 0
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,307 @@
+import DbFormatConfig
+from DbInfoTemplate import PageType, pageAccessor
+import csv
+import json
+
+
+# Columns of stats of a btree (See computeBtreeStats), in CSV order
+statsFields = (
+    "name",
+    "type",
+    "tableName",
+    "rootPage",
+    # Pages (btree pages are leaf and interior pages)
+    "nPages",
+    "nLeafPages",
+    "nInteriorPages",
+    "nOverflowPages",
+    # Runs of consecutive page numbers of btree pages
+    "nRuns",
+    "maxRunLength",
+    "meanRunLength",
+    # Fraction of leaf pages whose next leaf in key order is the next page
+    "leafAdjacency",
+    # Number of levels (1 if the root page is a leaf)
+    "depth",
+    # Number of children of interior pages
+    "minFanout",
+    "maxFanout",
+    "meanFanout",
+    # Mean fraction of usable page size used by headers and cells
+    "meanFill",
+    # Free bytes in btree pages (See README.org - Measure free space):
+    # the sum of the following three
+    "nFreeBytes",
+    "nFreeBlockBytes",
+    "nFragmentedBytes",
+    "nUnallocatedBytes",
+)
+
+# Free bytes of a page in pageMetadata (See DbInfoTemplate.py)
+_freeSpaceFields = ("nFreeBlockBytes", "nFragmentedBytes", "nUnallocatedBytes")
+
+_leafPageTypes = (PageType.INDEX_LEAF, PageType.TABLE_LEAF)
+_interiorPageTypes = (PageType.INDEX_INTERIOR, PageType.TABLE_INTERIOR)
+
+
+def computeBtreeStats(dbinfo):
+    """
+    @desc  Fragmentation and locality metrics of each btree in
+      dbinfo["dbMetadata"]["btrees"].
+      Pages are visited once in page number order. Children of
+      interior pages are kept on the way, and leaf order, depth and
+      fanout are then found by walking them without visiting pages again.
+      Metrics of btrees with no page analyzed (ex: filtered out) are None,
+      and so are free bytes of dbinfo written without them.
+
+    @param dbinfo  See DbInfoTemplate.py. Ex: SQLiteAnalyzer.getDbinfo()
+
+    @return  [{field: value, ...}, ...] of btrees (See statsFields)
+
+    >>> def page(pageType, cells, **metadata):
+    ...     metadata.update(pageType=pageType, livingBtree="T",
+    ...                     nCells=len(cells))
+    ...     for field in _freeSpaceFields:
+    ...         metadata.setdefault(field, 0)
+    ...     return {"pageMetadata": metadata, "cells": cells}
+    >>> leaf = PageType.TABLE_LEAF
+    >>> dbinfo = {
+    ...   "dbMetadata": {"nPages": 7, "usablePageSize": 100, "btrees": [
+    ...     {"type": "table", "name": "T", "tableName": "T",
+    ...      "rootPage": 2}]},
+    ...   "pages": {
+    ...     # Leaves in key order: 3, 4, 5 (adjacent), then 7
+    ...     2: page(PageType.TABLE_INTERIOR, [
+    ...            {"cellSize": 7, "leftChildPage": 3},
+    ...            {"cellSize": 7, "leftChildPage": 4},
+    ...            {"cellSize": 7, "leftChildPage": 5}],
+    ...            rightmostChildPageNum=7),
+    ...     3: page(leaf, [{"cellSize": 40}, {"cellSize": 40}],
+    ...             nFreeBlockBytes=6, nUnallocatedBytes=4),
+    ...     4: page(leaf, [{"cellSize": 20, "overflowPage": 6}]),
+    ...     5: page(leaf, []),
+    ...     6: {"pageMetadata": {"pageType": PageType.OVERFLOW,
+    ...                          "nextOverflowPageNum": 0}},
+    ...     7: page(leaf, [{"cellSize": 30}])}}
+    >>> stats = computeBtreeStats(dbinfo)[0]
+    >>> [(field, stats[field]) for field in statsFields[4:]]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [('nPages', 5), ('nLeafPages', 4), ('nInteriorPages', 1),
+     ('nOverflowPages', 1), ('nRuns', 2), ('maxRunLength', 4),
+     ('meanRunLength', 2.5), ('leafAdjacency', 0.6667), ('depth', 2),
+     ('minFanout', 4), ('maxFanout', 4), ('meanFanout', 4.0),
+     ('meanFill', 0.418), ('nFreeBytes', 10), ('nFreeBlockBytes', 6),
+     ('nFragmentedBytes', 0), ('nUnallocatedBytes', 4)]
+    """
+    dbMdata = dbinfo["dbMetadata"]
+    pages = pageAccessor(dbinfo["pages"])
+    btreeStats = [_newStats(btree) for btree in dbMdata["btrees"]]
+    statsByName = dict((stats["name"], stats) for stats in btreeStats)
+    acc = dict((stats["name"], _Accumulator()) for stats in btreeStats)
+    nextOverflowPages = {}
+
+    for pageNum in range(1, dbMdata["nPages"] + 1):
+        pageType = pages.getPageType(pageNum)
+        if pageType == PageType.OVERFLOW:
+            nextOverflowPages[pageNum] = pages.getPageMetadata(
+                pageNum, "nextOverflowPageNum")
+            continue
+        if pageType not in _leafPageTypes + _interiorPageTypes:
+            continue
+        btreeAcc = acc.get(pages.getLivingBtree(pageNum))
+        if btreeAcc is None:  # Not in any btree (ex: uncertain page)
+            continue
+        btreeAcc.addPage(pageNum, pageType, pages,
+                         dbMdata["usablePageSize"])
+
+    for name, btreeAcc in acc.iteritems():
+        btreeAcc.summarize(statsByName[name], nextOverflowPages)
+    return btreeStats
+
+
+def writeStatsJson(fileObj, btreeStats, dbPath=None):
+    """
+    @desc  Writes {"dbPath": ..., "btrees": btreeStats}
+    """
+    json.dump({"dbPath": dbPath, "btrees": btreeStats}, fileObj,
+              indent=2, sort_keys=True)
+    fileObj.write("\n")
+
+
+def writeStatsCsv(fileObj, btreeStats, dbPath=None):
+    """
+    @desc  Writes a header and a row of each btree, with dbPath as the
+      first column so that rows of many DBs can be concatenated.
+
+    >>> import StringIO
+    >>> f = StringIO.StringIO()
+    >>> writeStatsCsv(f, [dict((field, None) for field in statsFields)],
+    ...               dbPath="a.db")
+    >>> print f.getvalue().splitlines()[1]
+    a.db,,,,,,,,,,,,,,,,,,,,,
+    """
+    writer = csv.writer(fileObj, lineterminator="\n")
+    writer.writerow(("dbPath",) + statsFields)
+    for stats in btreeStats:
+        writer.writerow([_csvValue(dbPath)] +
+                        [_csvValue(stats[field]) for field in statsFields])
+
+
+def _newStats(btree):
+    stats = dict((field, None) for field in statsFields)
+    for field in ("name", "type", "tableName", "rootPage"):
+        stats[field] = btree[field]
+    stats["nPages"] = 0
+    return stats
+
+
+class _Accumulator(object):
+    """
+    @desc  Metrics of a btree gathered from its pages in page number order
+    """
+    def __init__(self):
+        self.nLeafPages = 0
+        self.nInteriorPages = 0
+        self.runLengths = []
+        self.lastPageNum = None
+        self.fillSum = 0.0
+        self.children = {}  # {interior pageNum: [child pageNum, ...]}
+        self.leafPageNums = set()
+        self.overflowHeads = []
+        self.freeBytes = dict((field, 0) for field in _freeSpaceFields)
+
+    def addPage(self, pageNum, pageType, pages, usablePageSize):
+        # Runs
+        if self.lastPageNum is not None and self.lastPageNum + 1 == pageNum:
+            self.runLengths[-1] += 1
+        else:
+            self.runLengths.append(1)
+        self.lastPageNum = pageNum
+
+        hFormat = DbFormatConfig.btreeHeaderFormat
+        if pageType in _leafPageTypes:
+            self.nLeafPages += 1
+            self.leafPageNums.add(pageNum)
+            usedSize = hFormat["leafLen"]
+        else:
+            self.nInteriorPages += 1
+            usedSize = hFormat["interiorLen"]
+            children = list(pages.iterCellValues(pageNum, "leftChildPage"))
+            children.append(pages.getPageMetadata(pageNum,
+                                                  "rightmostChildPageNum"))
+            self.children[pageNum] = children
+        if pageNum == 1:
+            usedSize += DbFormatConfig.dbHeaderFormat["len"]
+
+        # Fill: header, cell pointer array and cells
+        nCells = 0
+        for cellSize in pages.iterCellValues(pageNum, "cellSize"):
+            usedSize += (DbFormatConfig.cellPointerArrayFormat["elemLen"] +
+                         cellSize)
+            nCells += 1
+        self.fillSum += float(usedSize) / usablePageSize
+
+        for field in _freeSpaceFields:
+            if self.freeBytes[field] is None:
+                continue
+            nBytes = pages.getPageMetadata(pageNum, field)
+            self.freeBytes[field] = (None if nBytes is None
+                                     else self.freeBytes[field] + nBytes)
+
+        if pageType != PageType.TABLE_INTERIOR and nCells > 0:
+            self.overflowHeads.extend(
+                head
+                for head in pages.iterCellValues(pageNum, "overflowPage")
+                if head is not None)
+
+    def summarize(self, stats, nextOverflowPages):
+        nPages = self.nLeafPages + self.nInteriorPages
+        stats["nPages"] = nPages
+        if nPages == 0:
+            return
+        stats["nLeafPages"] = self.nLeafPages
+        stats["nInteriorPages"] = self.nInteriorPages
+        stats["nOverflowPages"] = _countOverflowPages(self.overflowHeads,
+                                                      nextOverflowPages)
+        stats["nRuns"] = len(self.runLengths)
+        stats["maxRunLength"] = max(self.runLengths)
+        stats["meanRunLength"] = _round(float(nPages) / len(self.runLengths))
+        stats["meanFill"] = _round(self.fillSum / nPages)
+        stats.update(self.freeBytes)
+        if None not in self.freeBytes.values():
+            stats["nFreeBytes"] = sum(self.freeBytes.values())
+
+        (leafPageNums, depth) = self._walk(stats["rootPage"])
+        stats["depth"] = depth
+        if len(leafPageNums) >= 2:
+            nAdjacent = sum(1 for (prev, next) in zip(leafPageNums,
+                                                      leafPageNums[1:])
+                            if prev + 1 == next)
+            stats["leafAdjacency"] = _round(
+                float(nAdjacent) / (len(leafPageNums) - 1))
+        if len(self.children) > 0:
+            fanouts = [len(children)
+                       for children in self.children.itervalues()]
+            stats["minFanout"] = min(fanouts)
+            stats["maxFanout"] = max(fanouts)
+            stats["meanFanout"] = _round(float(sum(fanouts)) / len(fanouts))
+
+    def _walk(self, rootPage):
+        """
+        @desc  Depth-first walk over kept children, left children first
+          (explicit stack as SQLiteAnalyzer._markBtreePagesByTraversing)
+
+        @return  (leaf page numbers in key order, depth)
+        """
+        leafPageNums = []
+        depth = 0
+        visited = set()
+        stack = [(rootPage, 1)]
+        while stack:
+            (pageNum, level) = stack.pop()
+            if pageNum in visited:
+                continue
+            visited.add(pageNum)
+            depth = max(depth, level)
+            if pageNum in self.leafPageNums:
+                leafPageNums.append(pageNum)
+                continue
+            children = self.children.get(pageNum)
+            if children is None:  # Not a page of the btree (corrupt)
+                continue
+            stack.extend((child, level + 1) for child in reversed(children))
+        return (leafPageNums, depth)
+
+
+def _countOverflowPages(heads, nextOverflowPages):
+    """
+    @return  Number of overflow pages in chains starting from heads
+    """
+    nPages = 0
+    visited = set()
+    for pageNum in heads:
+        while pageNum in nextOverflowPages and pageNum not in visited:
+            visited.add(pageNum)
+            nPages += 1
+            pageNum = nextOverflowPages[pageNum]
+    return nPages
+
+
+def _round(x):
+    return round(x, 4)
+
+
+def _csvValue(value):
+    if value is None:
+        return ""
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,295 @@
+# Precompiled big-endian decoders for SQLite on-disk structures.
+# All functions read from any buffer-like object (str, buffer, memoryview)
+# at a given offset, without slicing a copy first.
+import struct
+import DbFormatConfig
+
+
+_uintStructs = {
+    1: struct.Struct(">B"),
+    2: struct.Struct(">H"),
+    4: struct.Struct(">I"),
+}
+
+_floatStruct = struct.Struct(">d")
+
+_btreeHeaderStruct = struct.Struct(
+    DbFormatConfig.btreeHeaderFormat["structFormat"])
+
+# Indexing str/buffer yields 1-char strings on Python 2, ints otherwise
+_ord = ord if str is bytes else int
+
+# Content size of serial types 0..11 (10 and 11 are reserved).
+# See: http://www.sqlite.org/fileformat2.html -
+#        Serial Type Codes Of The Record Format
+_smallSerialTypeSizes = (0, 1, 2, 3, 4, 6, 8, 8, 0, 0, None, None)
+
+
+def unpackUint(data, offset, length):
+    """
+    @return  Big-endian unsigned integer of `length' (1, 2 or 4) bytes
+
+    >>> unpackUint(b'\\x00\\x01\\x01', 1, 2)
+    257
+    >>> unpackUint(b'\\x00\\x00\\x10\\x00', 0, 4)
+    4096
+    """
+    return _uintStructs[length].unpack_from(data, offset)[0]
+
+
+def unpackPageSize(dbHeader):
+    """
+    @return  Page size in the DB header. 1 stands for 65536, which does not
+      fit in the 2-byte field.
+
+    >>> unpackPageSize(b'\\x00' * 16 + b'\\x10\\x00')
+    4096
+    >>> unpackPageSize(b'\\x00' * 16 + b'\\x00\\x01')
+    65536
+    """
+    hFormat = DbFormatConfig.dbHeaderFormat
+    pageSize = unpackUint(
+        dbHeader, hFormat["pageSizeOffset"], hFormat["pageSizeLen"])
+    if pageSize == 1:
+        return 65536
+    return pageSize
+
+
+def unpackBtreeHeader(data, offset):
+    """
+    @desc  Unpacks a whole b-tree page header in one call.
+
+    @return
+    (btree_header_flag,
+     free_block_offset,
+     n_cells,
+     cell_content_area_offset,
+     n_fragmented_bytes,
+     rightmostChildPageNum)
+    rightmostChildPageNum is meaningless if not interior page.
+
+    >>> unpackBtreeHeader(b'\\x05\\x00\\x00\\x00\\x02\\x0f\\xf0\\x00'
+    ...                   b'\\x00\\x00\\x00\\x07', 0)
+    (5, 0, 2, 4080, 0, 7)
+    """
+    return _btreeHeaderStruct.unpack_from(data, offset)
+
+
+def readFreeBlocks(data, offset, limit):
+    """
+    @desc  Walks the freeblock chain of a b-tree page starting at `offset'
+      (freeBlockOffset in b-tree header; 0 if no freeblock).
+      Freeblocks are in ascending order of offset and never overlap.
+      The walk stops at the first one breaking this or extending beyond
+      `limit' (usable page size), so that pages whose type is guessed
+      wrongly never loop.
+
+    @return  [(offset, size), ...] of valid freeblocks
+
+    >>> # Freeblocks at 8 (6 bytes) and 20 (4 bytes)
+    >>> page = (b'\\x00' * 8 + b'\\x00\\x14\\x00\\x06' + b'\\x00' * 8 +
+    ...         b'\\x00\\x00\\x00\\x04')
+    >>> readFreeBlocks(page, 8, len(page))
+    [(8, 6), (20, 4)]
+    >>> readFreeBlocks(page, 0, len(page))
+    []
+    >>> readFreeBlocks(page, 8, 23)  # Second one is beyond the limit
+    [(8, 6)]
+    """
+    fbFormat = DbFormatConfig.freeBlockFormat
+    nextStruct = _uintStructs[fbFormat["nextFreeBlockLen"]]
+    sizeStruct = _uintStructs[fbFormat["sizeLen"]]
+    freeBlocks = []
+    end = 0  # End of the previous freeblock
+    while offset != 0:
+        if offset < end or offset + fbFormat["minLen"] > limit:
+            break
+        size = sizeStruct.unpack_from(data, offset + fbFormat["sizeOffset"])[0]
+        if size < fbFormat["minLen"] or offset + size > limit:
+            break
+        freeBlocks.append((offset, size))
+        end = offset + size
+        offset = nextStruct.unpack_from(
+            data, offset + fbFormat["nextFreeBlockOffset"])[0]
+    return freeBlocks
+
+
+def unpackUint16Array(data, offset, n):
+    """
+    @desc  Decodes n big-endian 2-byte integers (ex: cell pointer array)
+      in a single batch.
+
+    >>> unpackUint16Array(b'\\x0f\\xf0\\x0f\\xe0', 0, 2)
+    (4080, 4064)
+    """
+    return _unpackArray("H", 2, data, offset, n)
+
+
+def unpackUint32Array(data, offset, n):
+    """
+    @desc  Decodes n big-endian 4-byte integers (ex: freelist leaf page
+      numbers) in a single batch.
+
+    >>> unpackUint32Array(b'\\x00\\x00\\x00\\x03\\x00\\x00\\x01\\x00', 0, 2)
+    (3, 256)
+    """
+    return _unpackArray("I", 4, data, offset, n)
+
+
+def readVarint(data, offset):
+    """
+    @note
+    See varint format (very simple):
+    http://www.sqlite.org/fileformat2.html - 'A variable-length integer ...'
+
+    @return
+    (VarintLength, effNumber)
+
+    >>> readVarint(b'\\x81\\x29', 0)
+    (2, 169)
+    >>> readVarint(b'\\x00\\x81\\x01', 1)
+    (2, 129)
+    >>> readVarint(b'\\x80' * 9, 0)
+    (9, 128)
+    """
+    value = 0
+    for i in range(DbFormatConfig.varintFormat["maxLen"] - 1):
+        byte = _ord(data[offset + i])
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return (i + 1, value)
+    # 9th byte contributes all of its 8 bits
+    return (i + 2, (value << 8) | _ord(data[offset + i + 1]))
+
+
+def readRecordSizes(data, offset):
+    """
+    @desc  Decodes all serial types of the record header at `offset'
+      and sums their content sizes.
+
+    @note
+    See: README.org - Read payloads
+
+    @return
+    (payloadHeaderSize, payloadBodySize)
+
+    >>> # header: size=4, INT8 (1), TEXT len 3 (19), NULL (0)
+    >>> readRecordSizes(b'\\x04\\x01\\x13\\x00', 0)
+    (4, 4)
+    >>> # header: size=3, BLOB len 64 (2-byte varint 140)
+    >>> readRecordSizes(b'\\xff\\x03\\x81\\x0c', 1)
+    (3, 64)
+    """
+    stypeSizes = _smallSerialTypeSizes
+    (headerSizeLen, headerSize) = readVarint(data, offset)
+    bodySize = 0
+    pos = offset + headerSizeLen
+    end = offset + headerSize
+    while pos < end:
+        stype = _ord(data[pos])
+        if stype < 0x80:  # 1-byte varint (almost always)
+            pos += 1
+        else:
+            (stypeLen, stype) = readVarint(data, pos)
+            pos += stypeLen
+        if stype >= 12:
+            bodySize += (stype - 12) >> 1
+        else:
+            assert stypeSizes[stype] is not None
+            bodySize += stypeSizes[stype]
+    return (headerSize, bodySize)
+
+
+def countRecordFields(data, offset):
+    """
+    @desc  Counts serial types (varints) of the record header at `offset'
+      without decoding their sizes (Used by Profiler counters).
+
+    >>> countRecordFields(b'\\x04\\x01\\x13\\x00', 0)
+    3
+    >>> countRecordFields(b'\\xff\\x03\\x81\\x0c', 1)
+    1
+    """
+    (headerSizeLen, headerSize) = readVarint(data, offset)
+    nFields = 0
+    pos = offset + headerSizeLen
+    end = offset + headerSize
+    while pos < end:
+        if _ord(data[pos]) < 0x80:
+            pos += 1
+        else:
+            pos += readVarint(data, pos)[0]
+        nFields += 1
+    return nFields
+
+
+def decodeRecord(data, offset=0, textEncoding="utf-8"):
+    """
+    @desc  Decodes all values of the record at `offset'.
+      Unlike readRecordSizes, the whole record must be in data
+      (including the part in overflow pages).
+
+    @param textEncoding  Python codec name of the database text encoding
+
+    @return  [value, ...] where value is None (NULL), int, float,
+      unicode (TEXT) or bytes (BLOB)
+
+    >>> # header: size=6, INT8, TEXT len 2, NULL, constant 1, INT16
+    >>> decodeRecord(b'\\x06\\x01\\x11\\x00\\x09\\x02\\xfehi\\x01\\x00')
+    [-2, u'hi', None, 1, 256]
+    >>> # header: size=3, FLOAT, BLOB len 1
+    >>> decodeRecord(b'\\x03\\x07\\x0e?\\xf8\\x00\\x00\\x00\\x00\\x00\\x00z')
+    [1.5, 'z']
+    """
+    (headerSizeLen, headerSize) = readVarint(data, offset)
+    pos = offset + headerSizeLen
+    end = offset + headerSize
+    stypes = []
+    while pos < end:
+        (stypeLen, stype) = readVarint(data, pos)
+        pos += stypeLen
+        stypes.append(stype)
+
+    values = []
+    pos = end
+    for stype in stypes:
+        if stype >= 12:
+            size = (stype - 12) >> 1
+            content = bytes(data[pos:pos + size])
+            if stype & 1:  # TEXT
+                content = content.decode(textEncoding)
+            values.append(content)
+            pos += size
+            continue
+        size = _smallSerialTypeSizes[stype]
+        assert size is not None
+        if stype == 0:
+            values.append(None)
+        elif stype == 7:
+            values.append(_floatStruct.unpack_from(data, pos)[0])
+        elif stype in (8, 9):  # Constant 0 and 1
+            values.append(stype - 8)
+        else:  # Big-endian signed integer of `size' bytes
+            value = 0
+            for i in range(size):
+                value = (value << 8) | _ord(data[pos + i])
+            if value >= 1 << (size * 8 - 1):
+                value -= 1 << (size * 8)
+            values.append(value)
+        pos += size
+    return values
+
+
+def _unpackArray(elemFormat, elemLen, data, offset, n):
+    assert n >= 0
+    assert offset + elemLen * n <= len(data)
+    # struct caches compiled format strings internally
+    return struct.unpack_from(">%d%s" % (n, elemFormat), data, offset)
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
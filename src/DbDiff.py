@@ -0,0 +1,381 @@
+# Page-level diff between two snapshots of a database
+import DbFormatConfig
+import SvgConfig
+from DbInfoTemplate import PageType
+from DbDecoder import unpackPageSize
+from PageSource import PageSource
+from WalIndex import readWalIndex, getWalPath
+from SQLiteAnalyzer import SQLiteAnalyzer
+from SvgWriter import SvgWriter
+from Profiler import nullProfiler
+import array
+import json
+import multiprocessing
+import zlib
+
+
+# Kinds of change of a page (See _changeKind), in order of precedence
+changeKinds = (
+    "added",               # Beyond the end of the old snapshot
+    "removed",             # Beyond the end of the new snapshot
+    "becameFreelist",
+    "leftFreelist",
+    "movedBetweenBtrees",
+    "typeChanged",         # Ex: leaf page became interior one
+    "nCellsChanged",
+    "contentChanged",      # Nothing above but bytes of the page
+)
+
+_freelistPageTypes = (PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF,
+                      PageType.FREELIST_MAP)
+
+
+def diffDbs(oldDbPath, newDbPath, jobs=1, preallocDb=False, readWal=True,
+            profiler=None):
+    """
+    @desc  Compares two snapshots of a DB (ex: a copy before and after
+      a batch job) page by page without analyzing whole files:
+      1. CRC32 of every page of both files is computed in jobs processes
+         (See hashPages).
+      2. Freelist trunk pages of both are read. Freelist leaf pages keep
+         their bytes when freed, so pages which joined or left freelist
+         are taken as changed as well as pages whose hashes differ.
+      3. Only changed pages of both are analyzed
+         (See SQLiteAnalyzer onlyPages), and compared.
+
+    @param readWal  False to ignore <dbPath>-wal of both snapshots
+    @param profiler  See SQLiteAnalyzer
+
+    @return  {"oldDbPath": ..., "newDbPath": ..., "pageSize": ...,
+              "oldNPages": ..., "newNPages": ...,
+              "nChangedPages": ...,
+              "changes": {kind: number of pages, ...} (See changeKinds),
+              "btrees": {name: {"nPagesChanged": changed pages staying in
+                                  the btree,
+                                "nPagesGained": ..., "nPagesLost": ...,
+                                "nCellsDelta": change of number of cells
+                                  (of interior pages too)}, ...},
+              "pages": [{"pageNum": ..., "change": kind,
+                         "old": page (See _pageSummary) or None,
+                         "new": page or None}, ...] in page number order}
+
+    >>> import os, shutil, sqlite3, tempfile
+    >>> tmpdir = tempfile.mkdtemp()
+    >>> (oldPath, newPath) = [os.path.join(tmpdir, name)
+    ...                       for name in ("old.db", "new.db")]
+    >>> conn = sqlite3.connect(oldPath)
+    >>> conn.executescript(
+    ...     "CREATE TABLE T (x); CREATE TABLE U (y);"
+    ...     "INSERT INTO T VALUES (zeroblob(10000));"
+    ...     "INSERT INTO U VALUES (1);") and None
+    >>> conn.close()
+    >>> shutil.copy(oldPath, newPath)
+    >>> conn = sqlite3.connect(newPath)
+    >>> conn.executescript(
+    ...     "DELETE FROM T; INSERT INTO U VALUES (2);") and None
+    >>> conn.close()
+    >>> diff = diffDbs(oldPath, newPath)
+    >>> (diff["oldNPages"], diff["newNPages"])
+    (5, 5)
+    >>> [(page["pageNum"], page["change"]) for page in diff["pages"]]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [(1, 'contentChanged'), (2, 'nCellsChanged'), (3, 'nCellsChanged'),
+     (4, 'becameFreelist'), (5, 'becameFreelist')]
+    >>> diff["btrees"]["U"] == {"nPagesChanged": 1, "nPagesGained": 0,
+    ...                         "nPagesLost": 0, "nCellsDelta": 1}
+    True
+    >>> shutil.rmtree(tmpdir)
+    """
+    if profiler is None:
+        profiler = nullProfiler
+    stage = profiler.stage
+    with stage("hashPages"):
+        (pageSize, oldHashes) = hashPages(oldDbPath, jobs, readWal)
+        (newPageSize, newHashes) = hashPages(newDbPath, jobs, readWal)
+    assert pageSize == newPageSize, "Page sizes of the DBs differ"
+    nPages = max(len(oldHashes), len(newHashes))
+    changedPageNums = set(
+        pageNum for pageNum in range(1, nPages + 1)
+        if (pageNum > len(oldHashes) or pageNum > len(newHashes) or
+            oldHashes[pageNum - 1] != newHashes[pageNum - 1]))
+    profiler.count("pagesHashed", len(oldHashes) + len(newHashes))
+
+    with stage("_readFreelists"):
+        (oldFreelist, newFreelist) = [
+            _freelistPageNums(SQLiteAnalyzer(
+                dbPath, preallocDb=preallocDb, readWal=readWal,
+                onlyPages=[]).getDbinfo())
+            for dbPath in (oldDbPath, newDbPath)]
+    changedPageNums.update(oldFreelist.symmetric_difference(newFreelist))
+    changedPageNums = sorted(changedPageNums)
+
+    dbinfos = []
+    for (dbPath, hashes) in ((oldDbPath, oldHashes), (newDbPath, newHashes)):
+        with stage("analyze"):
+            analyzer = SQLiteAnalyzer(
+                dbPath, preallocDb=preallocDb, readWal=readWal,
+                profiler=profiler,
+                onlyPages=[pageNum for pageNum in changedPageNums
+                           if pageNum <= len(hashes)])
+            dbinfos.append(analyzer.getDbinfo())
+
+    with stage("_comparePages"):
+        diff = _comparePages(dbinfos[0], dbinfos[1], changedPageNums)
+    diff.update({
+        "oldDbPath": oldDbPath,
+        "newDbPath": newDbPath,
+        "pageSize": pageSize,
+        "oldNPages": len(oldHashes),
+        "newNPages": len(newHashes),
+    })
+    return diff
+
+
+def hashPages(dbpath, jobs=1, readWal=True):
+    """
+    @desc  Splits pages into chunks and computes CRC32 of them in a
+      process pool as SQLiteAnalyzer._read_page_range_parallel does.
+      Pages in committed frames of <dbpath>-wal are hashed from it
+      unless readWal is False.
+
+    @return  (pageSize, array of CRC32 of page#1, page#2, ...)
+    """
+    walIndex = None
+    if readWal:
+        walIndex = readWalIndex(getWalPath(dbpath))
+    (pageSize, nPages) = _getPageSizeAndNPages(dbpath, walIndex)
+
+    nChunks = jobs * DbFormatConfig.main["parallelChunksPerJob"]
+    chunkLen = max(1, (nPages + nChunks - 1) / nChunks)
+    args = [(dbpath, walIndex, pageSize,
+             first, min(first + chunkLen - 1, nPages))
+            for first in range(1, nPages + 1, chunkLen)]
+    hashes = array.array("L")
+    if jobs == 1:
+        for chunkArgs in args:
+            hashes.extend(_hash_page_range_worker(chunkArgs))
+        return (pageSize, hashes)
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for chunkHashes in pool.imap(_hash_page_range_worker, args):
+            hashes.extend(chunkHashes)
+    finally:
+        pool.close()
+        pool.join()
+    return (pageSize, hashes)
+
+
+def writeDiffJson(fileObj, diff):
+    json.dump(diff, fileObj, indent=2, sort_keys=True)
+    fileObj.write("\n")
+
+
+def writeDiffSvg(fileObj, diff):
+    """
+    @desc  Draws pages of the larger snapshot in long-shot view
+      (See Json2Svg longshot): unchanged pages are left in the background
+      and changed pages are filled with colors of their kinds of change,
+      listed in the legend above them.
+      Only changed pages are drawn one by one.
+
+    @param fileObj  File opened in binary mode
+
+    >>> import StringIO
+    >>> f = StringIO.StringIO()
+    >>> writeDiffSvg(f, {"oldNPages": 250, "newNPages": 200, "pages": [
+    ...     {"pageNum": 101, "change": "becameFreelist",
+    ...      "old": {"pageType": PageType.OVERFLOW},
+    ...      "new": {"pageType": PageType.FREELIST_LEAF}},
+    ...     {"pageNum": 250, "change": "removed", "new": None,
+    ...      "old": {"pageType": PageType.TABLE_LEAF}}]})
+    >>> svg = f.getvalue()
+    >>> svg.count("<rect"), svg.count("<text")
+    (5, 2)
+    >>> 'x="0" y="24"' in svg  # page#101: first column of the 2nd row
+    True
+    """
+    pageSize = SvgConfig.pageLongshot["size"]
+    nCols = SvgConfig.pageListLongshot["nCols"]
+    nPages = max(diff["oldNPages"], diff["newNPages"])
+    nRows = (nPages + nCols - 1) / nCols
+    kinds = [kind for kind in changeKinds
+             if any(page["change"] == kind for page in diff["pages"])]
+
+    legendHeight = SvgConfig.btreeList["legendHeight"]
+    legendWidth = nCols * pageSize / SvgConfig.btreeList["legendNCol"]
+    legendNRow = ((len(kinds) + SvgConfig.btreeList["legendNCol"] - 1) /
+                  SvgConfig.btreeList["legendNCol"])
+    x = SvgConfig.pageListLongshot["x"]
+    y = (SvgConfig.btreeList["y"] + legendHeight * legendNRow +
+         SvgConfig.btreeList["legendTopMargin"])
+
+    writer = SvgWriter(fileObj, encoding=SvgConfig.main["encoding"],
+                       width=nCols * pageSize, height=y + nRows * pageSize)
+    for i, kind in enumerate(kinds):
+        legendX = (SvgConfig.btreeList["x"] +
+                   legendWidth * (i % SvgConfig.btreeList["legendNCol"]))
+        legendY = (SvgConfig.btreeList["y"] +
+                   legendHeight * (i / SvgConfig.btreeList["legendNCol"]))
+        writer.rect(legendX, legendY - legendHeight + 1,
+                    legendHeight - 1, legendHeight - 1,
+                    fill=SvgConfig.diff[kind + "Color"],
+                    strokeWidth=SvgConfig.btreeList["legendStrokeWidth"],
+                    stroke=SvgConfig.btreeList["legendStrokeColor"])
+        writer.text(kind, legendX + legendHeight, legendY,
+                    fontSize=SvgConfig.btreeList["legendFontSize"])
+
+    writer.rect(x, y, nCols * pageSize, nRows * pageSize,
+                fill=SvgConfig.diff["unchangedColor"], strokeWidth=0)
+    for page in diff["pages"]:
+        (row, col) = divmod(page["pageNum"] - 1, nCols)
+        pageType = (page["new"] or page["old"])["pageType"]
+        writer.rect(x + col * pageSize, y + row * pageSize,
+                    pageSize - 1, pageSize - 1,
+                    fill=SvgConfig.diff[page["change"] + "Color"],
+                    strokeWidth=SvgConfig.pageLongshot["strokeWidth"],
+                    stroke=SvgConfig.page[pageType + "strokeColor"])
+    writer.close()
+
+
+def _comparePages(oldDbinfo, newDbinfo, pageNums):
+    oldPages = oldDbinfo["pages"]
+    newPages = newDbinfo["pages"]
+    changes = dict((kind, 0) for kind in changeKinds)
+    btrees = {}
+    diffPages = []
+    for pageNum in pageNums:
+        old = _pageSummary(oldDbinfo, pageNum)
+        new = _pageSummary(newDbinfo, pageNum)
+        kind = _changeKind(old, new)
+        changes[kind] += 1
+        diffPages.append({"pageNum": pageNum, "change": kind,
+                          "old": old, "new": new})
+
+        oldBtree = old and old["livingBtree"]
+        newBtree = new and new["livingBtree"]
+        for name in set((oldBtree, newBtree)) - set((None,)):
+            btrees.setdefault(name, {"nPagesChanged": 0, "nPagesGained": 0,
+                                     "nPagesLost": 0, "nCellsDelta": 0})
+        if oldBtree is not None and oldBtree == newBtree:
+            btrees[oldBtree]["nPagesChanged"] += 1
+        else:
+            if oldBtree is not None:
+                btrees[oldBtree]["nPagesLost"] += 1
+            if newBtree is not None:
+                btrees[newBtree]["nPagesGained"] += 1
+        if oldBtree is not None:
+            btrees[oldBtree]["nCellsDelta"] -= old["nCells"]
+        if newBtree is not None:
+            btrees[newBtree]["nCellsDelta"] += new["nCells"]
+    return {"nChangedPages": len(diffPages), "changes": changes,
+            "btrees": btrees, "pages": diffPages}
+
+
+def _pageSummary(dbinfo, pageNum):
+    """
+    @return  {"pageType": ..., "livingBtree": ..., "nCells": ...}
+      of page#pageNum (None for fields the page does not have),
+      or None if it is beyond the end of the DB
+    """
+    if pageNum > dbinfo["dbMetadata"]["nPages"]:
+        return None
+    pages = dbinfo["pages"]
+    if pageNum not in pages:  # (Not expected: listed pages are all read)
+        return {"pageType": None, "livingBtree": None, "nCells": None}
+    return {
+        "pageType": pages.getPageType(pageNum),
+        "livingBtree": pages.getLivingBtree(pageNum),
+        "nCells": pages.getPageMetadata(pageNum, "nCells"),
+    }
+
+
+def _changeKind(old, new):
+    """
+    @param old, new  Page of old and new snapshots (See _pageSummary)
+
+    >>> def page(pageType, livingBtree=None, nCells=None):
+    ...     return {"pageType": pageType, "livingBtree": livingBtree,
+    ...             "nCells": nCells}
+    >>> leaf = page(PageType.TABLE_LEAF, "T", 3)
+    >>> _changeKind(leaf, page(PageType.FREELIST_LEAF))
+    'becameFreelist'
+    >>> _changeKind(leaf, page(PageType.TABLE_LEAF, "U", 3))
+    'movedBetweenBtrees'
+    >>> _changeKind(leaf, page(PageType.TABLE_INTERIOR, "T", 3))
+    'typeChanged'
+    >>> _changeKind(leaf, page(PageType.TABLE_LEAF, "T", 4))
+    'nCellsChanged'
+    >>> _changeKind(leaf, leaf)
+    'contentChanged'
+    >>> _changeKind(None, leaf)
+    'added'
+    """
+    if old is None:
+        return "added"
+    if new is None:
+        return "removed"
+    oldFree = old["pageType"] in _freelistPageTypes
+    newFree = new["pageType"] in _freelistPageTypes
+    if newFree and not oldFree:
+        return "becameFreelist"
+    if oldFree and not newFree:
+        return "leftFreelist"
+    if (None not in (old["livingBtree"], new["livingBtree"]) and
+            old["livingBtree"] != new["livingBtree"]):
+        return "movedBetweenBtrees"
+    if old["pageType"] != new["pageType"]:
+        return "typeChanged"
+    if old["nCells"] != new["nCells"]:
+        return "nCellsChanged"
+    return "contentChanged"
+
+
+def _freelistPageNums(dbinfo):
+    pages = dbinfo["pages"]
+    return set(pageNum for pageNum in pages
+               if pages.getPageType(pageNum) in _freelistPageTypes)
+
+
+def _getPageSizeAndNPages(dbpath, walIndex):
+    """
+    @return  (pageSize, nPages) of the DB (after the last commit in the
+      WAL if walIndex is not None) as SQLiteAnalyzer._read_db_metadata
+    """
+    hFormat = DbFormatConfig.dbHeaderFormat
+    pageSource = PageSource(dbpath)
+    try:
+        if walIndex is not None:
+            pageSource.overlayWal(walIndex)
+        pageSize = unpackPageSize(
+            pageSource.getBytes(hFormat["offsetInFile"], hFormat["len"]))
+        return (pageSize, len(pageSource) / pageSize)
+    finally:
+        pageSource.close()
+
+
+def _hash_page_range_worker(args):
+    """
+    @desc  Process pool entry point of hashPages
+
+    @return  array of CRC32 of pages in the range
+    """
+    (dbpath, walIndex, pageSize, firstPage, lastPage) = args
+    pageSource = PageSource(dbpath)
+    try:
+        if walIndex is not None:
+            pageSource.overlayWal(walIndex)
+        pageSource.setPageSize(pageSize)
+        return array.array("L", (
+            zlib.crc32(pageSource.getPage(pageNum)) & 0xffffffff
+            for pageNum in range(firstPage, lastPage + 1)))
+    finally:
+        pageSource.close()
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -1,10 +1,20 @@
 import __init__
+import os
 
 basedir = __init__.basedir
 
 main = {
     "dbInfoJsonPath": basedir + "/output.json",
     "dbInfoJsonEncoding": "utf-8",
+
+    # SQLiteAnalyzer(jobs=N) splits pages into N * this chunks
+    # to balance load among workers
+    "parallelChunksPerJob": 4,
+
+    # Analysis results are cached here (See AnalysisCache.py)
+    "analysisCacheDir": os.path.expanduser("~/.cache/sqlite-visualizer"),
+    # Least recently used results are evicted above this size
+    "analysisCacheMaxBytes": 1024 * 1024 * 1024,
 }
 
 dbHeaderFormat = {
@@ -17,6 +27,13 @@ dbHeaderFormat = {
     "reservedSpaceOffset": 20,
     "reservedSpaceLen": 1,
 
+    "fileChangeCounterOffset": 24,
+    "fileChangeCounterLen": 4,
+
+    # 1: UTF-8, 2: UTF-16le, 3: UTF-16be (See textEncodings)
+    "textEncodingOffset": 56,
+    "textEncodingLen": 4,
+
 
     # Normal SQLite has freelist (trunk|leaf) info in page#1
     "freelistTrunkHeadOffset": 32,
@@ -47,9 +64,15 @@ btreeHeaderFormat = {
     "nCellsLen": 2,
     "cellContentAreaOffset": 5,
     "cellContentAreaLen": 2,
+    "nFragmentedBytesOffset": 7,
+    "nFragmentedBytesLen": 1,
     "rightmostChildPageNumOffset": 8,
     "rightmostChildPageNumLen": 4,
 
+    # Whole interior header at once:
+    # (flag, freeBlock, nCells, cellContentArea, nFragmentedBytes, rightmost)
+    "structFormat": ">BHHHBI",
+
     "indexInteriorPageFlag": 0x02,
     "indexLeafPageFlag": 0x0A,
     "tableInteriorPageFlag": 0x05,
@@ -61,6 +84,14 @@ btreeHeaderFormat = {
 
 sqlite_master = {
     "tableName": "sqlite_master",
+    "rootPage": 1,
+}
+
+# Python codec names of database text encodings in DB header
+textEncodings = {
+    1: "utf-8",
+    2: "utf-16-le",
+    3: "utf-16-be",
 }
 
 cellPointerArrayFormat = {
@@ -72,6 +103,17 @@ cellPointerArrayFormat = {
     "elemLen": 2,
 }
 
+freeBlockFormat = {
+    # Each freeblock begins with the offset of the next one (0 for the last)
+    # and its own size including these 4 bytes
+    "nextFreeBlockOffset": 0,
+    "nextFreeBlockLen": 2,
+    "sizeOffset": 2,
+    "sizeLen": 2,
+
+    "minLen": 4,
+}
+
 cellFormat = {
     # See "Extracting SQLite records - DFRWS"
     # Payload is:
@@ -99,6 +141,33 @@ varintFormat = {
     "maxLen": 9,
 }
 
+# Write-ahead log (<db>-wal). See: http://www.sqlite.org/fileformat2.html -
+#   The Write-Ahead Log
+walHeaderFormat = {
+    "len": 32,
+    # magic, format version, page size, checkpoint sequence number,
+    # salt-1, salt-2, checksum-1, checksum-2
+    "structFormat": ">IIIIIIII",
+    # Checksum covers the header before checksums
+    "checksumCoveredLen": 24,
+
+    # Checksums are computed with big-endian words if the LSB of magic is 1
+    "magicLittleEndian": 0x377f0682,
+    "magicBigEndian": 0x377f0683,
+    "formatVersion": 3007000,
+
+    "suffix": "-wal",
+}
+
+walFrameHeaderFormat = {
+    "len": 24,
+    # page number, DB size in pages after commit (0 if not a commit frame),
+    # salt-1, salt-2, checksum-1, checksum-2
+    "structFormat": ">IIIIII",
+    # Checksum covers these of the header, then the page image
+    "checksumCoveredLen": 8,
+}
+
 freelistTrunkPageFormat = {
     "nextTrunkPageOffset": 0,
     "nextTrunkPageLen": 4,
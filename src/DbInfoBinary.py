@@ -0,0 +1,410 @@
+# Compact binary form of dbinfo (See DbInfoTemplate.py).
+#
+# Unlike JSON, pages can be loaded one by one without reading the rest
+# of the file since every page and cell has a fixed-width record.
+#
+# Layout (all integers are little-endian):
+#   header       _headerStruct
+#   metadata     JSON of {"dbMetadata": ..., "btreeNames": [...]}
+#   page table   _pageStruct * nPages   (record of page#N is (N-1)th)
+#   cell table   _cellStruct * nCells   (cells of a page are contiguous)
+#   aux table    uint32 * nAux          (freelistLeafPageNums, or
+#                                        offset and size of freeBlocks)
+import json
+import mmap
+import struct
+from DbInfoTemplate import pageTypeList, pageAccessor
+
+
+_magic = b"SQVDBIN\x00"
+_version = 4
+
+# magic, version, nPages, metaOffset, metaLen,
+# pageTableOffset, cellTableOffset, nCells, auxTableOffset, nAux
+_headerStruct = struct.Struct("<8sIIQQQQQQQ")
+
+# Optional integer members of pageMetadata, in record order.
+# Never reorder; append only (and bump _version).
+_pageIntFields = (
+    "nCells",
+    "freeBlockOffset",
+    "cellContentAreaOffset",
+    "rightmostChildPageNum",
+    "nextOverflowPageNum",
+    "pgnoRoot",
+    "nextFreelistTrunkPageNum",
+    "nFreelistLeaves",
+    "contentHash",
+    "nFragmentedBytes",
+    "nFreeBlockBytes",
+    "nUnallocatedBytes",
+    "walFrame",
+)
+# pageType (0: not analyzed), flags, livingBtree id (0: none),
+# presentMask, nullMask, _pageIntFields..., firstCell, nCells,
+# firstAux, nAux
+_pageStruct = struct.Struct("<BBIHH%dIQIQI" % len(_pageIntFields))
+
+_PAGE_HAS_CELLS = 0x01
+_PAGE_HAS_FREELIST_LEAVES = 0x02
+_PAGE_HAS_FREE_BLOCKS = 0x04
+
+# Optional integer members of a cell, in record order
+_cellIntFields = (
+    "offset",
+    "cellSize",
+    "leftChildPage",
+    "rid",
+    "overflowPage",
+)
+_CELL_HAS_PAYLOAD = 0x80
+# presentMask, nullMask, _cellIntFields...,
+# payload offset, headerSize, bodySize
+_cellStruct = struct.Struct("<BBIIIQIIII")
+
+_auxStruct = struct.Struct("<I")
+
+
+def writeDbinfoBinary(outPath, dbinfo):
+    """
+    @desc  Pages are read with field accessors (See PageTable.py)
+      without building dict-shaped pages. Page, cell and aux records of
+      each page are written at once to their tables through separate
+      file objects.
+
+    @param dbinfo  See DbInfoTemplate.py
+    """
+    dbMetadata = dbinfo["dbMetadata"]
+    # (pages may be any mapping, ex: DbInfoBinaryReader)
+    pages = pageAccessor(dbinfo["pages"])
+    nPages = dbMetadata["nPages"]
+
+    # Intern livingBtree names and count cells and aux values at once
+    btreeNames = [btree["name"] for btree in dbMetadata["btrees"]]
+    btreeIds = dict((name, i + 1) for i, name in enumerate(btreeNames))
+    nCells = 0
+    nAux = 0
+    for pageNum in range(1, nPages + 1):
+        if pages.getPageType(pageNum) is None:
+            continue
+        name = pages.getLivingBtree(pageNum)
+        if name is not None and name not in btreeIds:
+            btreeNames.append(name)
+            btreeIds[name] = len(btreeNames)
+        nCells += pages.getCellCount(pageNum) or 0
+        nAux += len(_auxValues(pages, pageNum))
+
+    meta = json.dumps({"dbMetadata": dbMetadata, "btreeNames": btreeNames},
+                      separators=(",", ":")).encode("utf-8")
+    metaOffset = _headerStruct.size
+    pageTableOffset = metaOffset + len(meta)
+    cellTableOffset = pageTableOffset + _pageStruct.size * nPages
+    auxTableOffset = cellTableOffset + _cellStruct.size * nCells
+
+    with open(outPath, "wb") as f_bin:
+        f_bin.write(_headerStruct.pack(
+            _magic, _version, nPages, metaOffset, len(meta),
+            pageTableOffset, cellTableOffset, nCells, auxTableOffset, nAux))
+        f_bin.write(meta)
+        f_bin.flush()
+        with open(outPath, "r+b") as f_cells, \
+                open(outPath, "r+b") as f_aux:
+            f_cells.seek(cellTableOffset)
+            f_aux.seek(auxTableOffset)
+            iCell = 0
+            iAux = 0
+            for pageNum in range(1, nPages + 1):
+                if pages.getPageType(pageNum) is None:
+                    f_bin.write(b"\x00" * _pageStruct.size)
+                    continue
+                nPageCells = pages.getCellCount(pageNum)
+                auxValues = _auxValues(pages, pageNum)
+                f_bin.write(_packPage(pages, pageNum, btreeIds, iCell,
+                                      nPageCells, iAux, len(auxValues)))
+                if nPageCells is not None:
+                    for cell in pages.iterCells(pageNum):
+                        f_cells.write(_packCell(cell))
+                    iCell += nPageCells
+                for value in auxValues:
+                    f_aux.write(_auxStruct.pack(value))
+                iAux += len(auxValues)
+        assert (iCell, iAux) == (nCells, nAux)
+
+
+def isDbinfoBinary(path):
+    with open(path, "rb") as f_bin:
+        return f_bin.read(len(_magic)) == _magic
+
+
+def _auxValues(pages, pageNum):
+    """
+    @return  Aux table entries of a page. No page has both
+      freelistLeafPageNums (freelist trunk) and freeBlocks (b-tree page).
+    """
+    freelistLeafPageNums = pages.getFreelistLeafPageNums(pageNum)
+    freeBlocks = pages.getFreeBlocks(pageNum)
+    if freelistLeafPageNums is not None:
+        assert freeBlocks is None
+        return freelistLeafPageNums
+    values = []
+    for freeBlock in freeBlocks or ():
+        values += [freeBlock["offset"], freeBlock["size"]]
+    return values
+
+
+def _packPage(pages, pageNum, btreeIds, iCell, nCells, iAux, nAux):
+    """
+    @param nCells  Number of cells, or None if the page has no "cells"
+    """
+    pageMetadata = pages.getPageMetadataDict(pageNum)
+    (presentMask, nullMask, values) = _packIntFields(
+        pageMetadata, _pageIntFields)
+    flags = 0
+    if nCells is not None:
+        flags |= _PAGE_HAS_CELLS
+    if pages.getFreelistLeafPageNums(pageNum) is not None:
+        flags |= _PAGE_HAS_FREELIST_LEAVES
+    if pages.getFreeBlocks(pageNum) is not None:
+        flags |= _PAGE_HAS_FREE_BLOCKS
+    return _pageStruct.pack(
+        pageTypeList.index(pageMetadata["pageType"]) + 1,
+        flags,
+        btreeIds.get(pageMetadata.get("livingBtree"), 0),
+        presentMask, nullMask,
+        *(values + [iCell, nCells or 0, iAux, nAux]))
+
+
+def _packCell(cell):
+    (presentMask, nullMask, values) = _packIntFields(cell, _cellIntFields)
+    payload = cell.get("payload")
+    if payload is not None:
+        presentMask |= _CELL_HAS_PAYLOAD
+        values += [payload["offset"],
+                   payload["headerSize"],
+                   payload["bodySize"]]
+    else:
+        values += [0, 0, 0]
+    return _cellStruct.pack(presentMask, nullMask, *values)
+
+
+def _packIntFields(d, fields):
+    presentMask = 0
+    nullMask = 0
+    values = []
+    for i, field in enumerate(fields):
+        value = 0
+        if field in d:
+            presentMask |= 1 << i
+            if d[field] is None:
+                nullMask |= 1 << i
+            else:
+                value = d[field]
+        values.append(value)
+    return (presentMask, nullMask, values)
+
+
+def _unpackIntFields(d, fields, presentMask, nullMask, values):
+    for i, field in enumerate(fields):
+        if presentMask & (1 << i):
+            d[field] = None if nullMask & (1 << i) else values[i]
+
+
+def _freeBlocksFromAux(aux):
+    return [{"offset": aux[i], "size": aux[i + 1]}
+            for i in range(0, len(aux), 2)]
+
+
+class DbInfoBinaryReader(object):
+    """
+    @desc  Memory-maps a binary dbinfo and decodes pages on demand.
+      Acts as the "pages" mapping of dbinfo (keyed by int page number).
+
+    @usage
+    reader = DbInfoBinaryReader('/path/to/dbinfo.bin')
+    dbinfo = reader.getDbinfo()  # Pages are not read yet
+    page = reader[3]
+    """
+    def __init__(self, binPath):
+        with open(binPath, "rb") as f_bin:
+            self._mmap = mmap.mmap(f_bin.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        (magic, version, self._nPages, metaOffset, metaLen,
+         self._pageTableOffset, self._cellTableOffset, self._nCells,
+         self._auxTableOffset, self._nAux) = _headerStruct.unpack_from(
+            self._mmap, 0)
+        assert magic == _magic, "Not a binary dbinfo: %s" % (binPath)
+        assert version == _version, (
+            "Unsupported binary dbinfo version: %d" % (version))
+        meta = json.loads(
+            self._mmap[metaOffset:metaOffset + metaLen].decode("utf-8"))
+        self._dbMetadata = meta["dbMetadata"]
+        self._btreeNames = meta["btreeNames"]
+
+    def getDbinfo(self):
+        return {
+            "dbMetadata": self._dbMetadata,
+            "pages": self,
+        }
+
+    def getPageRange(self, firstPage, lastPage):
+        """
+        @return  {pageNum: page} of analyzed pages in [firstPage, lastPage]
+        """
+        return dict((pageNum, self[pageNum])
+                    for pageNum in range(firstPage, lastPage + 1)
+                    if pageNum in self)
+
+    def close(self):
+        self._mmap.close()
+
+    def __contains__(self, pageNum):
+        if not 1 <= pageNum <= self._nPages:
+            return False
+        return self._pageTypeId(pageNum) != 0
+
+    def __getitem__(self, pageNum):
+        if pageNum not in self:
+            raise KeyError(pageNum)
+        record = self._pageRecord(pageNum)
+        page = {"pageMetadata": self._buildPageMetadata(record)}
+        flags = record[1]
+        if flags & _PAGE_HAS_CELLS:
+            page["cells"] = list(self._iterRecordCells(record))
+        if flags & _PAGE_HAS_FREELIST_LEAVES:
+            page["freelistLeafPageNums"] = self._readAux(record)
+        if flags & _PAGE_HAS_FREE_BLOCKS:
+            page["freeBlocks"] = _freeBlocksFromAux(self._readAux(record))
+        return page
+
+    def __iter__(self):
+        for pageNum in range(1, self._nPages + 1):
+            if pageNum in self:
+                yield pageNum
+
+    def __len__(self):
+        return sum(1 for pageNum in self)
+
+    def get(self, pageNum, default=None):
+        return self[pageNum] if pageNum in self else default
+
+    def getPageType(self, pageNum):
+        """
+        @return  pageType of page#pageNum, or None if absent
+          (Same as PageTable.getPageType)
+        """
+        pageTypeId = self._pageTypeId(pageNum) if pageNum in self else 0
+        return pageTypeList[pageTypeId - 1] if pageTypeId > 0 else None
+
+    def getLivingBtree(self, pageNum):
+        btreeId = self._pageRecord(pageNum)[2]
+        return self._btreeNames[btreeId - 1] if btreeId > 0 else None
+
+    def getPageMetadata(self, pageNum, field, default=None):
+        """
+        @return  pageMetadata[field] of page#pageNum without reading cells
+          (Same as PageTable.getPageMetadata)
+        """
+        if field == "pageType":
+            return self.getPageType(pageNum)
+        if field == "livingBtree":
+            return self.getLivingBtree(pageNum)
+        record = self._pageRecord(pageNum)
+        (presentMask, nullMask) = record[3:5]
+        i = _pageIntFields.index(field)
+        if not presentMask & (1 << i):
+            return default
+        if nullMask & (1 << i):
+            return None
+        return record[5 + i]
+
+    def getPageMetadataDict(self, pageNum):
+        return self._buildPageMetadata(self._pageRecord(pageNum))
+
+    def getCellCount(self, pageNum):
+        """
+        @return  Number of cells of page#pageNum, or None if the page
+          has no "cells" (Same as PageTable.getCellCount)
+        """
+        record = self._pageRecord(pageNum)
+        if not record[1] & _PAGE_HAS_CELLS:
+            return None
+        return record[6 + len(_pageIntFields)]
+
+    def iterCells(self, pageNum):
+        return self._iterRecordCells(self._pageRecord(pageNum))
+
+    def getFreelistLeafPageNums(self, pageNum):
+        record = self._pageRecord(pageNum)
+        if not record[1] & _PAGE_HAS_FREELIST_LEAVES:
+            return None
+        return self._readAux(record)
+
+    def getFreeBlocks(self, pageNum):
+        record = self._pageRecord(pageNum)
+        if not record[1] & _PAGE_HAS_FREE_BLOCKS:
+            return None
+        return _freeBlocksFromAux(self._readAux(record))
+
+    def iterCellValues(self, pageNum, field):
+        """
+        @return  Iterator of cell[field] of each cell of page#pageNum
+          without building cells (Same as PageTable.iterCellValues)
+        """
+        record = self._pageRecord(pageNum)
+        (firstCell, nCells) = record[5 + len(_pageIntFields):][:2]
+        if not record[1] & _PAGE_HAS_CELLS:
+            return
+        i = _cellIntFields.index(field)
+        for iCell in range(firstCell, firstCell + nCells):
+            cellRecord = _cellStruct.unpack_from(
+                self._mmap, self._cellTableOffset + _cellStruct.size * iCell)
+            (presentMask, nullMask) = cellRecord[:2]
+            if presentMask & (1 << i) and not nullMask & (1 << i):
+                yield cellRecord[2 + i]
+            else:
+                yield None
+
+    def _pageRecord(self, pageNum):
+        return _pageStruct.unpack_from(
+            self._mmap,
+            self._pageTableOffset + _pageStruct.size * (pageNum - 1))
+
+    def _buildPageMetadata(self, record):
+        (pageTypeId, flags, btreeId, presentMask, nullMask) = record[:5]
+        pageMetadata = {"pageType": pageTypeList[pageTypeId - 1]}
+        _unpackIntFields(pageMetadata, _pageIntFields, presentMask, nullMask,
+                         record[5:5 + len(_pageIntFields)])
+        if btreeId > 0:
+            pageMetadata["livingBtree"] = self._btreeNames[btreeId - 1]
+        return pageMetadata
+
+    def _iterRecordCells(self, record):
+        (firstCell, nCells) = record[5 + len(_pageIntFields):][:2]
+        for iCell in range(firstCell, firstCell + nCells):
+            yield self._readCell(iCell)
+
+    def _readAux(self, record):
+        (firstAux, nAux) = record[5 + len(_pageIntFields):][2:]
+        return list(struct.unpack_from(
+            "<%dI" % nAux, self._mmap,
+            self._auxTableOffset + _auxStruct.size * firstAux))
+
+    def _pageTypeId(self, pageNum):
+        offset = self._pageTableOffset + _pageStruct.size * (pageNum - 1)
+        return struct.unpack_from("<B", self._mmap, offset)[0]
+
+    def _readCell(self, iCell):
+        record = _cellStruct.unpack_from(
+            self._mmap, self._cellTableOffset + _cellStruct.size * iCell)
+        (presentMask, nullMask) = record[:2]
+        cell = {}
+        _unpackIntFields(cell, _cellIntFields,
+                         presentMask, nullMask, record[2:])
+        if presentMask & _CELL_HAS_PAYLOAD:
+            (offset, headerSize, bodySize) = record[2 + len(_cellIntFields):]
+            cell["payload"] = {
+                "offset": offset,
+                "headerSize": headerSize,
+                "bodySize": bodySize,
+            }
+        return cell
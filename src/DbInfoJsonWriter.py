@@ -0,0 +1,95 @@
+import json
+
+
+class DbInfoJsonWriter(object):
+    """
+    @desc  Writes dbinfo (See DbInfoTemplate.py) as JSON incrementally:
+      dbMetadata first, then each page under "pages".
+      Only one page is serialized at a time, so memory does not grow
+      with the size of the whole JSON text.
+
+    @param indent  Same as json.dumps(). None for compact output.
+
+    @usage
+    writer = DbInfoJsonWriter(f_json)
+    writer.writeDbMetadata(dbinfo["dbMetadata"])
+    for pageNum in sorted(dbinfo["pages"]):
+        writer.writePage(pageNum, dbinfo["pages"][pageNum])
+    writer.close()
+    """
+    def __init__(self, fileObj, indent=2):
+        self._f = fileObj
+        self._indent = indent
+        if indent is None:
+            self._separators = (",", ":")
+            self._newline = ""
+        else:
+            self._separators = (",", ": ")
+            self._newline = "\n"
+        self._nPages = 0
+        self._f.write("{")
+
+    def writeDbMetadata(self, dbMetadata):
+        assert self._nPages == 0
+        self._writeMember(1, "dbMetadata", dbMetadata)
+        self._f.write(",")
+        self._writeKey(1, "pages")
+        self._f.write("{")
+
+    def writePage(self, pageNum, page):
+        if self._nPages > 0:
+            self._f.write(",")
+        self._writeMember(2, str(pageNum), page)
+        self._nPages += 1
+
+    def close(self):
+        if self._nPages > 0:
+            self._f.write(self._newline + self._pad(1))
+        self._f.write("}" + self._newline + "}")
+
+    def _writeKey(self, level, key):
+        self._f.write("%s%s%s%s" % (self._newline, self._pad(level),
+                                    json.dumps(key), self._separators[1]))
+
+    def _writeMember(self, level, key, value):
+        self._writeKey(level, key)
+        s = json.dumps(value, indent=self._indent,
+                       separators=self._separators)
+        if self._indent is not None:
+            # Nest under the enclosing objects
+            s = s.replace("\n", "\n" + self._pad(level))
+        self._f.write(s)
+
+    def _pad(self, level):
+        if self._indent is None:
+            return ""
+        return " " * (self._indent * level)
+
+
+def writeDbinfo(fileObj, dbinfo, compact=False):
+    """
+    >>> import StringIO
+    >>> f = StringIO.StringIO()
+    >>> writeDbinfo(f, {"dbMetadata": {"nPages": 1},
+    ...                 "pages": {1: {"cells": []}}}, compact=True)
+    >>> f.getvalue()
+    '{"dbMetadata":{"nPages":1},"pages":{"1":{"cells":[]}}}'
+    >>> f = StringIO.StringIO()
+    >>> writeDbinfo(f, {"dbMetadata": {"nPages": 0}, "pages": {}})
+    >>> json.loads(f.getvalue())
+    {u'pages': {}, u'dbMetadata': {u'nPages': 0}}
+    """
+    writer = DbInfoJsonWriter(fileObj, indent=None if compact else 2)
+    writer.writeDbMetadata(dbinfo["dbMetadata"])
+    pages = dbinfo["pages"]
+    for pageNum in sorted(pages):
+        writer.writePage(pageNum, pages[pageNum])
+    writer.close()
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -1,5 +1,7 @@
 # This includes dynamically analyzed data from SQLite databases.
 # Redundant information for visualization is contained.
+# SQLiteAnalyzer holds "pages" in a PageTable (See PageTable.py),
+# which gives pages of this shape on access.
 
 
 class BtreeType:
@@ -19,6 +21,21 @@ class PageType:
     UNCERTAIN = "uncertain page"
 
 
+# Fixed order of page types. Compact (binary) dbinfo representations
+# store a page type as its index in this list. Never reorder; append only.
+pageTypeList = [
+    PageType.TABLE_INTERIOR,
+    PageType.TABLE_LEAF,
+    PageType.INDEX_INTERIOR,
+    PageType.INDEX_LEAF,
+    PageType.OVERFLOW,
+    PageType.FREELIST_TRUNK,
+    PageType.FREELIST_LEAF,
+    PageType.FREELIST_MAP,
+    PageType.UNCERTAIN,
+]
+
+
 class CellContent:
     LEFT_CHILD_PAGE_NUM = "left child page num"
     PAYLOAD_SIZE = "payload size"
@@ -58,6 +75,17 @@ def get_dbinfo_template():
           "nFreelistPages": None,  # UINT
           # Prealloc SQLite
           "freelistMapHead": None,  # UINT
+          # Names of btrees analyzed when only pages of them are
+          # (See SQLiteAnalyzer filterBtrees). None if all pages are.
+          "filterBtrees": None,  # [str, ...]
+          # Write-ahead log overlaid on the DB file (See SQLiteAnalyzer
+          # readWal). None without WAL (or committed frames in it).
+          "wal": None,
+          # {
+          #   "nFrames": 12,  # Committed frames
+          #   "nPages": 5,  # Pages in them
+          #   "checkpointSequence": 0,
+          # }
         },
       "pages":
         {
@@ -85,6 +113,15 @@ def get_dbinfo_template():
           #         # [TABLE_LEAF, TABLE_INTERIOR, INDEX_LEAF, INDEX_INTERIOR]
           #         "cellContentAreaOffset": None, # UINT
           #
+          #         # [TABLE_LEAF, TABLE_INTERIOR, INDEX_LEAF, INDEX_INTERIOR]
+          #         # Free space (See README.org - Measure free space):
+          #         # fragments of less than 4 bytes (in b-tree header),
+          #         "nFragmentedBytes": None, # UINT
+          #         # sum of sizes of "freeBlocks",
+          #         "nFreeBlockBytes": None, # UINT
+          #         # and bytes between cell pointer array and cell content area
+          #         "nUnallocatedBytes": None, # UINT
+          #
           #         # [OVERFLOW]
           #         "nextOverflowPageNum": None, # UINT
           #
@@ -95,6 +132,16 @@ def get_dbinfo_template():
           #         # [TABLE_INTERIOR, INDEX_INTERIOR]
           #         "rightmostChildPageNum": None, # UINT
           #
+          #         # [TABLE_LEAF, TABLE_INTERIOR,
+          #         #  INDEX_LEAF, INDEX_INTERIOR, OVERFLOW, UNCERTAIN]
+          #         # CRC-32 of the page; used by incremental analysis
+          #         "contentHash": None, # UINT
+          #
+          #         # [Any]
+          #         # Latest committed frame# of the page in the WAL
+          #         # (only for pages read from the WAL)
+          #         "walFrame": None, # UINT
+          #
           #         # [FREELIST_TRUNK]
           #         # "nextFreelistTrunkPageNum": None,  # UINT
           #
@@ -143,6 +190,10 @@ def get_dbinfo_template():
           #       ]
           #     # [FREELIST_TRUNK]
           #     "freelistLeafPageNums": [3, 4, 8, ...],  # Leaf page num
+          #
+          #     # [TABLE_LEAF, TABLE_INTERIOR, INDEX_LEAF, INDEX_INTERIOR]
+          #     # Freeblock chain in order
+          #     "freeBlocks": [{"offset": 1000, "size": 24}, ...],
           #   },
           # 2:
           #   ...
@@ -152,9 +203,12 @@ def get_dbinfo_template():
 
 
 def pgnoRoot2btreeName(dbinfo, pgnoRoot):
-    if str(pgnoRoot) not in dbinfo["pages"]:
+    pages = dbinfo["pages"]
+    # Pages are keyed by str when dbinfo is loaded from JSON
+    pageKey = pgnoRoot if pgnoRoot in pages else str(pgnoRoot)
+    if pageKey not in pages:
         return None
-    pageMetadata = dbinfo["pages"][str(pgnoRoot)]["pageMetadata"]
+    pageMetadata = pages[pageKey]["pageMetadata"]
     if pageMetadata["pageType"] in (
         PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
         PageType.TABLE_LEAF, PageType.TABLE_INTERIOR):
@@ -163,6 +217,63 @@ def pgnoRoot2btreeName(dbinfo, pgnoRoot):
         return None
 
 
+class _DictPages(object):
+    """
+    @desc  Field accessors of PageTable over dict-shaped pages
+      (ex: loaded from JSON, keyed by str)
+    """
+    def __init__(self, pages):
+        self._pages = pages
+
+    def getPageType(self, pageNum):
+        return self.getPageMetadata(pageNum, "pageType")
+
+    def getLivingBtree(self, pageNum):
+        return self.getPageMetadata(pageNum, "livingBtree")
+
+    def getPageMetadata(self, pageNum, field, default=None):
+        page = self._getPage(pageNum)
+        if page is None:
+            return default
+        return page["pageMetadata"].get(field, default)
+
+    def iterCellValues(self, pageNum, field):
+        for cell in self._getPage(pageNum).get("cells", []):
+            yield cell.get(field)
+
+    def getPageMetadataDict(self, pageNum):
+        return self._getPage(pageNum)["pageMetadata"]
+
+    def getCellCount(self, pageNum):
+        cells = self._getPage(pageNum).get("cells")
+        return None if cells is None else len(cells)
+
+    def iterCells(self, pageNum):
+        return iter(self._getPage(pageNum).get("cells", []))
+
+    def getFreelistLeafPageNums(self, pageNum):
+        return self._getPage(pageNum).get("freelistLeafPageNums")
+
+    def getFreeBlocks(self, pageNum):
+        return self._getPage(pageNum).get("freeBlocks")
+
+    def _getPage(self, pageNum):
+        page = self._pages.get(pageNum)
+        if page is None:
+            page = self._pages.get(str(pageNum))
+        return page
+
+
+def pageAccessor(pages):
+    """
+    @return  pages itself if it has field accessors
+      (PageTable, DbInfoBinaryReader), otherwise its wrapper
+    """
+    if hasattr(pages, "getPageType"):
+        return pages
+    return _DictPages(pages)
+
+
 def _test():
     import doctest
     doctest.testmod()
@@ -0,0 +1,230 @@
+import SvgConfig
+import DbInfoTemplate
+from DbInfoTemplate import PageType, pageAccessor
+from DbInfoBinary import DbInfoBinaryReader
+from PngWriter import PngWriter
+from SvgWriter import SvgWriter
+import os
+
+
+class Json2Png(object):
+    """
+    @desc  Raster version of long-shot view (See Json2Svg longshot).
+      Each page is a square of blockSize pixels filled with its btree
+      color, bordered with the color of its page type.
+      (Pages smaller than 3 pixels have no border. A page without btree
+      color takes the color of its page type in that case.)
+      Pixels are written as they are computed and no object is created
+      per page, so databases with millions of pages are fine.
+      Colors of btrees and page types are written in a separate SVG
+      legend.
+
+    @usage
+    json2Png = Json2Png()
+    json2Png.initByDbinfo(analyzer.getDbinfo(), '/path/to/out.png')
+    json2Png.dumpPng()  # Also writes /path/to/out-legend.svg
+    """
+    def initByDbinfo(self, dbinfo, pngPath,
+                     filterBtrees=[],
+                     displayFreelistPages=True,
+                     pageRange=None,
+                     legendPath=None,
+                     nCols=SvgConfig.pageLongshotPng["nCols"],
+                     blockSize=SvgConfig.pageLongshotPng["blockSize"]):
+        """
+        @param dbinfo  See DbInfoTemplate.py. Ex: SQLiteAnalyzer.getDbinfo()
+        @param filterBtrees  Same as Json2Svg
+        @param pageRange  (firstPage, lastPage) to draw. All pages if None.
+        @param legendPath  Output SVG path of legend.
+          "<pngPath without extension>-legend.svg" if None.
+        """
+        assert nCols > 0 and blockSize > 0
+        self._dbinfo = dbinfo
+        self._pages = pageAccessor(dbinfo["pages"])
+        self._pngPath = pngPath
+        if len(filterBtrees) == 0:
+            filterBtrees = dbinfo["dbMetadata"].get("filterBtrees") or []
+        self._filterBtrees = filterBtrees
+        self._displayFreelistPages = displayFreelistPages
+        if pageRange is None:
+            pageRange = (1, dbinfo["dbMetadata"]["nPages"])
+        (self._firstPage, self._lastPage) = pageRange
+        if legendPath is None:
+            legendPath = os.path.splitext(pngPath)[0] + "-legend.svg"
+        self._legendPath = legendPath
+        self._nCols = nCols
+        self._blockSize = blockSize
+
+        btreeList = dbinfo["dbMetadata"]["btrees"]
+        if len(filterBtrees) > 0:
+            self._filteredBtreeList = [
+                btree for btree in btreeList
+                if btree["name"] in filterBtrees]
+        else:
+            self._filteredBtreeList = btreeList
+
+    def initByBinaryPath(self, binPath, pngPath, **kwargs):
+        """
+        @desc  Only pages in pageRange are read from binary dbinfo
+          (See DbInfoBinary.py). Cells are never read.
+        """
+        reader = DbInfoBinaryReader(binPath)
+        self.initByDbinfo(reader.getDbinfo(), pngPath, **kwargs)
+
+    def dumpPng(self):
+        self._setBtreeColorDict()
+        nPages = self._lastPage - self._firstPage + 1
+        nRows = max(1, (nPages + self._nCols - 1) / self._nCols)
+        with open(self._pngPath, "wb") as f_png:
+            writer = PngWriter(f_png,
+                               self._nCols * self._blockSize,
+                               nRows * self._blockSize)
+            for iRow in range(nRows):
+                first = self._firstPage + iRow * self._nCols
+                last = min(first + self._nCols - 1, self._lastPage)
+                self._drawPageRow(writer, first, last)
+            writer.close()
+        self._dumpLegend()
+
+    def _setBtreeColorDict(self):
+        # Same colors as Json2Svg
+        self._btreeColorDict = {}
+        for i, btree in enumerate(self._filteredBtreeList):
+            colorPalette = SvgConfig.btreeColorPalette
+            self._btreeColorDict[btree["name"]] = colorPalette[
+                i % len(colorPalette)]
+        # Pixel rows of a page, keyed by (fillColor, borderColor, blockSize)
+        self._blockRowsCache = {}
+        self._pgnoRootColorCache = {}
+
+    def _drawPageRow(self, writer, firstPage, lastPage):
+        """
+        @desc  Writes pixel rows of pages in [firstPage, lastPage]
+        """
+        blocks = [self._blockRows(*self._pageColors(pageNum,
+                                                    self._blockSize))
+                  for pageNum in range(firstPage, lastPage + 1)]
+        # Fill the rest of the last row
+        defaultColor = SvgConfig.pageLongshotPng["defaultColor"]
+        blocks.extend([self._blockRows(defaultColor, defaultColor)] *
+                      (self._nCols - len(blocks)))
+        for i in range(self._blockSize):
+            writer.writeRow(b"".join(block[i] for block in blocks))
+
+    def _pageColors(self, pageNum, blockSize):
+        """
+        @return  (fillColor, borderColor) of page#pageNum drawn in
+          blockSize pixels square
+        """
+        defaultColor = SvgConfig.pageLongshotPng["defaultColor"]
+        pageType = self._pages.getPageType(pageNum)
+        if pageType is None:  # Not analyzed
+            return (defaultColor, defaultColor)
+        borderColor = SvgConfig.page[pageType + "strokeColor"]
+
+        fillColor = defaultColor
+        if pageType in (PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
+                        PageType.TABLE_LEAF, PageType.TABLE_INTERIOR):
+            fillColor = self._btreeColorDict.get(
+                self._pages.getLivingBtree(pageNum), defaultColor)
+            if blockSize < 3:
+                borderColor = fillColor
+        elif pageType in (PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF,
+                          PageType.FREELIST_MAP):
+            if not self._displayFreelistPages:
+                return (defaultColor, defaultColor)
+            fillColor = self._pgnoRootColor(
+                self._pages.getPageMetadata(pageNum, "pgnoRoot"))
+        if blockSize < 3 and fillColor == defaultColor:
+            fillColor = borderColor
+        return (fillColor, borderColor)
+
+    def _pgnoRootColor(self, pgnoRoot):
+        """
+        @return  Color of btree freelist page belongs to (prealloc SQLite)
+        """
+        if pgnoRoot not in self._pgnoRootColorCache:
+            color = SvgConfig.pageLongshotPng["defaultColor"]
+            if pgnoRoot is not None:
+                btreeName = DbInfoTemplate.pgnoRoot2btreeName(
+                    self._dbinfo, pgnoRoot)
+                color = self._btreeColorDict.get(btreeName, color)
+            self._pgnoRootColorCache[pgnoRoot] = color
+        return self._pgnoRootColorCache[pgnoRoot]
+
+    def _blockRows(self, fillColor, borderColor, blockSize=None):
+        """
+        @return  blockSize pixel rows (RGB bytes) of a page
+        """
+        if blockSize is None:
+            blockSize = self._blockSize
+        key = (fillColor, borderColor, blockSize)
+        if key not in self._blockRowsCache:
+            fill = _colorToRgbBytes(fillColor)
+            border = _colorToRgbBytes(borderColor)
+            size = blockSize
+            if size < 3:
+                rows = [fill * size] * size
+            else:
+                edge = border * size
+                middle = border + fill * (size - 2) + border
+                rows = [edge] + [middle] * (size - 2) + [edge]
+            self._blockRowsCache[key] = rows
+        return self._blockRowsCache[key]
+
+    def _dumpLegend(self):
+        legendHeight = SvgConfig.btreeList["legendHeight"]
+        entries = [(btree["name"], self._btreeColorDict[btree["name"]],
+                    SvgConfig.btreeList["legendStrokeColor"])
+                   for btree in self._filteredBtreeList]
+        entries.extend(
+            (pageType, SvgConfig.pageLongshotPng["defaultColor"],
+             SvgConfig.page[pageType + "strokeColor"])
+            for pageType in DbInfoTemplate.pageTypeList)
+        with open(self._legendPath, "wb") as f_svg:
+            writer = SvgWriter(f_svg, encoding=SvgConfig.main["encoding"])
+            for i, (label, fillColor, strokeColor) in enumerate(entries):
+                x = SvgConfig.btreeList["x"]
+                y = SvgConfig.btreeList["y"] + legendHeight * i
+                writer.rect(
+                    x, y,
+                    legendHeight - 1, legendHeight - 1,
+                    fill=fillColor,
+                    strokeWidth=SvgConfig.btreeList["legendStrokeWidth"],
+                    stroke=strokeColor)
+                writer.text(
+                    label,
+                    x + legendHeight,
+                    y + SvgConfig.btreeList["legendTopMargin"],
+                    fontSize=SvgConfig.btreeList["legendFontSize"])
+            writer.close()
+
+
+def _colorToRgbBytes(color):
+    """
+    @param color  "#rrggbb", "#rgb" or color keyword (See SvgConfig.py)
+
+    >>> _colorToRgbBytes("#ff3333") == b"\\xff\\x33\\x33"
+    True
+    >>> _colorToRgbBytes("#0a0") == b"\\x00\\xaa\\x00"
+    True
+    >>> _colorToRgbBytes("LightSteelBlue") == b"\\xb0\\xc4\\xde"
+    True
+    """
+    if color.startswith("#"):
+        hexDigits = color[1:]
+        if len(hexDigits) == 3:
+            hexDigits = "".join(digit * 2 for digit in hexDigits)
+        assert len(hexDigits) == 6, "Invalid color: %s" % (color)
+        rgb = [int(hexDigits[i:i + 2], 16) for i in (0, 2, 4)]
+    else:
+        rgb = SvgConfig.namedColors[color.lower()]
+    return bytes(bytearray(rgb))
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
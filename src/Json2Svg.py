@@ -1,87 +1,266 @@
 import SvgConfig
 import DbFormatConfig
-import DbInfoTemplate
-from DbInfoTemplate import PageType
+from DbInfoTemplate import PageType, pageAccessor
+from DbInfoBinary import DbInfoBinaryReader
+from SvgWriter import SvgWriter
+from Profiler import nullProfiler
+import array
 import json
-import pysvg.structure
-import pysvg.builders
-import pysvg.text
+
+
+_btreePageTypes = (PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
+                   PageType.TABLE_LEAF, PageType.TABLE_INTERIOR)
+_freelistPageTypes = (PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF,
+                      PageType.FREELIST_MAP)
 
 
 class Json2Svg(object):
-    def initByJsonStr(self, jsonStr, svgPath,
-                      jsonEncoding=DbFormatConfig.main["dbInfoJsonEncoding"],
-                      filterBtrees=[],
-                      displayRid=False,
-                      displayFreelistPages=True,
-                      longshot=False):
-        self._dbinfo = json.loads(jsonStr, jsonEncoding)
+    _profiler = nullProfiler
+
+    def initByDbinfo(self, dbinfo, svgPath,
+                     filterBtrees=[],
+                     displayRid=False,
+                     displayFreelistPages=True,
+                     longshot=False,
+                     pageRange=None,
+                     displayRidRange=False,
+                     displayBtreeList=True,
+                     displayFreeSpace=False,
+                     fixedPageSlots=False,
+                     profiler=None):
+        """
+        @param dbinfo  See DbInfoTemplate.py. Ex: SQLiteAnalyzer.getDbinfo()
+        @param filterBtrees  Btrees to draw. Defaults to the btrees dbinfo
+          is analyzed for, if only they are (See SQLiteAnalyzer).
+        @param pageRange  (firstPage, lastPage) to draw. All pages if None.
+        @param displayRidRange  Label each table page with the range of
+          RIDs in it (lighter alternative to displayRid)
+        @param displayBtreeList  False to draw pages only
+          (ex: tiles of Json2Tiles, which has a separate legend)
+        @param displayFreeSpace  Draw freeblocks and unallocated space of
+          b-tree pages (See SvgConfig.freeSpace for colors)
+        @param fixedPageSlots  Draw page#N at (N - firstPage) page heights
+          from the top, leaving slots of pages not drawn blank, and draw
+          overflow and uncertain pages as well (ex: tiles of Json2Tiles,
+          whose viewer finds pages by their y)
+        @param profiler  Profiler (See Profiler.py) to record time of each
+          draw phase and numbers of SVG elements and bytes written with
+
+        >>> import tempfile
+        >>> def page(pageType, **metadata):
+        ...     metadata.update(pageType=pageType, nCells=0)
+        ...     return {"pageMetadata": metadata, "cells": []}
+        >>> dbinfo = {
+        ...   "dbMetadata": {"pageSize": 1024, "nPages": 3, "btrees": [
+        ...     {"type": "table", "name": "T", "tableName": "T",
+        ...      "rootPage": 1}]},
+        ...   "pages": {
+        ...     1: page(PageType.TABLE_LEAF, livingBtree="T"),
+        ...     2: page(PageType.OVERFLOW, nextOverflowPageNum=0),
+        ...     3: page(PageType.TABLE_LEAF, livingBtree="T")}}
+        >>> f_svg = tempfile.NamedTemporaryFile(suffix=".svg")
+        >>> json2Svg = Json2Svg()
+        >>> json2Svg.initByDbinfo(dbinfo, f_svg.name, displayBtreeList=False,
+        ...                       fixedPageSlots=True)
+        >>> json2Svg.dumpSvg()
+        >>> # Pages are 8px high: page#3 is in the 3rd slot after overflow one
+        >>> [line.split('"')[3] for line in open(f_svg.name)
+        ...  if line.startswith("<text")]
+        ['4', '12', '20']
+        """
+        self._dbinfo = {
+            "dbMetadata": dbinfo["dbMetadata"],
+            "pages": _intKeyedPages(dbinfo["pages"]),
+        }
         self._svgPath = svgPath
+        if len(filterBtrees) == 0:
+            filterBtrees = dbinfo["dbMetadata"].get("filterBtrees") or []
         self._filterBtrees = filterBtrees
         self._displayRid = displayRid
+        self._displayRidRange = displayRidRange
         self._displayFreelistPages = displayFreelistPages
         self._longshot = longshot
+        self._displayBtreeList = displayBtreeList
+        self._displayFreeSpace = displayFreeSpace
+        self._fixedPageSlots = fixedPageSlots
+        if pageRange is None:
+            pageRange = (1, dbinfo["dbMetadata"]["nPages"])
+        (self._firstPage, self._lastPage) = pageRange
+        if profiler is not None:
+            self._profiler = profiler
         self._initCommons()
 
+    def initByJsonStr(self, jsonStr, svgPath,
+                      jsonEncoding=DbFormatConfig.main["dbInfoJsonEncoding"],
+                      filterBtrees=[],
+                      displayRid=False,
+                      displayFreelistPages=True,
+                      longshot=False,
+                      displayRidRange=False,
+                      displayFreeSpace=False):
+        self.initByDbinfo(json.loads(jsonStr, jsonEncoding), svgPath,
+                          filterBtrees=filterBtrees,
+                          displayRid=displayRid,
+                          displayFreelistPages=displayFreelistPages,
+                          longshot=longshot,
+                          displayRidRange=displayRidRange,
+                          displayFreeSpace=displayFreeSpace)
+
     def initByJsonPath(self, jsonPath, svgPath,
                        jsonEncoding=DbFormatConfig.main["dbInfoJsonEncoding"],
                        filterBtrees=[],
                        displayRid=False,
                        displayFreelistPages=True,
-                       longshot=False):
+                       longshot=False,
+                       displayRidRange=False,
+                       displayFreeSpace=False):
         with open(jsonPath) as f_json:
-            self._dbinfo = json.load(f_json, jsonEncoding)
-        self._svgPath = svgPath
-        self._filterBtrees = filterBtrees
-        self._displayRid = displayRid
-        self._displayFreelistPages = displayFreelistPages
-        self._longshot = longshot
-        self._initCommons()
+            dbinfo = json.load(f_json, jsonEncoding)
+        self.initByDbinfo(dbinfo, svgPath,
+                          filterBtrees=filterBtrees,
+                          displayRid=displayRid,
+                          displayFreelistPages=displayFreelistPages,
+                          longshot=longshot,
+                          displayRidRange=displayRidRange,
+                          displayFreeSpace=displayFreeSpace)
+
+    def initByBinaryPath(self, binPath, svgPath,
+                         filterBtrees=[],
+                         displayRid=False,
+                         displayFreelistPages=True,
+                         longshot=False,
+                         pageRange=None,
+                         displayRidRange=False,
+                         displayFreeSpace=False,
+                         profiler=None):
+        """
+        @desc  Only pages in pageRange are read from binary dbinfo
+          (See DbInfoBinary.py).
+        """
+        reader = DbInfoBinaryReader(binPath)
+        self.initByDbinfo(reader.getDbinfo(), svgPath,
+                          filterBtrees=filterBtrees,
+                          displayRid=displayRid,
+                          displayFreelistPages=displayFreelistPages,
+                          longshot=longshot,
+                          pageRange=pageRange,
+                          displayRidRange=displayRidRange,
+                          displayFreeSpace=displayFreeSpace,
+                          profiler=profiler)
 
     def _initCommons(self):
         assert not (self._displayRid and self._longshot)
+        assert not (self._displayRidRange and self._longshot)
         btreeList = self._dbinfo["dbMetadata"]["btrees"]
 
-        if len(self._filterBtrees) > 0:
+        self._filterBtreeSet = set(self._filterBtrees)
+        if len(self._filterBtreeSet) > 0:
             self._filteredBtreeList = [
                 btree for btree in btreeList
-                if btree["name"] in self._filterBtrees]
+                if btree["name"] in self._filterBtreeSet]
         else:
             self._filteredBtreeList = btreeList
+        # Btree whose root page a freelist page had (prealloc SQLite)
+        self._rootPageToBtreeName = dict(
+            (btree["rootPage"], btree["name"]) for btree in btreeList)
+        self._indexPages()
+
+    def _indexPages(self):
+        """
+        @desc  Classifies analyzed pages in the range to draw at once,
+          by their metadata only (without building whole pages):
+          - _pageNumsByType: {pageType: array of page numbers}
+          - _pageNumsByBtree: {livingBtree: array of btree page numbers}
+          - _analyzedPageNums: array of all of them
+          Page numbers are in ascending order.
+        """
+        self._pages = pageAccessor(self._dbinfo["pages"])
+        self._pageNumsByType = {}
+        self._pageNumsByBtree = {}
+        self._analyzedPageNums = array.array("l")
+        for pageNum in xrange(self._firstPage, self._lastPage + 1):
+            pageType = self._pages.getPageType(pageNum)
+            if pageType is None:  # Not analyzed
+                continue
+            self._analyzedPageNums.append(pageNum)
+            if pageType not in self._pageNumsByType:
+                self._pageNumsByType[pageType] = array.array("l")
+            self._pageNumsByType[pageType].append(pageNum)
+            if pageType in _btreePageTypes:
+                btreeName = self._pages.getLivingBtree(pageNum)
+                if btreeName not in self._pageNumsByBtree:
+                    self._pageNumsByBtree[btreeName] = array.array("l")
+                self._pageNumsByBtree[btreeName].append(pageNum)
+
+    def _getPageNumsToDraw(self):
+        """
+        @return  Page numbers of pages in the page list (btree pages of
+          filterBtrees and freelist pages to display, and with
+          fixedPageSlots, pages of the other types) in ascending order
+        """
+        if self._fixedPageSlots:
+            return [pageNum for pageNum in self._analyzedPageNums
+                    if self._isPageToDraw(pageNum)]
+        pageNumLists = [
+            pageNums
+            for btreeName, pageNums in self._pageNumsByBtree.iteritems()
+            if self._isFilteredBtree(btreeName)]
+        if self._displayFreelistPages:
+            pageNumLists.extend(self._pageNumsByType.get(pageType, [])
+                                for pageType in _freelistPageTypes)
+        if len(pageNumLists) == 1:
+            return pageNumLists[0]
+        return sorted(pageNum for pageNums in pageNumLists
+                      for pageNum in pageNums)
+
+    def _isPageToDraw(self, pageNum):
+        pageType = self._pages.getPageType(pageNum)
+        if pageType in _btreePageTypes:
+            return self._isFilteredBtree(self._pages.getLivingBtree(pageNum))
+        if pageType in _freelistPageTypes:
+            return self._displayFreelistPages
+        return True
 
     def dumpSvg(self):
-        self._preDraw()
-        self._draw()
-        self._postDraw()
-
-    def _preDraw(self):
-        self._prepPysvgObj()
+        stage = self._profiler.stage
+        with stage("dumpSvg"), open(self._svgPath, "wb") as f_svg:
+            with stage("_preDraw"):
+                self._preDraw(f_svg)
+            self._draw()
+            with stage("_postDraw"):
+                self._postDraw()
+        self._profiler.count("svgElements", self._svgWriter.nElements)
+        self._profiler.count("svgBytesWritten", self._svgWriter.bytesWritten)
+
+    def _preDraw(self, f_svg):
         if self._longshot:
             self._setDrawParamLongshot()
         else:
             self._setDrawParam()
         self._setBtreeColorDict()
+        # Elements are written to f_svg as soon as they are drawn
+        self._svgWriter = SvgWriter(f_svg,
+                                    encoding=SvgConfig.main["encoding"],
+                                    width=self._svgWidth,
+                                    height=self._svgHeight)
 
     def _draw(self):
+        stage = self._profiler.stage
+        if self._displayBtreeList:
+            with stage("_drawBtreeList"):
+                self._drawBtreeList(SvgConfig.btreeList["x"],
+                                    SvgConfig.btreeList["y"])
         if self._longshot:
-            self._drawBtreeList(SvgConfig.btreeList["x"],
-                                SvgConfig.btreeList["y"])
-            self._drawPageListLongshot(SvgConfig.pageList["x"],
-                                       self._pageListY)
+            with stage("_drawPageListLongshot"):
+                self._drawPageListLongshot(SvgConfig.pageList["x"],
+                                           self._pageListY)
         else:
-            self._drawBtreeList(SvgConfig.btreeList["x"],
-                                SvgConfig.btreeList["y"])
-            self._drawPageList(SvgConfig.pageList["x"],
-                               self._pageListY)
+            with stage("_drawPageList"):
+                self._drawPageList(SvgConfig.pageList["x"],
+                                   self._pageListY)
 
     def _postDraw(self):
-        self._svgDoc.save(
-            self._svgPath,
-            encoding=SvgConfig.main["encoding"])
-
-    def _prepPysvgObj(self):
-        self._svgDoc = pysvg.structure.Svg()
-        self._shapeBuilder = pysvg.builders.ShapeBuilder()
+        self._svgWriter.close()
 
     def _setDrawParam(self):
         # BtreeList
@@ -101,9 +280,14 @@ class Json2Svg(object):
         self._nRowsInPage = (self._dbinfo["dbMetadata"]["pageSize"] /
                              self._pageWidth)
         self._pageHeight = self._cellHeight * self._nRowsInPage
-        self._pageListY = SvgConfig.btreeList["y"] + self._btreeListHeight
+        self._pageListY = self._getPageListY()
         self._pageListHeight = (self._pageHeight *
-                                self._dbinfo["dbMetadata"]["nPages"])
+                                (self._lastPage - self._firstPage + 1))
+
+        # Whole image (pages filtered out leave space at the bottom)
+        self._svgWidth = max(self._btreeListWidth,
+                             SvgConfig.pageList["x"] + self._pageListWidth)
+        self._svgHeight = self._pageListY + self._pageListHeight
 
     def _setDrawParamLongshot(self):
         # BtreeList
@@ -117,7 +301,20 @@ class Json2Svg(object):
         self._btreeLegendWidth = self._btreeListWidth / self._btreeLegendNCol
 
         # PageList
-        self._pageListY = SvgConfig.btreeList["y"] + self._btreeListHeight
+        self._pageListY = self._getPageListY()
+        nCols = SvgConfig.pageListLongshot["nCols"]
+        nPages = self._lastPage - self._firstPage + 1
+        self._pageListHeight = (SvgConfig.pageLongshot["size"] *
+                                ((nPages + nCols - 1) / nCols))
+
+        # Whole image
+        self._svgWidth = self._btreeListWidth
+        self._svgHeight = self._pageListY + self._pageListHeight
+
+    def _getPageListY(self):
+        if not self._displayBtreeList:
+            return 0
+        return SvgConfig.btreeList["y"] + self._btreeListHeight
 
     def _setBtreeColorDict(self):
         self._btreeColorDict = {}
@@ -126,77 +323,65 @@ class Json2Svg(object):
             self._btreeColorDict[btree["name"]] = colorPalette[
                 i % len(colorPalette)]
 
-    def _isFilteredBtreePage(self, pageNum):
-        pageMetadata = self._dbinfo["pages"][str(pageNum)]["pageMetadata"]
-        isBtreePage = (pageMetadata["pageType"] in (
-                           PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
-                           PageType.TABLE_LEAF, PageType.TABLE_INTERIOR))
-        isFiltered = (self._filterBtrees == [] or
-                      (self._filterBtrees != [] and
-                       pageMetadata["livingBtree"] in self._filterBtrees))
-        return isBtreePage & isFiltered
-
-    def _isFreelistPageToDisplay(self, pageNum):
-        pageMetadata = self._dbinfo["pages"][str(pageNum)]["pageMetadata"]
-        return (
-            self._displayFreelistPages == True and
-            pageMetadata["pageType"] in (
-                PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF,
-                PageType.FREELIST_MAP)
-        )
+    def _isFilteredBtree(self, btreeName):
+        return (len(self._filterBtreeSet) == 0 or
+                btreeName in self._filterBtreeSet)
 
     def _drawPageList(self, x, y):
         nDrawnPage = 0
-        for pageNum in range(1, self._dbinfo["dbMetadata"]["nPages"] + 1):
-            # Filter pages to draw
-            if (self._isFilteredBtreePage(pageNum) or
-                self._isFreelistPageToDisplay(pageNum)):
-                self._drawPage(
-                    x,
-                    y + nDrawnPage * self._pageHeight,
-                    pageNum)
-                self._drawPageNum(
+        for pageNum in self._getPageNumsToDraw():
+            iSlot = nDrawnPage
+            if self._fixedPageSlots:
+                iSlot = pageNum - self._firstPage
+            self._drawPage(
+                x,
+                y + iSlot * self._pageHeight,
+                pageNum)
+            self._drawPageNum(
+                x + SvgConfig.page["width"],
+                y + iSlot * self._pageHeight,
+                pageNum)
+            if self._displayRidRange:
+                self._drawRidRange(
                     x + SvgConfig.page["width"],
-                    y + nDrawnPage * self._pageHeight,
+                    y + iSlot * self._pageHeight,
                     pageNum)
-                nDrawnPage += 1
+            nDrawnPage += 1
+        self._profiler.count("svgPagesDrawn", nDrawnPage)
 
     def _drawPageListLongshot(self, x, y):
         offsetX = 0
         offsetY = 0
-        for pageNum in range(1, self._dbinfo["dbMetadata"]["nPages"] + 1):
-            pageMetadata = self._dbinfo["pages"][str(pageNum)]["pageMetadata"]
-            pageType = pageMetadata["pageType"]
-
-            # color
-            fillColor = SvgConfig.pageLongshot["defaultColor"]
-            if self._isFilteredBtreePage(pageNum):
-                fillColor = self._btreeColorDict[pageMetadata["livingBtree"]]
-            elif self._isFreelistPageToDisplay(pageNum):
-                page = self._dbinfo["pages"][str(pageNum)]
-                pageMetadata = page["pageMetadata"]
-                if pageMetadata["pageType"] in (
-                    PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF):
-                    btreeName = DbInfoTemplate.pgnoRoot2btreeName(
-                        self._dbinfo,
-                        pageMetadata["pgnoRoot"])
-                    if btreeName is not None:
-                        fillColor = self._btreeColorDict[btreeName]
+        for pageNum in self._analyzedPageNums:
+            pageType = self._pages.getPageType(pageNum)
+            fillColor = self._getLongshotFillColor(pageNum, pageType)
 
             # offset
             pageSize = SvgConfig.pageLongshot["size"]
             nCols = SvgConfig.pageListLongshot["nCols"]
-            offsetX = pageSize * ((pageNum - 1) % nCols)
-            offsetY = pageSize * ((pageNum - 1) / nCols)
-
-            self._svgDoc.addElement(
-                self._shapeBuilder.createRect(
-                    x + offsetX, y + offsetY,
-                    SvgConfig.btreeList["legendHeight"] - 1,
-                    SvgConfig.btreeList["legendHeight"] - 1,
-                    fill=fillColor,
-                    strokewidth=SvgConfig.pageLongshot["strokeWidth"],
-                    stroke=SvgConfig.page[pageType + "strokeColor"]))
+            offsetX = pageSize * ((pageNum - self._firstPage) % nCols)
+            offsetY = pageSize * ((pageNum - self._firstPage) / nCols)
+
+            self._svgWriter.rect(
+                x + offsetX, y + offsetY,
+                SvgConfig.btreeList["legendHeight"] - 1,
+                SvgConfig.btreeList["legendHeight"] - 1,
+                fill=fillColor,
+                strokeWidth=SvgConfig.pageLongshot["strokeWidth"],
+                stroke=SvgConfig.page[pageType + "strokeColor"])
+
+    def _getLongshotFillColor(self, pageNum, pageType):
+        defaultColor = SvgConfig.pageLongshot["defaultColor"]
+        if pageType in _btreePageTypes:
+            btreeName = self._pages.getLivingBtree(pageNum)
+            if self._isFilteredBtree(btreeName):
+                return self._btreeColorDict.get(btreeName, defaultColor)
+        elif (self._displayFreelistPages and
+              pageType in (PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF)):
+            btreeName = self._rootPageToBtreeName.get(
+                self._pages.getPageMetadata(pageNum, "pgnoRoot"))
+            return self._btreeColorDict.get(btreeName, defaultColor)
+        return defaultColor
 
     def _drawBtreeList(self, x, y):
         for i, btree in enumerate(self._filteredBtreeList):
@@ -206,36 +391,34 @@ class Json2Svg(object):
 
     def _drawBtreeLegend(self, x, y, btree):
         # Color sample
-        self._svgDoc.addElement(
-            self._shapeBuilder.createRect(
-                x, y,
-                SvgConfig.btreeList["legendHeight"] - 1,
-                SvgConfig.btreeList["legendHeight"] - 1,
-                fill=self._btreeColorDict[btree["name"]],
-                strokewidth=SvgConfig.btreeList["legendStrokeWidth"],
-                stroke=SvgConfig.btreeList["legendStrokeColor"]))
+        self._svgWriter.rect(
+            x, y,
+            SvgConfig.btreeList["legendHeight"] - 1,
+            SvgConfig.btreeList["legendHeight"] - 1,
+            fill=self._btreeColorDict[btree["name"]],
+            strokeWidth=SvgConfig.btreeList["legendStrokeWidth"],
+            stroke=SvgConfig.btreeList["legendStrokeColor"])
 
         # Btree name
-        style = pysvg.builders.StyleBuilder()
-        style.setFontSize(SvgConfig.btreeList["legendFontSize"])
-        self._svgDoc.addElement(
-            pysvg.text.Text(btree["name"].encode(SvgConfig.main["encoding"]),
-                            x=x + SvgConfig.btreeList["legendHeight"],
-                            y=y + SvgConfig.btreeList["legendTopMargin"],
-                            style=style.getStyle()))
+        self._svgWriter.text(
+            btree["name"],
+            x + SvgConfig.btreeList["legendHeight"],
+            y + SvgConfig.btreeList["legendTopMargin"],
+            fontSize=SvgConfig.btreeList["legendFontSize"])
 
     def _drawPage(self, x, y, pageNum):
-        page = self._dbinfo["pages"][str(pageNum)]
+        page = self._dbinfo["pages"][pageNum]
         pageType = page["pageMetadata"]["pageType"]
-        self._svgDoc.addElement(
-            self._shapeBuilder.createRect(
-                x, y,
-                self._pageWidth, self._pageHeight,
-                fill=SvgConfig.page["fillColor"],
-                strokewidth=SvgConfig.page["strokeWidth"],
-                stroke=SvgConfig.page[pageType + "strokeColor"]))
+        self._svgWriter.rect(
+            x, y,
+            self._pageWidth, self._pageHeight,
+            fill=SvgConfig.page["fillColor"],
+            strokeWidth=SvgConfig.page["strokeWidth"],
+            stroke=SvgConfig.page[pageType + "strokeColor"])
 
         # Draw inside of pages
+        if self._displayFreeSpace and pageType in _btreePageTypes:
+            self._drawFreeSpace(x, y, pageNum)
         if pageType in (
             PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
             PageType.TABLE_LEAF, PageType.TABLE_INTERIOR,
@@ -246,48 +429,100 @@ class Json2Svg(object):
             pass
 
     def _drawPageNum(self, x, y, pageNum):
-        style = pysvg.builders.StyleBuilder()
-        style.setFontSize(SvgConfig.pageList["pageNumFontSize"])
-        self._svgDoc.addElement(
-            pysvg.text.Text(str(pageNum),
-                            x=x + SvgConfig.pageList["pageNumLeftMargin"],
-                            y=y + SvgConfig.pageList["pageNumTopMargin"],
-                            style=style.getStyle()))
+        self._svgWriter.text(
+            str(pageNum),
+            x + SvgConfig.pageList["pageNumLeftMargin"],
+            y + SvgConfig.pageList["pageNumTopMargin"],
+            fontSize=SvgConfig.pageList["pageNumFontSize"])
+
+    def _drawRidRange(self, x, y, pageNum):
+        page = self._dbinfo["pages"][pageNum]
+        if page["pageMetadata"]["pageType"] not in (
+            PageType.TABLE_LEAF, PageType.TABLE_INTERIOR):
+            return
+        rids = [cell["rid"] for cell in page["cells"]]
+        if len(rids) == 0:
+            return
+        self._svgWriter.text(
+            "%d-%d" % (min(rids), max(rids)),
+            x + SvgConfig.pageList["pageNumLeftMargin"],
+            y + SvgConfig.pageList["ridRangeTopMargin"],
+            fontSize=SvgConfig.pageList["ridRangeFontSize"])
 
     def _drawCells(self, pageX, pageY, pageNum):
-        page = self._dbinfo["pages"][str(pageNum)]
+        """
+        @desc  Adjacent cells are drawn as one shape since they have
+          the same color in a page.
+        """
+        page = self._dbinfo["pages"][pageNum]
         pageType = page["pageMetadata"]["pageType"]
         # TODO: Give livingBtree for overflow page
         cellColor = "#cccccc"
         if pageType in (PageType.TABLE_LEAF, PageType.TABLE_INTERIOR,
                         PageType.INDEX_LEAF, PageType.INDEX_INTERIOR):
             livingBtree = page["pageMetadata"]["livingBtree"]
-            cellColor = self._btreeColorDict[livingBtree]
+            # (No color for pages no btree reaches; See
+            #  DbFormatConfig.main["uncertainLivingBtreeStr"])
+            cellColor = self._btreeColorDict.get(livingBtree, cellColor)
         cells = page["cells"]
+        for (start, end) in _mergeCellSpans(cells):
+            self._drawCellSpan(pageX, pageY, cellColor, start, end)
         for cell in cells:
-            self._drawCell(pageX, pageY,
-                           cellColor,
-                           cell, pageType)
-
-    def _drawCell(self, pageX, pageY, fillColor, cell, pageType):
-        offset = cell["offset"]
-        remSize = cell["cellSize"]
-        x = pageX + offset % self._pageWidth
-        y = pageY + (offset / self._pageWidth) * self._cellHeight
-        while remSize > 0:
-            widthInRow = min(remSize, self._pageWidth - x)
-            self._svgDoc.addElement(
-                self._shapeBuilder.createRect(
-                    x, y,
-                    widthInRow, self._cellHeight,
-                    fill=fillColor))
-            remSize -= widthInRow
-            x = pageX
-            y += self._cellHeight
-        self._drawCellInfo(
-            pageX + offset % self._pageWidth,
-            pageY + (offset / self._pageWidth) * self._cellHeight,
-            cell, pageType)
+            offset = cell["offset"]
+            self._drawCellInfo(
+                pageX + offset % self._pageWidth,
+                pageY + (offset / self._pageWidth) * self._cellHeight,
+                cell, pageType)
+
+    def _drawFreeSpace(self, pageX, pageY, pageNum):
+        """
+        @desc  Draws unallocated space and freeblocks of a b-tree page.
+          Fragmented bytes are not drawn since their offsets are unknown.
+          Nothing is drawn for dbinfo written without free space.
+        """
+        page = self._dbinfo["pages"][pageNum]
+        pageMetadata = page["pageMetadata"]
+        nUnallocatedBytes = pageMetadata.get("nUnallocatedBytes")
+        if nUnallocatedBytes:
+            start = _getCellPointerArrayEnd(pageNum, pageMetadata)
+            self._drawCellSpan(pageX, pageY,
+                               SvgConfig.freeSpace["unallocatedColor"],
+                               start, start + nUnallocatedBytes)
+        for freeBlock in page.get("freeBlocks", ()):
+            self._drawCellSpan(pageX, pageY,
+                               SvgConfig.freeSpace["freeBlockColor"],
+                               freeBlock["offset"],
+                               freeBlock["offset"] + freeBlock["size"])
+
+    def _drawCellSpan(self, pageX, pageY, fillColor, start, end):
+        """
+        @desc  Draws bytes [start, end) of a page, which wrap around
+          rows of the page, as a rect or a polygon.
+        """
+        (firstRow, firstCol) = divmod(start, self._pageWidth)
+        (lastRow, lastCol) = divmod(end - 1, self._pageWidth)
+        lastCol += 1
+        top = pageY + firstRow * self._cellHeight
+        bottom = pageY + (lastRow + 1) * self._cellHeight
+        if firstRow == lastRow:
+            self._svgWriter.rect(
+                pageX + firstCol, top,
+                lastCol - firstCol, self._cellHeight,
+                fill=fillColor)
+            return
+        # From the first column of the first row to the last column of
+        # the last row, covering full rows in between
+        right = pageX + self._pageWidth
+        self._svgWriter.polygon(
+            [(pageX + firstCol, top),
+             (right, top),
+             (right, bottom - self._cellHeight),
+             (pageX + lastCol, bottom - self._cellHeight),
+             (pageX + lastCol, bottom),
+             (pageX, bottom),
+             (pageX, top + self._cellHeight),
+             (pageX + firstCol, top + self._cellHeight)],
+            fill=fillColor)
 
     def _drawCellInfo(self, cellX, cellY, cell, pageType):
         if (self._displayRid and
@@ -295,12 +530,78 @@ class Json2Svg(object):
             self._drawRid(cellX, cellY, cell["rid"], pageType)
 
     def _drawRid(self, x, y, rid, pageType):
-        style = pysvg.builders.StyleBuilder()
-        style.setFontSize(SvgConfig.cell["ridFontSize"])
-        s = str(rid)
-        self._svgDoc.addElement(
-            pysvg.text.Text(
-                s,
-                x=x + (self._cellHeight / 2),
-                y=y + (self._cellHeight / 2),
-                style=style.getStyle()))
+        self._svgWriter.text(
+            str(rid),
+            x + (self._cellHeight / 2),
+            y + (self._cellHeight / 2),
+            fontSize=SvgConfig.cell["ridFontSize"])
+
+
+def _mergeCellSpans(cells):
+    """
+    @return  Sorted list of [start, end) byte ranges covered by cells,
+      where touching or overlapping cells are merged
+
+    >>> _mergeCellSpans([{"offset": 10, "cellSize": 5},
+    ...                  {"offset": 0, "cellSize": 4},
+    ...                  {"offset": 4, "cellSize": 2},
+    ...                  {"offset": 12, "cellSize": 1},
+    ...                  {"offset": 20, "cellSize": 0}])
+    [[0, 6], [10, 15]]
+    """
+    spans = []
+    for (start, end) in sorted((cell["offset"],
+                                cell["offset"] + cell["cellSize"])
+                               for cell in cells):
+        if start == end:
+            continue
+        if len(spans) > 0 and start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([start, end])
+    return spans
+
+
+def _getCellPointerArrayEnd(pageNum, pageMetadata):
+    """
+    @return  Offset of the end of the cell pointer array of a b-tree page,
+      where its unallocated space starts
+
+    >>> _getCellPointerArrayEnd(1, {"pageType": PageType.TABLE_LEAF,
+    ...                             "nCells": 3})
+    114
+    >>> _getCellPointerArrayEnd(2, {"pageType": PageType.INDEX_INTERIOR,
+    ...                             "nCells": 0})
+    12
+    """
+    CPAFormat = DbFormatConfig.cellPointerArrayFormat
+    if pageMetadata["pageType"] in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
+        offset = CPAFormat["offsetInLeafPage"]
+    else:
+        offset = CPAFormat["offsetInInteriorPage"]
+    if pageNum == 1:
+        offset += DbFormatConfig.dbHeaderFormat["len"]
+    return offset + CPAFormat["elemLen"] * pageMetadata["nCells"]
+
+
+def _intKeyedPages(pages):
+    """
+    @desc  JSON object keys are always strings while SQLiteAnalyzer
+      keys pages by int. Unify them into int.
+
+    >>> _intKeyedPages({"2": "b", "1": "a"}) == {1: "a", 2: "b"}
+    True
+    """
+    if not isinstance(pages, dict):  # Ex: PageTable, DbInfoBinaryReader
+        return pages
+    if all(isinstance(pageNum, int) for pageNum in pages):
+        return pages
+    return dict((int(pageNum), page) for pageNum, page in pages.iteritems())
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
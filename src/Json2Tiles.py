@@ -0,0 +1,351 @@
+import SvgConfig
+from Json2Png import Json2Png
+from Json2Svg import Json2Svg
+from DbInfoBinary import DbInfoBinaryReader
+from PageTable import PageTable
+from PngWriter import PngWriter
+import array
+import json
+import os
+
+
+class Json2Tiles(Json2Png):
+    """
+    @desc  Writes a pyramid of tiles for zoomable viewing of huge
+      databases, and a static HTML viewer fetching tiles on demand.
+      A tile at any zoom level shows a consecutive range of pages.
+      - Summary levels: long-shot view (See Json2Png) in PNG.
+        The finest one draws a page in blockSize pixels square,
+        and each coarser one has 4 times as many pages per tile,
+        until one tile has all pages. Beyond 1 pixel per page,
+        a pixel has the most frequent color of its pages.
+      - Detail level (deepest): detailed view (See Json2Svg) in SVG,
+        detailPagesPerTile pages per tile.
+
+      Output directory:
+        index.html                 Viewer
+        tiles.json                 Zoom levels and tile geometry
+        legend.svg
+        summary/<level>/<i>.png    Level 0 is the coarsest
+        detail/<i>.svg
+
+    @usage
+    json2Tiles = Json2Tiles()
+    json2Tiles.initByDbinfo(analyzer.getDbinfo(), '/path/to/outDir')
+    json2Tiles.dumpTiles()
+    """
+    def initByDbinfo(self, dbinfo, outDir,
+                     filterBtrees=[],
+                     displayFreelistPages=True,
+                     tileSize=SvgConfig.tiles["tileSize"],
+                     blockSize=SvgConfig.tiles["blockSize"],
+                     detailPagesPerTile=SvgConfig.tiles["detailPagesPerTile"]):
+        assert blockSize & (blockSize - 1) == 0, "blockSize must be 2^n"
+        assert tileSize % blockSize == 0
+        assert detailPagesPerTile > 0
+        pages = dbinfo["pages"]
+        if isinstance(pages, dict):
+            # Detail tiles look up pages by int page number many times
+            pageTable = PageTable()
+            for pageNum, page in pages.iteritems():
+                pageTable[int(pageNum)] = page
+            dbinfo = {"dbMetadata": dbinfo["dbMetadata"], "pages": pageTable}
+        Json2Png.initByDbinfo(self, dbinfo, None,
+                              filterBtrees=filterBtrees,
+                              displayFreelistPages=displayFreelistPages,
+                              legendPath=os.path.join(outDir, "legend.svg"),
+                              nCols=tileSize / blockSize,
+                              blockSize=blockSize)
+        self._outDir = outDir
+        self._tileSize = tileSize
+        self._detailPagesPerTile = detailPagesPerTile
+
+    def initByBinaryPath(self, binPath, outDir, **kwargs):
+        reader = DbInfoBinaryReader(binPath)
+        self.initByDbinfo(reader.getDbinfo(), outDir, **kwargs)
+
+    def dumpTiles(self):
+        self._setBtreeColorDict()
+        tilesInfo = {
+            "firstPage": self._firstPage,
+            "lastPage": self._lastPage,
+            "tileSize": self._tileSize,
+            "levels": self._dumpSummaryLevels(),
+            "detail": self._dumpDetailLevel(),
+        }
+        with open(os.path.join(self._outDir, "tiles.json"), "w") as f_json:
+            json.dump(tilesInfo, f_json, indent=2, sort_keys=True)
+        with open(os.path.join(self._outDir, "index.html"), "w") as f_html:
+            f_html.write(_viewerHtml.replace(
+                "/*TILES_INFO*/null", json.dumps(tilesInfo, sort_keys=True)))
+        self._dumpLegend()
+
+    def _summaryLevels(self):
+        """
+        @return  Summary levels from the finest one
+        """
+        nPages = self._lastPage - self._firstPage + 1
+        levels = []
+        blockSize = self._blockSize
+        pagesPerPixel = 1
+        while True:
+            pagesPerTile = (self._tileSize / blockSize) ** 2 * pagesPerPixel
+            nTiles = max(1, (nPages + pagesPerTile - 1) / pagesPerTile)
+            levels.append({
+                "blockSize": blockSize,
+                "pagesPerPixel": pagesPerPixel,
+                "pagesPerTile": pagesPerTile,
+                "nTiles": nTiles,
+            })
+            if nTiles == 1:
+                return levels
+            if blockSize > 1:
+                blockSize /= 2
+            else:
+                pagesPerPixel *= 4
+
+    def _dumpSummaryLevels(self):
+        # Colors of each page are computed only once for all levels
+        colorKeys = []  # [((fill, border), (pixelColor, pixelColor)), ...]
+        colorKeyIds = {}
+        pageColorIds = array.array("H")
+        for pageNum in range(self._firstPage, self._lastPage + 1):
+            key = (self._pageColors(pageNum, 3), self._pageColors(pageNum, 1))
+            if key not in colorKeyIds:
+                colorKeyIds[key] = len(colorKeys)
+                colorKeys.append(key)
+            pageColorIds.append(colorKeyIds[key])
+        pixelColorKeys = [key[1] for key in colorKeys]
+
+        levels = self._summaryLevels()
+        pixelIds = pageColorIds
+        # From the finest level, as coarser ones are downsampled from it
+        for iLevel, level in enumerate(levels):
+            level["path"] = "summary/%d" % (len(levels) - 1 - iLevel)
+            blockSize = level["blockSize"]
+            if level["pagesPerPixel"] == 1:
+                cellRows = [self._blockRows(*key[0 if blockSize >= 3 else 1],
+                                            blockSize=blockSize)
+                            for key in colorKeys]
+                cellIds = pageColorIds
+            else:
+                pixelIds = _downsample(pixelIds, 4)
+                cellRows = [self._blockRows(*colors, blockSize=1)
+                            for colors in pixelColorKeys]
+                cellIds = pixelIds
+            self._dumpSummaryLevel(level, cellIds, cellRows)
+        return list(reversed(levels))
+
+    def _dumpSummaryLevel(self, level, cellIds, cellRows):
+        """
+        @param cellIds  Color ids of cells (a page or a pixel) in order
+        @param cellRows  cellRows[id] is pixel rows of a cell of the color
+        """
+        levelDir = os.path.join(self._outDir, level["path"])
+        _makedirs(levelDir)
+        blockSize = level["blockSize"]
+        nCellsInRow = self._tileSize / blockSize
+        defaultColor = SvgConfig.pageLongshotPng["defaultColor"]
+        blankRows = self._blockRows(defaultColor, defaultColor,
+                                    blockSize=blockSize)
+        for iTile in range(level["nTiles"]):
+            tilePath = os.path.join(levelDir, "%d.png" % (iTile))
+            with open(tilePath, "wb") as f_png:
+                writer = PngWriter(f_png, self._tileSize, self._tileSize)
+                for iRow in range(nCellsInRow):
+                    first = (iTile * nCellsInRow + iRow) * nCellsInRow
+                    blocks = [cellRows[cellId] for cellId
+                              in cellIds[first:first + nCellsInRow]]
+                    blocks.extend([blankRows] *
+                                  (nCellsInRow - len(blocks)))
+                    for i in range(blockSize):
+                        writer.writeRow(b"".join(block[i]
+                                                 for block in blocks))
+                writer.close()
+
+    def _dumpDetailLevel(self):
+        detailDir = os.path.join(self._outDir, "detail")
+        _makedirs(detailDir)
+        nPages = self._lastPage - self._firstPage + 1
+        nTiles = (nPages + self._detailPagesPerTile - 1) / self._detailPagesPerTile
+        for iTile in range(nTiles):
+            firstPage = self._firstPage + iTile * self._detailPagesPerTile
+            lastPage = min(firstPage + self._detailPagesPerTile - 1,
+                           self._lastPage)
+            json2Svg = Json2Svg()
+            json2Svg.initByDbinfo(
+                self._dbinfo,
+                os.path.join(detailDir, "%d.svg" % (iTile)),
+                filterBtrees=self._filterBtrees,
+                displayFreelistPages=self._displayFreelistPages,
+                pageRange=(firstPage, lastPage),
+                displayBtreeList=False,
+                fixedPageSlots=True)
+            json2Svg.dumpSvg()
+
+        # Same as Json2Svg._setDrawParam
+        pageHeight = (SvgConfig.cell["height"] *
+                      (self._dbinfo["dbMetadata"]["pageSize"] /
+                       SvgConfig.page["width"]))
+        return {
+            "path": "detail",
+            "pagesPerTile": self._detailPagesPerTile,
+            "nTiles": nTiles,
+            "width": (SvgConfig.page["width"] +
+                      SvgConfig.pageList["pageNumWidth"]),
+            "height": pageHeight * self._detailPagesPerTile,
+        }
+
+
+def _downsample(colorIds, factor):
+    """
+    @return  Color ids of each `factor' consecutive colorIds, taking the
+      most frequent one (the smallest id on a tie)
+
+    >>> list(_downsample(array.array("H", [1, 0, 1, 2, 3, 2, 3, 2]), 4))
+    [1, 2]
+    """
+    ret = array.array("H")
+    for i in range(0, len(colorIds), factor):
+        group = colorIds[i:i + factor]
+        ret.append(max(sorted(set(group)), key=group.count))
+    return ret
+
+
+def _makedirs(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+
+# Static viewer. Tiles are loaded with <img> only, so it works on file://
+_viewerHtml = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SQLiteDbVisualizer</title>
+<style>
+body { margin: 0; font-family: sans-serif; font-size: 12px; }
+#bar { position: fixed; top: 0; left: 0; right: 0; height: 24px;
+       padding: 4px; background: #eeeeee; }
+#view { position: absolute; top: 32px; bottom: 0; left: 0; right: 0;
+        overflow: auto; }
+#strip { position: relative; }
+#strip img { position: absolute; left: 0; image-rendering: pixelated; }
+#legend { position: fixed; top: 40px; right: 8px; background: white; }
+</style>
+</head>
+<body>
+<div id="bar">
+  <button id="zoomOut">-</button>
+  <button id="zoomIn">+</button>
+  <span id="status"></span>
+</div>
+<div id="view"><div id="strip"></div></div>
+<img id="legend" src="legend.svg">
+<script>
+var info = /*TILES_INFO*/null;
+var view = document.getElementById("view");
+var strip = document.getElementById("strip");
+var level = 0;
+var loaded = {};
+
+// Summary levels, then detail level
+function layer(z) {
+  if (z < info.levels.length) {
+    var l = info.levels[z];
+    return {path: l.path, ext: ".png", nTiles: l.nTiles,
+            pagesPerTile: l.pagesPerTile, width: info.tileSize,
+            height: info.tileSize, blockSize: l.blockSize,
+            pagesPerPixel: l.pagesPerPixel};
+  }
+  var d = info.detail;
+  return {path: d.path, ext: ".svg", nTiles: d.nTiles,
+          pagesPerTile: d.pagesPerTile, width: d.width, height: d.height};
+}
+
+function centerPage() {
+  var L = layer(level);
+  var y = view.scrollTop + view.clientHeight / 2;
+  return info.firstPage + Math.floor(y / L.height * L.pagesPerTile);
+}
+
+function show(z, page) {
+  var L = layer(z);
+  level = z;
+  loaded = {};
+  strip.innerHTML = "";
+  strip.style.width = L.width + "px";
+  strip.style.height = L.nTiles * L.height + "px";
+  var y = (page - info.firstPage) / L.pagesPerTile * L.height;
+  view.scrollTop = Math.max(0, y - view.clientHeight / 2);
+  update();
+}
+
+function update() {
+  var L = layer(level);
+  var first = Math.floor(view.scrollTop / L.height);
+  var last = Math.min(L.nTiles - 1,
+      Math.floor((view.scrollTop + view.clientHeight) / L.height));
+  for (var i = first; i <= last; i++) {
+    if (loaded[i]) continue;
+    var img = document.createElement("img");
+    img.src = L.path + "/" + i + L.ext;
+    img.width = L.width;
+    img.height = L.height;
+    img.style.top = i * L.height + "px";
+    strip.appendChild(img);
+    loaded[i] = true;
+  }
+  status("");
+}
+
+function status(s) {
+  var L = layer(level);
+  document.getElementById("status").textContent =
+      "zoom " + level + "/" + info.levels.length +
+      " (" + L.pagesPerTile + " pages per tile) " + s;
+}
+
+// Page under the pointer
+function pageAt(e) {
+  var L = layer(level);
+  var rect = strip.getBoundingClientRect();
+  var x = e.clientX - rect.left, y = e.clientY - rect.top;
+  var iTile = Math.floor(y / L.height);
+  var page = info.firstPage + iTile * L.pagesPerTile;
+  if (L.blockSize) {
+    var perRow = info.tileSize / L.blockSize;
+    var yIn = y - iTile * L.height;
+    page += (Math.floor(yIn / L.blockSize) * perRow +
+             Math.floor(x / L.blockSize)) * L.pagesPerPixel;
+  } else {
+    page += Math.floor((y - iTile * L.height) / L.height * L.pagesPerTile);
+  }
+  return Math.min(page, info.lastPage);
+}
+
+view.onscroll = update;
+window.onresize = update;
+strip.onmousemove = function(e) { status("page " + pageAt(e)); };
+strip.onclick = function(e) {
+  if (level < info.levels.length) show(level + 1, pageAt(e));
+};
+document.getElementById("zoomIn").onclick = function() {
+  if (level < info.levels.length) show(level + 1, centerPage());
+};
+document.getElementById("zoomOut").onclick = function() {
+  if (level > 0) show(level - 1, centerPage());
+};
+show(0, info.firstPage);
+</script>
+</body>
+</html>
+"""
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
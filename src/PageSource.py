@@ -0,0 +1,153 @@
+from WalIndex import getWalFrameOffset
+import mmap
+
+
+class PageSource(object):
+    """
+    @desc  Memory-mapped view of a SQLite database file.
+      Pages are handed out as zero-copy buffers over the mapping, so
+      resident memory only grows with the pages actually touched.
+      With a WAL overlaid (See overlayWal), pages in the WAL are handed
+      out from it instead, as SQLite readers see them.
+
+    @usage
+    src = PageSource('/path/to/db.sqlite')
+    src.setPageSize(4096)
+    page = src.getPage(1)
+    src.close()
+    """
+    def __init__(self, dbpath):
+        assert len(dbpath) > 0
+        self._dbpath = dbpath
+        self._pageSize = None
+        self._pagesRead = None  # See trackReads
+        self.nPageReads = 0
+        self._walMmap = None  # See overlayWal
+        self._walPageOffsets = None
+        with open(dbpath, "rb") as f_db:
+            f_db.seek(0, 2)
+            self._fileSize = f_db.tell()
+            assert self._fileSize > 0
+            # mmap dups the file descriptor, so closing f_db is fine
+            self._mmap = mmap.mmap(f_db.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        """
+        @return  Size of the database file, or with a WAL overlaid,
+          size of the database after the last commit in the WAL
+        """
+        return self._fileSize
+
+    def setPageSize(self, pageSize):
+        assert pageSize > 0
+        assert self._walPageOffsets is None or pageSize == self._pageSize, (
+            "Page size of WAL differs from that of DB")
+        self._pageSize = pageSize
+
+    def overlayWal(self, walIndex):
+        """
+        @desc  Serves pages in committed frames of the WAL
+          instead of the database file.
+          The page size is given by the WAL.
+
+        @param walIndex  See WalIndex.readWalIndex
+
+        >>> import tempfile
+        >>> from WalIndex import _packWalHeader, _packFrame
+        >>> f_db = tempfile.NamedTemporaryFile()
+        >>> _ = f_db.write(b'a' * 512 + b'b' * 512); f_db.flush()
+        >>> f_wal = tempfile.NamedTemporaryFile()
+        >>> (header, (s0, s1)) = _packWalHeader(512, (7, 8))
+        >>> (frame, s0, s1) = _packFrame(2, 3, (7, 8), s0, s1, b'c' * 512)
+        >>> _ = f_wal.write(header + frame); f_wal.flush()
+        >>> src = PageSource(f_db.name)
+        >>> src.overlayWal({"path": f_wal.name, "pageSize": 512, "nPages": 3,
+        ...                 "pageFrames": {2: 1}})
+        >>> len(src)
+        1536
+        >>> [src.getPage(pageNum)[0:2] for pageNum in (1, 2)]
+        ['aa', 'cc']
+        >>> src.close()
+        """
+        with open(walIndex["path"], "rb") as f_wal:
+            self._walMmap = mmap.mmap(f_wal.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+        self._pageSize = walIndex["pageSize"]
+        self._walPageOffsets = dict(
+            (pageNum, getWalFrameOffset(walIndex, frameNum))
+            for pageNum, frameNum in walIndex["pageFrames"].iteritems())
+        self._fileSize = walIndex["nPages"] * self._pageSize
+
+    def getBytes(self, offset, length):
+        """
+        @return  Zero-copy buffer of data[offset:offset + length]
+          (within a page if from the WAL)
+        """
+        assert 0 <= offset <= self._fileSize
+        length = min(length, self._fileSize - offset)
+        if self._walPageOffsets is not None:
+            (pageIndex, offsetInPage) = divmod(offset, self._pageSize)
+            walOffset = self._walPageOffsets.get(pageIndex + 1)
+            if walOffset is not None:
+                assert offsetInPage + length <= self._pageSize
+                return _bufview(self._walMmap, walOffset + offsetInPage,
+                                length)
+        return _bufview(self._mmap, offset, length)
+
+    def getPage(self, pageNum):
+        """
+        @return  Zero-copy buffer of page#pageNum (1-origin)
+        """
+        assert self._pageSize is not None
+        if self._pagesRead is not None:
+            self.nPageReads += 1
+            self._pagesRead.add(pageNum)
+        return self.getBytes(self._pageSize * (pageNum - 1), self._pageSize)
+
+    def trackReads(self):
+        """
+        @desc  Starts counting getPage() calls in nPageReads and
+          distinct pages read (See getNPagesRead). Off by default.
+
+        >>> import tempfile
+        >>> f = tempfile.NamedTemporaryFile()
+        >>> _ = f.write(b'x' * 300); f.flush()
+        >>> src = PageSource(f.name)
+        >>> src.setPageSize(100)
+        >>> src.trackReads()
+        >>> [len(src.getPage(pageNum)) for pageNum in (1, 3, 1)]
+        [100, 100, 100]
+        >>> (src.nPageReads, src.getNPagesRead())
+        (3, 2)
+        >>> src.close()
+        """
+        self._pagesRead = set()
+        self.nPageReads = 0
+
+    def getNPagesRead(self):
+        return len(self._pagesRead or ())
+
+    def close(self):
+        self._mmap.close()
+        if self._walMmap is not None:
+            self._walMmap.close()
+
+
+def _bufview(obj, offset, length):
+    """
+    >>> _bufview(b'abcdef', 2, 3)[0:3] == b'cde'
+    True
+    """
+    try:
+        # Python 2: mmap only exports the old buffer interface
+        return buffer(obj, offset, length)
+    except NameError:
+        return memoryview(obj)[offset:offset + length]
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,460 @@
+from DbInfoTemplate import pageTypeList
+import array
+try:
+    from collections import MutableMapping
+except ImportError:
+    from collections.abc import MutableMapping
+
+
+# Optional integer members of pageMetadata (besides pageType and
+# livingBtree), and array typecode of each.
+_pageIntFields = (
+    ("nCells", "I"),
+    ("freeBlockOffset", "I"),
+    ("cellContentAreaOffset", "I"),
+    ("rightmostChildPageNum", "I"),
+    ("nextOverflowPageNum", "I"),
+    ("pgnoRoot", "I"),
+    ("nextFreelistTrunkPageNum", "I"),
+    ("nFreelistLeaves", "I"),
+    ("contentHash", "I"),
+    ("nFragmentedBytes", "I"),
+    ("nFreeBlockBytes", "I"),
+    ("nUnallocatedBytes", "I"),
+    ("walFrame", "I"),
+)
+_pageFieldIndex = dict((field, i)
+                       for i, (field, typecode) in enumerate(_pageIntFields))
+
+# Optional integer members of a cell, and array typecode of each
+_cellIntFields = (
+    ("offset", "I"),
+    ("cellSize", "I"),
+    ("leftChildPage", "I"),
+    ("rid", "L"),  # 64 bit
+    ("overflowPage", "I"),
+)
+_cellFieldIndex = dict((field, i)
+                       for i, (field, typecode) in enumerate(_cellIntFields))
+# Members of cell["payload"]
+_payloadFields = ("offset", "headerSize", "bodySize")
+_CELL_HAS_PAYLOAD = 0x80
+
+_PAGE_HAS_CELLS = 0x01
+_PAGE_HAS_FREELIST_LEAVES = 0x02
+_PAGE_HAS_FREE_BLOCKS = 0x04
+
+_NO_CELL = -1
+
+
+class PageTable(MutableMapping):
+    """
+    @desc  "pages" of dbinfo (See DbInfoTemplate.py) stored as
+      structure of arrays instead of nested dicts.
+      A page is a row of the page table indexed by page number,
+      its page type is a small int (index in pageTypeList + 1) and
+      its livingBtree is an interned btree id.
+      Cells of all pages live in a single cell table; cells of a page
+      are chained in appended order. Cells of a page overwritten or
+      deleted are chained into a free list, and their slots are reused
+      by cells appended later, so the cell table does not grow
+      while pages are analyzed again (ex: reclassified as overflow pages).
+      Dict-shaped pages are only built when accessed by pages[pageNum];
+      hot paths should use the field accessors instead.
+
+    @usage
+    pages = PageTable()
+    pages[3] = {"pageMetadata": {"pageType": PageType.OVERFLOW},
+                "cells": []}
+    pages.appendCell(3, {"offset": 4, "cellSize": 1020})
+    pages.getPageType(3)  # -> PageType.OVERFLOW
+    pages[3]  # -> dict view
+
+    >>> from DbInfoTemplate import PageType
+    >>> pages = PageTable()
+    >>> pages[2] = {"pageMetadata": {"pageType": PageType.TABLE_LEAF,
+    ...                              "nCells": 0, "livingBtree": "T0"},
+    ...             "cells": []}
+    >>> pages.appendCell(2, {"offset": 9, "cellSize": 3, "rid": 1,
+    ...                      "overflowPage": None,
+    ...                      "payload": {"offset": 11, "headerSize": 2,
+    ...                                  "bodySize": 1}})
+    >>> pages.setPageMetadata(2, "nCells", 1)
+    >>> pages[2] == {"pageMetadata": {"pageType": PageType.TABLE_LEAF,
+    ...                               "nCells": 1, "livingBtree": "T0"},
+    ...              "cells": [{"offset": 9, "cellSize": 3, "rid": 1,
+    ...                         "overflowPage": None,
+    ...                         "payload": {"offset": 11, "headerSize": 2,
+    ...                                     "bodySize": 1}}]}
+    True
+    >>> (1 in pages, 2 in pages, len(pages), list(pages))
+    (False, True, 1, [2])
+    >>> pages[5] = {"pageMetadata": {"pageType": PageType.FREELIST_TRUNK,
+    ...                              "pgnoRoot": None},
+    ...             "freelistLeafPageNums": [6]}
+    >>> pages[5]["freelistLeafPageNums"], pages[5]["pageMetadata"]["pgnoRoot"]
+    ([6], None)
+    >>> pages[7] = {"pageMetadata": {"pageType": PageType.INDEX_LEAF},
+    ...             "cells": [], "freeBlocks": [{"offset": 900, "size": 8}]}
+    >>> pages[7]["freeBlocks"] == [{"offset": 900, "size": 8}]
+    True
+    >>> del pages[2]
+    >>> (2 in pages, len(pages))
+    (False, 2)
+    >>> nCellSlots = len(pages._nextCells)
+    >>> pages[3] = {"pageMetadata": {"pageType": PageType.OVERFLOW},
+    ...             "cells": [{"offset": 4, "cellSize": 1020}]}
+    >>> pages[3] = {"pageMetadata": {"pageType": PageType.OVERFLOW},
+    ...             "cells": [{"offset": 4, "cellSize": 10}]}
+    >>> (list(pages.iterCellValues(3, "cellSize")),
+    ...  len(pages._nextCells) == nCellSlots)
+    ([10], True)
+    """
+    def __init__(self):
+        self._nPages = 0
+
+        # Page table (row#N is page#N; row#0 is unused)
+        self._pageTypeIds = array.array("B", [0])  # 0: absent
+        self._flags = array.array("B", [0])
+        self._btreeIds = array.array("I", [0])  # 0: no livingBtree
+        self._presentMasks = array.array("H", [0])
+        self._nullMasks = array.array("H", [0])
+        self._pageValues = [array.array(typecode, [0])
+                            for (field, typecode) in _pageIntFields]
+        self._firstCells = array.array("l", [_NO_CELL])
+        self._lastCells = array.array("l", [_NO_CELL])
+        self._cellCounts = array.array("I", [0])
+        # Only freelist trunk pages have them
+        self._freelistLeaves = {}
+        # Only b-tree pages have them: [offset, size, offset, size, ...]
+        self._freeBlocks = {}
+
+        # Cell table
+        self._cellPresentMasks = array.array("B")
+        self._cellNullMasks = array.array("B")
+        self._cellValues = [array.array(typecode)
+                            for (field, typecode) in _cellIntFields]
+        self._payloadValues = [array.array("I") for field in _payloadFields]
+        self._nextCells = array.array("l")
+        self._freeCellHead = _NO_CELL  # Free list chained by _nextCells
+        # (field, mask bit, column) for appendCell
+        self._cellColumns = [(field, 1 << i, self._cellValues[i])
+                             for i, (field, typecode)
+                             in enumerate(_cellIntFields)]
+        self._payloadColumns = list(zip(_payloadFields, self._payloadValues))
+
+        # Interned livingBtree names (id is index + 1)
+        self._btreeNames = []
+        self._btreeNameIds = {}
+
+    def __contains__(self, pageNum):
+        try:
+            return pageNum > 0 and self._pageTypeIds[pageNum] != 0
+        except (IndexError, TypeError):  # Ex: str key
+            return False
+
+    def __getitem__(self, pageNum):
+        if pageNum not in self:
+            raise KeyError(pageNum)
+        page = {"pageMetadata": self.getPageMetadataDict(pageNum)}
+        if self._flags[pageNum] & _PAGE_HAS_CELLS:
+            page["cells"] = list(self.iterCells(pageNum))
+        freelistLeafPageNums = self.getFreelistLeafPageNums(pageNum)
+        if freelistLeafPageNums is not None:
+            page["freelistLeafPageNums"] = freelistLeafPageNums
+        freeBlocks = self.getFreeBlocks(pageNum)
+        if freeBlocks is not None:
+            page["freeBlocks"] = freeBlocks
+        return page
+
+    def __setitem__(self, pageNum, page):
+        """
+        @desc  Packs a dict-shaped page. It replaces all of the old page
+          including its cells.
+        """
+        assert pageNum >= 1
+        self._grow(pageNum)
+        if pageNum not in self:
+            self._nPages += 1
+        pageMetadata = page["pageMetadata"]
+        self._pageTypeIds[pageNum] = (
+            pageTypeList.index(pageMetadata["pageType"]) + 1)
+        self._btreeIds[pageNum] = self._internBtree(
+            pageMetadata.get("livingBtree"))
+        presentMask = 0
+        nullMask = 0
+        for i, (field, typecode) in enumerate(_pageIntFields):
+            value = pageMetadata.get(field)
+            if field in pageMetadata:
+                presentMask |= 1 << i
+                if value is None:
+                    nullMask |= 1 << i
+            self._pageValues[i][pageNum] = value or 0
+        self._presentMasks[pageNum] = presentMask
+        self._nullMasks[pageNum] = nullMask
+
+        self._freeCells(pageNum)
+        self._firstCells[pageNum] = _NO_CELL
+        self._lastCells[pageNum] = _NO_CELL
+        self._cellCounts[pageNum] = 0
+        self._flags[pageNum] = 0
+        self._freelistLeaves.pop(pageNum, None)
+        self._freeBlocks.pop(pageNum, None)
+        if "cells" in page:
+            self._flags[pageNum] |= _PAGE_HAS_CELLS
+            for cell in page["cells"]:
+                self.appendCell(pageNum, cell)
+        if "freelistLeafPageNums" in page:
+            self._flags[pageNum] |= _PAGE_HAS_FREELIST_LEAVES
+            self._freelistLeaves[pageNum] = array.array(
+                "I", page["freelistLeafPageNums"])
+        if "freeBlocks" in page:
+            self._flags[pageNum] |= _PAGE_HAS_FREE_BLOCKS
+            freeBlocks = array.array("I")
+            for freeBlock in page["freeBlocks"]:
+                freeBlocks.extend((freeBlock["offset"], freeBlock["size"]))
+            self._freeBlocks[pageNum] = freeBlocks
+
+    def __delitem__(self, pageNum):
+        if pageNum not in self:
+            raise KeyError(pageNum)
+        self._freeCells(pageNum)
+        self._firstCells[pageNum] = _NO_CELL
+        self._lastCells[pageNum] = _NO_CELL
+        self._cellCounts[pageNum] = 0
+        self._pageTypeIds[pageNum] = 0
+        self._flags[pageNum] = 0
+        self._freelistLeaves.pop(pageNum, None)
+        self._freeBlocks.pop(pageNum, None)
+        self._nPages -= 1
+
+    def __iter__(self):
+        pageTypeIds = self._pageTypeIds
+        for pageNum in range(1, len(pageTypeIds)):
+            if pageTypeIds[pageNum] != 0:
+                yield pageNum
+
+    def __len__(self):
+        return self._nPages
+
+    def getPageType(self, pageNum):
+        """
+        @return  pageType of page#pageNum, or None if absent
+        """
+        if pageNum not in self:
+            return None
+        return pageTypeList[self._pageTypeIds[pageNum] - 1]
+
+    def getLivingBtree(self, pageNum):
+        btreeId = self._btreeIds[pageNum]
+        return self._btreeNames[btreeId - 1] if btreeId > 0 else None
+
+    def getPageMetadata(self, pageNum, field, default=None):
+        """
+        @return  pageMetadata[field] of page#pageNum without building
+          the whole page
+        """
+        if field == "pageType":
+            return self.getPageType(pageNum)
+        if field == "livingBtree":
+            return self.getLivingBtree(pageNum)
+        i = _pageFieldIndex[field]
+        if not self._presentMasks[pageNum] & (1 << i):
+            return default
+        if self._nullMasks[pageNum] & (1 << i):
+            return None
+        return int(self._pageValues[i][pageNum])
+
+    def setPageMetadata(self, pageNum, field, value):
+        assert pageNum in self
+        if field == "pageType":
+            self._pageTypeIds[pageNum] = pageTypeList.index(value) + 1
+            return
+        if field == "livingBtree":
+            self._btreeIds[pageNum] = self._internBtree(value)
+            return
+        i = _pageFieldIndex[field]
+        self._presentMasks[pageNum] |= 1 << i
+        if value is None:
+            self._nullMasks[pageNum] |= 1 << i
+        else:
+            self._nullMasks[pageNum] &= ~(1 << i)
+        self._pageValues[i][pageNum] = value or 0
+
+    def getPageMetadataDict(self, pageNum):
+        pageMetadata = {"pageType": self.getPageType(pageNum)}
+        if self._btreeIds[pageNum] > 0:
+            pageMetadata["livingBtree"] = self.getLivingBtree(pageNum)
+        presentMask = self._presentMasks[pageNum]
+        nullMask = self._nullMasks[pageNum]
+        for i, (field, typecode) in enumerate(_pageIntFields):
+            if presentMask & (1 << i):
+                pageMetadata[field] = (
+                    None if nullMask & (1 << i)
+                    else int(self._pageValues[i][pageNum]))
+        return pageMetadata
+
+    def appendCell(self, pageNum, cell):
+        assert pageNum in self
+        presentMask = 0
+        nullMask = 0
+        iCell = self._freeCellHead
+        if iCell == _NO_CELL:  # Append to the cell table
+            iCell = len(self._nextCells)
+            for (field, bit, values) in self._cellColumns:
+                if field in cell:
+                    presentMask |= bit
+                    value = cell[field]
+                    if value is None:
+                        nullMask |= bit
+                        value = 0
+                    values.append(value)
+                else:
+                    values.append(0)
+            payload = cell.get("payload")
+            if payload is not None:
+                presentMask |= _CELL_HAS_PAYLOAD
+                for (field, values) in self._payloadColumns:
+                    values.append(payload[field])
+            else:
+                for (field, values) in self._payloadColumns:
+                    values.append(0)
+            self._cellPresentMasks.append(presentMask)
+            self._cellNullMasks.append(nullMask)
+            self._nextCells.append(_NO_CELL)
+        else:  # Reuse a free slot
+            self._freeCellHead = self._nextCells[iCell]
+            self._nextCells[iCell] = _NO_CELL
+            for (field, bit, values) in self._cellColumns:
+                value = 0
+                if field in cell:
+                    presentMask |= bit
+                    value = cell[field]
+                    if value is None:
+                        nullMask |= bit
+                        value = 0
+                values[iCell] = value
+            payload = cell.get("payload")
+            for (field, values) in self._payloadColumns:
+                values[iCell] = 0 if payload is None else payload[field]
+            if payload is not None:
+                presentMask |= _CELL_HAS_PAYLOAD
+            self._cellPresentMasks[iCell] = presentMask
+            self._cellNullMasks[iCell] = nullMask
+
+        lastCell = self._lastCells[pageNum]
+        if lastCell == _NO_CELL:
+            self._firstCells[pageNum] = iCell
+        else:
+            self._nextCells[lastCell] = iCell
+        self._lastCells[pageNum] = iCell
+        self._cellCounts[pageNum] += 1
+        self._flags[pageNum] |= _PAGE_HAS_CELLS
+
+    def getCellCount(self, pageNum):
+        """
+        @return  Number of cells appended to page#pageNum
+          (not pageMetadata["nCells"]), or None if the page has no
+          "cells" (ex: freelist page)
+        """
+        if not self._flags[pageNum] & _PAGE_HAS_CELLS:
+            return None
+        return int(self._cellCounts[pageNum])
+
+    def getFreelistLeafPageNums(self, pageNum):
+        """
+        @return  freelistLeafPageNums of page#pageNum, or None if absent
+        """
+        if not self._flags[pageNum] & _PAGE_HAS_FREELIST_LEAVES:
+            return None
+        return [int(leaf) for leaf in self._freelistLeaves[pageNum]]
+
+    def getFreeBlocks(self, pageNum):
+        """
+        @return  freeBlocks of page#pageNum, or None if absent
+        """
+        if not self._flags[pageNum] & _PAGE_HAS_FREE_BLOCKS:
+            return None
+        freeBlocks = self._freeBlocks[pageNum]
+        return [{"offset": int(freeBlocks[i]), "size": int(freeBlocks[i + 1])}
+                for i in range(0, len(freeBlocks), 2)]
+
+    def iterCellValues(self, pageNum, field):
+        """
+        @return  Iterator of cell[field] of each cell of page#pageNum
+          without building cells
+        """
+        i = _cellFieldIndex[field]
+        values = self._cellValues[i]
+        for iCell in self._iterCellIndexes(pageNum):
+            if self._cellNullMasks[iCell] & (1 << i):
+                yield None
+            else:
+                yield int(values[iCell])
+
+    def iterCells(self, pageNum):
+        for iCell in self._iterCellIndexes(pageNum):
+            yield self._buildCell(iCell)
+
+    def _iterCellIndexes(self, pageNum):
+        iCell = self._firstCells[pageNum]
+        nextCells = self._nextCells
+        while iCell != _NO_CELL:
+            yield iCell
+            iCell = nextCells[iCell]
+
+    def _freeCells(self, pageNum):
+        """
+        @desc  Moves cells of page#pageNum to the head of the free list
+          (The page still refers to them: callers reset it)
+        """
+        lastCell = self._lastCells[pageNum]
+        if lastCell == _NO_CELL:
+            return
+        self._nextCells[lastCell] = self._freeCellHead
+        self._freeCellHead = self._firstCells[pageNum]
+
+    def _buildCell(self, iCell):
+        presentMask = self._cellPresentMasks[iCell]
+        nullMask = self._cellNullMasks[iCell]
+        cell = {}
+        for i, (field, typecode) in enumerate(_cellIntFields):
+            if presentMask & (1 << i):
+                cell[field] = (None if nullMask & (1 << i)
+                               else int(self._cellValues[i][iCell]))
+        if presentMask & _CELL_HAS_PAYLOAD:
+            cell["payload"] = dict(
+                (field, int(self._payloadValues[i][iCell]))
+                for i, field in enumerate(_payloadFields))
+        return cell
+
+    def _internBtree(self, name):
+        if name is None:
+            return 0
+        btreeId = self._btreeNameIds.get(name)
+        if btreeId is None:
+            self._btreeNames.append(name)
+            btreeId = len(self._btreeNames)
+            self._btreeNameIds[name] = btreeId
+        return btreeId
+
+    def _grow(self, pageNum):
+        nGrow = pageNum + 1 - len(self._pageTypeIds)
+        if nGrow <= 0:
+            return
+        # Amortize growth by page-at-a-time callers
+        nGrow = max(nGrow, len(self._pageTypeIds) // 2)
+        for arr in ([self._pageTypeIds, self._flags, self._btreeIds,
+                     self._presentMasks, self._nullMasks, self._cellCounts] +
+                    self._pageValues):
+            arr.extend([0] * nGrow)
+        self._firstCells.extend([_NO_CELL] * nGrow)
+        self._lastCells.extend([_NO_CELL] * nGrow)
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
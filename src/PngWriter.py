@@ -0,0 +1,98 @@
+import struct
+import zlib
+
+
+_signature = b"\x89PNG\r\n\x1a\n"
+
+# Bytes of compressed data per IDAT chunk
+_idatChunkLen = 1 << 16
+
+
+class PngWriter(object):
+    """
+    @desc  Writes an 8 bit RGB PNG image row by row.
+      Rows are compressed as they come, so an image of any height takes
+      constant memory.
+
+    @param fileObj  File opened in binary mode
+
+    @usage
+    with open('/path/to/out.png', 'wb') as f_png:
+        writer = PngWriter(f_png, width, height)
+        for row in rows:  # bytearray of width * 3 bytes (R, G, B, R, ...)
+            writer.writeRow(row)
+        writer.close()
+
+    >>> import io
+    >>> f = io.BytesIO()
+    >>> writer = PngWriter(f, 2, 1)
+    >>> writer.writeRow(bytearray(b'\\xff\\x00\\x00\\x00\\x00\\xff'))
+    >>> writer.close()
+    >>> png = f.getvalue()
+    >>> png[:8] == _signature
+    True
+    >>> struct.unpack(">II", png[16:24])  # width, height in IHDR
+    (2, 1)
+    >>> png[-12:] == _chunk(b"IEND", b"")
+    True
+    """
+    def __init__(self, fileObj, width, height):
+        assert width > 0 and height > 0
+        self._f = fileObj
+        self._width = width
+        self._height = height
+        self._nRows = 0
+        self._compressor = zlib.compressobj()
+        self._idat = []
+        self._idatLen = 0
+
+        self._f.write(_signature)
+        # bit depth 8, color type 2 (RGB), compression 0, filter 0,
+        # no interlace
+        self._f.write(_chunk(b"IHDR", struct.pack(
+            ">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+
+    def writeRow(self, row):
+        assert len(row) == self._width * 3
+        assert self._nRows < self._height
+        # Filter type 0 (None) for every row
+        self._addIdat(self._compressor.compress(b"\x00"))
+        self._addIdat(self._compressor.compress(bytes(row)))
+        self._nRows += 1
+
+    def close(self):
+        """
+        @desc  Finishes the image. The file itself is left open.
+        """
+        assert self._nRows == self._height
+        self._addIdat(self._compressor.flush())
+        self._flushIdat()
+        self._f.write(_chunk(b"IEND", b""))
+
+    def _addIdat(self, data):
+        if len(data) == 0:
+            return
+        self._idat.append(data)
+        self._idatLen += len(data)
+        if self._idatLen >= _idatChunkLen:
+            self._flushIdat()
+
+    def _flushIdat(self):
+        if self._idatLen == 0:
+            return
+        self._f.write(_chunk(b"IDAT", b"".join(self._idat)))
+        self._idat = []
+        self._idatLen = 0
+
+
+def _chunk(chunkType, data):
+    return (struct.pack(">I", len(data)) + chunkType + data +
+            struct.pack(">I", zlib.crc32(chunkType + data) & 0xffffffff))
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,225 @@
+import json
+import resource
+import sys
+import time
+try:
+    import tracemalloc  # Python 3.4+
+except ImportError:
+    tracemalloc = None
+
+
+class Profiler(object):
+    """
+    @desc  Records time of each stage and counters of SQLiteAnalyzer and
+      Json2Svg (and anything else calling these hooks).
+      - stage(name): context manager timing a stage. Stages nest, and
+        a nested stage is named "<outer stage>/<name>".
+      - count(name, n): adds n to a counter.
+      - setInfo(key, value): describes the run (ex: DB path).
+      Override onStageEnd() to get stages as they end.
+
+    @param traceMemory  True to record peak memory of each stage traced
+      by tracemalloc (Python 3.4+). Slows things down a lot.
+      Without tracemalloc (Python 2), peak RSS of the process as of the
+      end of each stage (ru_maxrss, which never decreases) is recorded
+      instead: a stage raising it is the one which used the memory.
+      Worker processes (jobs) are not counted either way.
+    @param countVarints  False not to count varints decoded, which costs
+      decoding record headers again (ex: for timing only)
+
+    @usage
+    profiler = Profiler()
+    analyzer = SQLiteAnalyzer('/path/to/db.sqlite', profiler=profiler)
+    json2Svg = Json2Svg()
+    json2Svg.initByDbinfo(analyzer.getDbinfo(), '/path/to/out.svg',
+                          profiler=profiler)
+    json2Svg.dumpSvg()
+    profiler.dumpJson('/path/to/profile.json')
+
+    >>> profiler = Profiler()
+    >>> with profiler.stage("analyze"):
+    ...     with profiler.stage("readPages"):
+    ...         profiler.count("pages", 3)
+    ...     with profiler.stage("readPages"):
+    ...         profiler.count("pages")
+    >>> report = profiler.getReport()
+    >>> sorted(report["stages"])
+    ['analyze', 'analyze/readPages']
+    >>> report["stages"]["analyze/readPages"]["calls"]
+    2
+    >>> report["stages"]["analyze/readPages"]["order"]
+    1
+    >>> report["counters"]
+    {'pages': 4}
+    >>> memoryProfiler = Profiler(traceMemory=True)
+    >>> with memoryProfiler.stage("analyze"):
+    ...     pass
+    >>> memoryKey = ("tracemallocPeakBytes" if tracemalloc is not None
+    ...              else "peakRssKb")
+    >>> memoryProfiler.getReport()["stages"]["analyze"][memoryKey] > 0
+    True
+    """
+    enabled = True
+
+    def __init__(self, traceMemory=False, countVarints=True):
+        self._traceMemory = traceMemory and tracemalloc is not None
+        self._traceRss = traceMemory and tracemalloc is None
+        self.countVarints = countVarints
+        self._stages = {}  # name: {"seconds": ..., "calls": ..., ...}
+        self._stageOrder = []
+        self._counters = {}
+        self._info = {}
+        self._running = []  # [[name, start, peakBytes], ...] of open stages
+        if self._traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def count(self, name, n=1):
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def setInfo(self, key, value):
+        self._info[key] = value
+
+    def onStageEnd(self, name, seconds, peakBytes):
+        """
+        @desc  Hook called when a stage ends. Does nothing by default.
+
+        @param peakBytes  Peak traced memory during the stage
+          (peak RSS in bytes without tracemalloc), or None without
+          traceMemory
+        """
+        pass
+
+    def getReport(self):
+        """
+        @return  {"info": {key: value, ...},
+                  "stages": {name: {"seconds": total seconds,
+                                    "calls": number of times run,
+                                    "order": order of first start,
+                                    ["tracemallocPeakBytes" or
+                                     "peakRssKb": ...]}, ...},
+                  "counters": {name: count, ...}}
+        """
+        stages = {}
+        for order, name in enumerate(self._stageOrder):
+            stages[name] = dict(self._stages[name], order=order)
+        return {
+            "info": dict(self._info),
+            "stages": stages,
+            "counters": dict(self._counters),
+        }
+
+    def dumpJson(self, outPath):
+        with open(outPath, "w") as f_json:
+            json.dump(self.getReport(), f_json, indent=2, sort_keys=True)
+            f_json.write("\n")
+
+    def _startStage(self, name):
+        if len(self._running) > 0:
+            name = self._running[-1][0] + "/" + name
+        if name not in self._stages:
+            self._stages[name] = {"seconds": 0.0, "calls": 0}
+            self._stageOrder.append(name)
+        peakBytes = None
+        if self._traceMemory:
+            # The peak of the outer stage so far is kept before resetting
+            if len(self._running) > 0:
+                outer = self._running[-1]
+                outer[2] = max(outer[2], tracemalloc.get_traced_memory()[1])
+            _resetTracemallocPeak()
+            peakBytes = tracemalloc.get_traced_memory()[1]
+        self._running.append([name, time.time(), peakBytes])
+
+    def _endStage(self):
+        (name, start, peakBytes) = self._running.pop()
+        seconds = time.time() - start
+        if self._traceMemory:
+            peakBytes = max(peakBytes, tracemalloc.get_traced_memory()[1])
+            if len(self._running) > 0:
+                outer = self._running[-1]
+                outer[2] = max(outer[2], peakBytes)
+
+        stage = self._stages[name]
+        stage["seconds"] += seconds
+        stage["calls"] += 1
+        if self._traceMemory:
+            stage["tracemallocPeakBytes"] = max(
+                stage.get("tracemallocPeakBytes", 0), peakBytes)
+        elif self._traceRss:
+            peakRssKb = _getPeakRssKb()
+            stage["peakRssKb"] = max(stage.get("peakRssKb", 0), peakRssKb)
+            peakBytes = peakRssKb * 1024
+        self.onStageEnd(name, seconds, peakBytes)
+
+
+class _Stage(object):
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler._startStage(self._name)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self._profiler._endStage()
+        return False
+
+
+class _NullProfiler(object):
+    """
+    @desc  Profiler doing nothing, used when not profiling.
+      Callers may check `enabled' to skip computing counters.
+    """
+    enabled = False
+    countVarints = False
+
+    def stage(self, name):
+        return _nullStage
+
+    def count(self, name, n=1):
+        pass
+
+    def setInfo(self, key, value):
+        pass
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+_nullStage = _NullStage()
+
+# Default profiler of SQLiteAnalyzer and Json2Svg
+nullProfiler = _NullProfiler()
+
+
+def _resetTracemallocPeak():
+    if hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+        tracemalloc.reset_peak()
+    # Otherwise peaks are since tracing started: an upper bound
+
+
+def _getPeakRssKb():
+    """
+    @return  Peak RSS of this process so far in KB
+      (as Benchmark.py records it)
+    """
+    peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":  # In bytes, in KB on Linux
+        peakRss /= 1024
+    return peakRss
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
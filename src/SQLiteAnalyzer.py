@@ -3,50 +3,206 @@ from DbInfoTemplate import (PageType,
                             BtreeType,
                             CellContent,
                             get_dbinfo_template)
-import json
-import sqlite3
+from PageSource import PageSource
+from PageTable import PageTable
+from WalIndex import readWalIndex, getWalPath
+from Profiler import Profiler, nullProfiler
+from DbInfoJsonWriter import writeDbinfo
+from DbInfoBinary import writeDbinfoBinary
+from DbDecoder import (unpackUint,
+                       unpackPageSize,
+                       unpackBtreeHeader,
+                       unpackUint16Array,
+                       unpackUint32Array,
+                       readFreeBlocks,
+                       readVarint,
+                       readRecordSizes,
+                       countRecordFields,
+                       decodeRecord)
+import codecs
+import multiprocessing
+import zlib
+import StringIO
+import sys
 
 
 class SQLiteAnalyzer(object):
     """
     @param preallocDb  True when analyzing DB created by prealloc SQLite.
+    @param jobs  Number of worker processes to read pages with.
+    @param previousDbinfo  Analysis result (dbinfo) of an older snapshot of
+      the DB. Only pages whose contentHash changed since then are parsed.
+      (Pages are hashed and parsed in jobs processes in this mode too.)
+    @param filterBtrees  Names of btrees to analyze. If given, only pages
+      of these btrees (and their overflow pages) are read, by traversing
+      them from their root pages, and the rest of the file is skipped.
+      (Pages are read sequentially in this mode and previousDbinfo is
+      not used.)
+    @param readFreelist  False not to read freelist pages either
+      when filterBtrees is given. (Always read otherwise.)
+    @param traverse  True to read btree pages by traversing btrees from
+      their root pages instead of reading all pages in order.
+      Each of them is read once and given its btree name right away.
+      Only pages never reached are read in order afterwards and
+      classified by their headers (See README.org - Specify page types).
+      The result is the same as reading all pages in order.
+      (Pages are read sequentially in this mode and previousDbinfo is
+      not used.)
+    @param profiler  Profiler (See Profiler.py) to record time of each
+      stage and counters of pages, cells, varints, overflow pages and
+      bytes read with. Nothing is recorded if None.
+    @param readWal  False to ignore <dbpath>-wal. Otherwise pages in
+      committed frames of the WAL are read from it instead of the DB file
+      (See WalIndex.py), and marked with their frame numbers ("walFrame").
+    @param onlyPages  Numbers of pages to analyze (ex: pages changed since
+      another snapshot; See DbDiff.py). If given, only these pages (and
+      overflow pages of their cells) are read with freelist trunk pages
+      and interior pages of btrees, which give btree names to them.
+      Other leaf pages are never read. An empty list reads no btree page.
+      (Pages are read sequentially in this mode, and previousDbinfo and
+      filterBtrees are not used.)
 
     @usage
     analyzer = SQLiteAnalyzer('/path/to/db.sqlite')
     analyzer.dumpJson(outPath='/path/to/dbinfo.json')
     """
-    def __init__(self, dbpath, preallocDb=False):
+    # (Also of analyzers in _read_page_range_worker)
+    _profiler = nullProfiler
+
+    def __init__(self, dbpath, preallocDb=False, jobs=1,
+                 previousDbinfo=None, filterBtrees=None, readFreelist=True,
+                 traverse=False, profiler=None, readWal=True,
+                 onlyPages=None):
+        assert jobs >= 1
+        if profiler is not None:
+            self._profiler = profiler
+        self._jobs = jobs
+        self._previousDbinfo = previousDbinfo
+        self._traverse = traverse
+        self._filterBtrees = list(filterBtrees or [])
+        self._readFreelist = readFreelist
+        self._readWal = readWal
+        self._walIndex = None
+        self._onlyPages = None if onlyPages is None else set(onlyPages)
+        self._open(dbpath, preallocDb)
+        if len(self._filterBtrees) > 0:
+            self._dbinfo["dbMetadata"]["filterBtrees"] = self._filterBtrees
+        self._read_db()
+
+    def _open(self, dbpath, preallocDb):
         self._dbpath = dbpath
         self._preallocDb = preallocDb
 
-        self._dbdata = self._get_dbdata()
+        self._pageSource = PageSource(self._dbpath)
         self._dbinfo = get_dbinfo_template()
-        self._read_db()
+        self._dbinfo["pages"] = PageTable()
+        # Pages copied from previousDbinfo without parsing
+        self._reusedPageNums = set()
+
+    def getDbinfo(self):
+        """
+        @return  Analyzed dbinfo (See DbInfoTemplate.py), not a copy.
+          Pages are a PageTable keyed by int.
+        """
+        return self._dbinfo
 
     def dumpJson(self,
-                 outPath, encoding=DbFormatConfig.main["dbInfoJsonEncoding"]):
-        with open(outPath, "w") as f_json:
-            json_str = json.dumps(self._dbinfo, indent=2)
-            f_json.write(json_str.encode(encoding))
+                 outPath, encoding=DbFormatConfig.main["dbInfoJsonEncoding"],
+                 compact=False):
+        with codecs.open(outPath, "w", encoding) as f_json:
+            writeDbinfo(f_json, self._dbinfo, compact=compact)
 
-    def getJson(self):
-        return json.dumps(self._dbinfo, indent=2)
+    def dumpBinary(self, outPath):
+        """
+        @desc  Dumps dbinfo in compact binary form (See DbInfoBinary.py)
+        """
+        writeDbinfoBinary(outPath, self._dbinfo)
+
+    def getJson(self, compact=False):
+        f_json = StringIO.StringIO()
+        writeDbinfo(f_json, self._dbinfo, compact=compact)
+        return f_json.getvalue()
 
-    def printJson(self):
-        json_str = json.dumps(self._dbinfo, indent=2)
-        print(json_str)
+    def printJson(self, compact=False):
+        writeDbinfo(sys.stdout, self._dbinfo, compact=compact)
+        sys.stdout.write("\n")
 
     def _read_db(self):
-        assert len(self._dbdata) > 0
-        self._read_db_metadata()
-        self._read_db_pages()
-        self._summarize_dbinfo()
+        assert len(self._pageSource) > 0
+        stage = self._profiler.stage
+        if self._profiler.enabled:
+            self._pageSource.trackReads()
+        try:
+            with stage("_read_wal"):
+                self._read_wal()
+            with stage("_read_db_metadata"):
+                self._read_db_metadata()
+            with stage("_listBtrees"):
+                # Set self._dbinfo["dbMetadata"]["btrees"]
+                self._listBtrees()
+            if self._onlyPages is not None:
+                with stage("_read_listed_pages"):
+                    self._read_listed_pages()
+            elif len(self._filterBtrees) > 0:
+                with stage("_read_filtered_btree_pages"):
+                    self._read_filtered_btree_pages()
+            elif self._traverse:
+                with stage("_read_db_pages_by_traversing"):
+                    self._read_db_pages_by_traversing()
+            else:
+                with stage("_read_db_pages"):
+                    self._read_db_pages()
+        finally:
+            if self._profiler.enabled:
+                self._countPageSourceReads()
+            self._pageSource.close()
+        with stage("_summarize_dbinfo"):
+            self._summarize_dbinfo()
+        if self._profiler.enabled:
+            self._countPages()
+
+    def _countPageSourceReads(self):
+        """
+        @desc  Records numbers of page fetches (a page is fetched many times
+          while read) and distinct pages and bytes read (only when profiling)
+        """
+        nPagesRead = self._pageSource.getNPagesRead()
+        self._profiler.count("pageFetches", self._pageSource.nPageReads)
+        self._profiler.count("pagesRead", nPagesRead)
+        self._profiler.count(
+            "bytesRead", nPagesRead * self._dbinfo["dbMetadata"]["pageSize"])
 
-    def _get_dbdata(self):
-        # TODO: support big db
-        assert len(self._dbpath) > 0
-        with open(self._dbpath, "rb") as f_db:
-            return f_db.read()
+    def _countPages(self):
+        """
+        @desc  Records the DB and number of pages of each type analyzed
+          (only when profiling)
+        """
+        dbMdata = self._dbinfo["dbMetadata"]
+        self._profiler.setInfo("dbPath", self._dbpath)
+        self._profiler.setInfo("nPages", dbMdata["nPages"])
+        self._profiler.setInfo("pageSize", dbMdata["pageSize"])
+        pages = self._dbinfo["pages"]
+        for pageNum in pages:
+            self._profiler.count(
+                "pagesByType.%s" % (pages.getPageType(pageNum)))
+
+    def _read_wal(self):
+        """
+        @desc  Overlays committed frames of <dbpath>-wal, if any, on the DB
+          file, so that a WAL mode DB is analyzed as it is now
+          without checkpoint.
+        """
+        if self._readWal:
+            self._walIndex = readWalIndex(getWalPath(self._dbpath))
+        if self._walIndex is None:
+            return
+        self._pageSource.overlayWal(self._walIndex)
+        self._dbinfo["dbMetadata"]["wal"] = {
+            "nFrames": self._walIndex["nFrames"],
+            "nPages": len(self._walIndex["pageFrames"]),
+            "checkpointSequence": self._walIndex["checkpointSequence"],
+        }
+        self._profiler.count("walFrames", self._walIndex["nFrames"])
 
     def _read_db_metadata(self):
         hFormat = DbFormatConfig.dbHeaderFormat
@@ -54,43 +210,38 @@ class SQLiteAnalyzer(object):
         # Set metadata into dbinfo
         dbMdata = self._dbinfo["dbMetadata"]
 
-        db_header_binstr = self._dbdata[
-            hFormat["offsetInFile"]:
-            hFormat["len"]]
-        page_size_binstr = db_header_binstr[
-            hFormat["pageSizeOffset"]:
-            hFormat["pageSizeOffset"] + hFormat["pageSizeLen"]]
-        dbMdata["pageSize"] = _binstr2int_bigendian(page_size_binstr)
+        db_header = self._pageSource.getBytes(
+            hFormat["offsetInFile"], hFormat["len"])
+        dbMdata["pageSize"] = unpackPageSize(db_header)
+
+        dbMdata["nPages"] = len(self._pageSource) / dbMdata["pageSize"]
+        self._pageSource.setPageSize(dbMdata["pageSize"])
 
-        dbMdata["nPages"] = len(self._dbdata) / dbMdata["pageSize"]
+        dbMdata["usablePageSize"] = dbMdata["pageSize"] - unpackUint(
+            db_header,
+            hFormat["reservedSpaceOffset"], hFormat["reservedSpaceLen"])
 
-        reserved_space_binstr = db_header_binstr[
-            hFormat["reservedSpaceOffset"]:
-            hFormat["reservedSpaceOffset"] + hFormat["reservedSpaceLen"]]
-        dbMdata["usablePageSize"] = (
-            dbMdata["pageSize"] - _binstr2int_bigendian(reserved_space_binstr))
+        # 0 until the first table is created, when TEXT is not stored yet
+        self._textEncoding = DbFormatConfig.textEncodings.get(
+            unpackUint(db_header,
+                       hFormat["textEncodingOffset"],
+                       hFormat["textEncodingLen"]),
+            DbFormatConfig.textEncodings[1])
 
         if not self._preallocDb:
-            freelist_trunk_head_binstr = db_header_binstr[
-                hFormat["freelistTrunkHeadOffset"]:
-                    hFormat["freelistTrunkHeadOffset"] +
-                    hFormat["freelistTrunkHeadLen"]]
-            dbMdata["freelistTrunkHead"] = _binstr2int_bigendian(
-                freelist_trunk_head_binstr)
-
-            n_freelist_pages_binstr = db_header_binstr[
-                hFormat["nFreelistPagesOffset"]:
-                    hFormat["nFreelistPagesOffset"] +
-                    hFormat["nFreelistPagesLen"]]
-            dbMdata["nFreelistPages"] = _binstr2int_bigendian(
-                n_freelist_pages_binstr)
+            dbMdata["freelistTrunkHead"] = unpackUint(
+                db_header,
+                hFormat["freelistTrunkHeadOffset"],
+                hFormat["freelistTrunkHeadLen"])
+            dbMdata["nFreelistPages"] = unpackUint(
+                db_header,
+                hFormat["nFreelistPagesOffset"],
+                hFormat["nFreelistPagesLen"])
         else:  # Prealloc SQLite
-            freelist_map_head_binstr = db_header_binstr[
-                hFormat["freelistMapHeadOffset"]:
-                    hFormat["freelistMapHeadOffset"] +
-                    hFormat["freelistMapHeadLen"]]
-            dbMdata["freelistMapHead"] = _binstr2int_bigendian(
-                freelist_map_head_binstr)
+            dbMdata["freelistMapHead"] = unpackUint(
+                db_header,
+                hFormat["freelistMapHeadOffset"],
+                hFormat["freelistMapHeadLen"])
 
     def _read_db_pages(self):
         # Read freelist pages first to prevent meaningless page analysis
@@ -98,26 +249,334 @@ class SQLiteAnalyzer(object):
 
         # Read pages
         p_cnt = self._dbinfo["dbMetadata"]["nPages"]
-        for pageNum in range(1, p_cnt + 1):
+        if self._can_reuse_previous_dbinfo():
+            self._read_page_range_incremental(1, p_cnt)
+        elif self._jobs > 1:
+            self._read_page_range_parallel(1, p_cnt)
+        else:
+            self._read_page_range(1, p_cnt)
+
+    def _read_db_pages_by_traversing(self):
+        # Read freelist pages first as _read_db_pages does
+        self._read_freelist_pages()
+        for btreeDict in self._targetBtrees():
+            self._read_btree_pages(btreeDict)
+
+        # Orphan pages: not in any btree nor in freelist
+        # (overflow pages of btree cells are already read)
+        self._read_page_range(1, self._dbinfo["dbMetadata"]["nPages"])
+
+    def _read_filtered_btree_pages(self):
+        btreeNames = set(btree["name"]
+                         for btree in self._dbinfo["dbMetadata"]["btrees"])
+        for name in self._filterBtrees:
+            if name not in btreeNames:
+                _warn("No btree named '%s'" % (name))
+
+        # Freelist pages are read first for the same reason as
+        # _read_db_pages, in case a corrupt btree refers to one of them
+        if self._readFreelist:
+            self._read_freelist_pages()
+        for btreeDict in self._targetBtrees():
+            self._read_btree_pages(btreeDict)
+
+    def _read_listed_pages(self):
+        # Freelist pages are read first as _read_db_pages does
+        self._read_freelist_pages()
+        if len(self._onlyPages) == 0:
+            return
+        for btreeDict in self._dbinfo["dbMetadata"]["btrees"]:
+            self._read_btree_interior_pages(btreeDict)
+
+        # Listed pages in no btree (ex: orphan pages, and overflow pages
+        # whose cells are in pages not listed) are classified by headers
+        nPages = self._dbinfo["dbMetadata"]["nPages"]
+        for pageNum in sorted(self._onlyPages):
+            if 1 <= pageNum <= nPages:
+                self._read_page(pageNum)
+
+    def _read_btree_interior_pages(self, btreeDict):
+        """
+        @desc  Traverses the btree as _markBtreePagesByTraversing does,
+          reading interior pages and only leaf pages in onlyPages.
+          All leaves of a btree are on the same level, which is known
+          once the leftmost leaf is read: children of pages on the level
+          above it are leaves and need not be read to be skipped.
+        """
+        btreeName = btreeDict["name"]
+        pages = self._dbinfo["pages"]
+        leafLevel = None
+        visited = set()
+        stack = [(btreeDict["rootPage"], 0)]
+
+        while stack:
+            (pageNum, level) = stack.pop()
+            if pageNum in visited:
+                _warn("Btree '%s' refers to page#%d more than once" %
+                      (btreeName, pageNum))
+                continue
+            visited.add(pageNum)
+            if level == leafLevel and pageNum not in self._onlyPages:
+                continue
+            self._read_page(pageNum)
+            pages.setPageMetadata(pageNum, "livingBtree", btreeName)
+
+            pageType = pages.getPageType(pageNum)
+            if pageType in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
+                if leafLevel is None:
+                    leafLevel = level
+                continue
+            assert pageType in (PageType.INDEX_INTERIOR,
+                                PageType.TABLE_INTERIOR)
+            stack.append((pages.getPageMetadata(pageNum,
+                                                "rightmostChildPageNum"),
+                          level + 1))
+            stack.extend((child, level + 1) for child in reversed(list(
+                pages.iterCellValues(pageNum, "leftChildPage"))))
+
+    def _read_btree_pages(self, btreeDict):
+        """
+        @desc  Reads pages of the btree by traversing it from its root page,
+          giving btree name to each of them at the same time.
+          Overflow pages are read from cells as usual.
+        """
+        self._markBtreePagesByTraversing(btreeDict, readPages=True)
+
+    def _targetBtrees(self):
+        """
+        @return  Btrees to analyze (See filterBtrees)
+        """
+        btrees = self._dbinfo["dbMetadata"]["btrees"]
+        if len(self._filterBtrees) == 0:
+            return btrees
+        return [btree for btree in btrees
+                if btree["name"] in self._filterBtrees]
+
+    def _read_page_range(self, firstPage, lastPage):
+        pages = self._dbinfo["pages"]
+        for pageNum in range(firstPage, lastPage + 1):
             # (skip freelist pages)
-            if (pageNum in self._dbinfo["pages"] and
-                "pageMetadata" in self._dbinfo["pages"][pageNum] and
-                self._dbinfo["pages"][pageNum]["pageMetadata"]["pageType"] in (
-                    PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF)):
+            if pages.getPageType(pageNum) in (
+                    PageType.FREELIST_TRUNK, PageType.FREELIST_LEAF):
                 continue
 
             self._read_page(pageNum)
 
+    def _can_reuse_previous_dbinfo(self):
+        if self._previousDbinfo is None:
+            return False
+        prevMdata = self._previousDbinfo["dbMetadata"]
+        dbMdata = self._dbinfo["dbMetadata"]
+        return (prevMdata["pageSize"] == dbMdata["pageSize"] and
+                prevMdata["usablePageSize"] == dbMdata["usablePageSize"])
+
+    def _read_page_range_incremental(self, firstPage, lastPage):
+        """
+        @desc  Copies pages whose content is unchanged from previousDbinfo
+          and parses only the others.
+          Overflow chains of copied pages are validated afterwards
+          (See _revalidate_reused_overflow_pages).
+        """
+        prevHashes = self._previous_content_hashes(firstPage, lastPage)
+        if self._jobs > 1:
+            unchangedPageNums = self._read_page_range_parallel(
+                firstPage, lastPage, prevHashes)
+        else:
+            unchangedPageNums = self._read_changed_pages(
+                firstPage, lastPage, prevHashes)
+        self._copy_previous_pages(unchangedPageNums)
+        self._revalidate_reused_overflow_pages()
+
+    def _previous_content_hashes(self, firstPage, lastPage):
+        """
+        @return  {pageNum: contentHash} of pages of previousDbinfo
+          in the range which can be copied if unchanged
+        """
+        prevPages = self._previousDbinfo["pages"]
+        prevHashes = {}
+        for pageNum in range(firstPage, lastPage + 1):
+            prevPage = _get_page(prevPages, pageNum)
+            if (prevPage is not None and
+                _is_content_derived(prevPage) and
+                not _lacks_free_space(prevPage) and
+                prevPage["pageMetadata"].get("contentHash") is not None):
+                prevHashes[pageNum] = prevPage["pageMetadata"]["contentHash"]
+        return prevHashes
+
+    def _read_changed_pages(self, firstPage, lastPage, prevHashes):
+        """
+        @desc  Parses pages in the range whose hashes differ from prevHashes.
+
+        @return  Numbers of the other pages, to be copied from
+          previousDbinfo by _copy_previous_pages
+        """
+        pages = self._dbinfo["pages"]
+        unchangedPageNums = []
+        for pageNum in range(firstPage, lastPage + 1):
+            # (skip freelist pages and already reached overflow pages)
+            if pageNum in pages:
+                continue
+            if prevHashes.get(pageNum) == self._page_hash(pageNum):
+                unchangedPageNums.append(pageNum)
+            else:
+                self._read_page(pageNum)
+        return unchangedPageNums
+
+    def _copy_previous_pages(self, pageNums):
+        pages = self._dbinfo["pages"]
+        prevPages = self._previousDbinfo["pages"]
+        for pageNum in pageNums:
+            # (overflow chains of parsed pages win, as in _read_overflow_pages)
+            if pageNum in pages:
+                continue
+            pages[pageNum] = self._copy_previous_page(
+                pageNum, _get_page(prevPages, pageNum))
+            self._reusedPageNums.add(pageNum)
+            self._profiler.count("pagesReused")
+
+    def _copy_previous_page(self, pageNum, prevPage):
+        pageMetadata = dict(prevPage["pageMetadata"])
+        # livingBtree is given again by _mapBtreeAndPage
+        if "livingBtree" in pageMetadata:
+            pageMetadata["livingBtree"] = self._initial_living_btree(pageNum)
+        # and walFrame by _markWalPages
+        pageMetadata.pop("walFrame", None)
+        page = {"pageMetadata": pageMetadata}
+        if "cells" in prevPage:
+            page["cells"] = list(prevPage["cells"])
+        if "freeBlocks" in prevPage:
+            page["freeBlocks"] = list(prevPage["freeBlocks"])
+        return page
+
+    def _revalidate_reused_overflow_pages(self):
+        """
+        @desc  An unchanged page may have an overflow chain
+          some pages of which changed, and an unchanged overflow page
+          may have lost its owner cell.
+          Walk chains again for the former and read the latter again.
+        """
+        pages = self._dbinfo["pages"]
+        reached = set()
+        for pageNum in sorted(self._reusedPageNums):
+            if pageNum not in self._reusedPageNums:  # Replaced meanwhile
+                continue
+            if pages.getPageType(pageNum) == PageType.OVERFLOW:
+                continue
+            for cell in pages.iterCells(pageNum):
+                head = cell.get("overflowPage")
+                if head is None:
+                    continue
+                chain = self._reused_overflow_chain(head)
+                if chain is None:
+                    payload = cell["payload"]
+                    payloadSize = payload["headerSize"] + payload["bodySize"]
+                    self._read_overflow_pages(
+                        head,
+                        payloadSize - self._getPayloadSizeInCell(payloadSize))
+                else:
+                    reached.update(chain)
+
+        for pageNum in sorted(self._reusedPageNums):
+            if (pages.getPageType(pageNum) == PageType.OVERFLOW and
+                    pageNum not in reached):
+                del pages[pageNum]
+                self._reusedPageNums.discard(pageNum)
+                self._read_page(pageNum)
+
+    def _reused_overflow_chain(self, head):
+        """
+        @return  Page numbers of the overflow chain starting from head,
+          or None if some of them are not copied overflow pages
+        """
+        pages = self._dbinfo["pages"]
+        chain = []
+        chainSet = set()
+        pageNum = head
+        while pageNum != DbFormatConfig.overflowPageFormat["pageNumForFinal"]:
+            if (pageNum not in self._reusedPageNums or
+                pageNum in chainSet or
+                pages.getPageType(pageNum) != PageType.OVERFLOW):
+                return None
+            chain.append(pageNum)
+            chainSet.add(pageNum)
+            pageNum = pages.getPageMetadata(pageNum, "nextOverflowPageNum")
+        return chain
+
+    def _page_hash(self, pageNum):
+        return zlib.crc32(self._get_page_data(pageNum)) & 0xffffffff
+
+    def _read_page_range_parallel(self, firstPage, lastPage,
+                                  prevHashes=None):
+        """
+        @desc  Splits [firstPage, lastPage] into chunks and reads them in
+          a process pool. Each worker opens the DB by itself.
+          Per-chunk pages are merged in chunk order; see _merge_pages.
+
+        @param prevHashes  See _read_changed_pages. If given, workers parse
+          only changed pages.
+
+        @return  Numbers of unchanged pages if prevHashes is given
+          (See _read_changed_pages), or []
+        """
+        nChunks = self._jobs * DbFormatConfig.main["parallelChunksPerJob"]
+        chunkLen = max(1, (lastPage - firstPage + 1 + nChunks - 1) / nChunks)
+        freelistPages = dict(self._dbinfo["pages"])
+        args = []
+        for first in range(firstPage, lastPage + 1, chunkLen):
+            last = min(first + chunkLen - 1, lastPage)
+            chunkPrevHashes = None
+            if prevHashes is not None:
+                chunkPrevHashes = dict(
+                    (pageNum, prevHashes[pageNum])
+                    for pageNum in range(first, last + 1)
+                    if pageNum in prevHashes)
+            args.append((self._dbpath, self._preallocDb, self._walIndex,
+                         self._dbinfo["dbMetadata"], freelistPages,
+                         first, last, chunkPrevHashes,
+                         self._profiler.enabled, self._profiler.countVarints))
+
+        unchangedPageNums = []
+        pool = multiprocessing.Pool(self._jobs)
+        try:
+            for (chunkPages, chunkUnchangedPageNums,
+                 counters) in pool.imap(_read_page_range_worker, args):
+                self._merge_pages(chunkPages)
+                unchangedPageNums.extend(chunkUnchangedPageNums)
+                for name, n in counters.iteritems():
+                    self._profiler.count(name, n)
+        finally:
+            pool.close()
+            pool.join()
+        return unchangedPageNums
+
+    def _merge_pages(self, chunkPages):
+        """
+        @desc  Heuristically read pages of chunks never collide since chunks
+          are disjoint. Overflow pages may, when a chain crosses chunks:
+          overflow classification always wins over heuristic one,
+          like _read_overflow_pages does in sequential reading,
+          so the result does not depend on the number of jobs.
+        """
+        pages = self._dbinfo["pages"]
+        for pageNum, page in sorted(chunkPages.iteritems()):
+            if pageNum not in pages:
+                pages[pageNum] = page
+            elif page["pageMetadata"]["pageType"] == PageType.OVERFLOW:
+                if _is_heuristically_read_type(pages.getPageType(pageNum)):
+                    pages[pageNum] = page
+                else:  # Both chunks saw it as overflow page (corrupt DB)
+                    for cell in page["cells"]:
+                        pages.appendCell(pageNum, cell)
+
     def _get_page_data(self, pageNum):
-        page_size = self._dbinfo["dbMetadata"]["pageSize"]
-        page_offset = page_size * (pageNum - 1)
-        return self._dbdata[page_offset:page_offset + page_size]
+        return self._pageSource.getPage(pageNum)
 
     def _read_freelist_pages(self):
-        if not self._preallocDb:
-            self._read_freelist_pages_normal()
-        else:
-            self._read_freelist_pages_prealloc()
+        with self._profiler.stage("_read_freelist_pages"):
+            if not self._preallocDb:
+                self._read_freelist_pages_normal()
+            else:
+                self._read_freelist_pages_prealloc()
 
     def _read_freelist_pages_normal(self):
         iTrunkHead = self._dbinfo["dbMetadata"]["freelistTrunkHead"]
@@ -134,12 +593,10 @@ class SQLiteAnalyzer(object):
          for (iRootPg, iTrunkHead) in
          self._get_freelist_trunk_heads_from_map()]
 
-    def _read_freelist_pages_aux(self, iTrunkHead, iRootPg):
+    def _read_freelist_pages_aux(self, iTrunkHead, iRootPg=None):
         assert(iTrunkHead > 0)
-        pages = self._dbinfo["pages"]
         next_trunk = iTrunkHead
         while isinstance(next_trunk, int) and next_trunk > 0:
-            pages[next_trunk] = {"pageMetadata": {}}
             next_trunk = self._read_freelist_trunk_page_and_its_leaves(
                 next_trunk, iRootPg)
 
@@ -148,44 +605,38 @@ class SQLiteAnalyzer(object):
         trunk_pg_format = DbFormatConfig.freelistTrunkPageFormat
 
         # Find next freelist trunk page number
-        next_trunk_page_offset = trunk_pg_format["nextTrunkPageOffset"]
-        next_trunk_page_binstr = page_data[
-            next_trunk_page_offset:
-            next_trunk_page_offset + trunk_pg_format["nextTrunkPageLen"]]
-        next_trunk_page = _binstr2int_bigendian(next_trunk_page_binstr)
+        next_trunk_page = unpackUint(
+            page_data,
+            trunk_pg_format["nextTrunkPageOffset"],
+            trunk_pg_format["nextTrunkPageLen"])
 
         # Find the number of freelist leaf page this trunk page has
-        n_leaves_offset = trunk_pg_format["nLeavesOffset"]
-        n_leaves_binstr = page_data[
-            n_leaves_offset:
-            n_leaves_offset + trunk_pg_format["nLeavesLen"]]
-        n_leaves = _binstr2int_bigendian(n_leaves_binstr)
-
-        # Set pageMetadata
-        self._dbinfo["pages"][iTrunk]["pageMetadata"] = {
-            "pageType": PageType.FREELIST_TRUNK,
-            "pgnoRoot": iRootPg,
-            "nextFreelistTrunkPageNum": next_trunk_page,
-            "nFreelistLeaves": n_leaves,
-        }
+        n_leaves = unpackUint(
+            page_data,
+            trunk_pg_format["nLeavesOffset"],
+            trunk_pg_format["nLeavesLen"])
 
         # Find all freelist leaf pages which belongs to this trunk
-        self._dbinfo["pages"][iTrunk]["freelistLeafPageNums"] = []
-        leaves = self._dbinfo["pages"][iTrunk]["freelistLeafPageNums"] = []
-        leaves = self._dbinfo["pages"][iTrunk]["freelistLeafPageNums"]
-        offset = trunk_pg_format["firstLeafPageNumOffset"]
-        for i in range(n_leaves):
-            leaf_num_binstr = page_data[
-                offset:offset + trunk_pg_format["leafPageNumLen"]]
-            leaf_num = _binstr2int_bigendian(leaf_num_binstr)
-            leaves.append(leaf_num)
+        assert trunk_pg_format["leafPageNumLen"] == 4
+        leaves = list(unpackUint32Array(
+            page_data, trunk_pg_format["firstLeafPageNumOffset"], n_leaves))
+
+        self._dbinfo["pages"][iTrunk] = {
+            "pageMetadata": {
+                "pageType": PageType.FREELIST_TRUNK,
+                "pgnoRoot": iRootPg,
+                "nextFreelistTrunkPageNum": next_trunk_page,
+                "nFreelistLeaves": n_leaves,
+            },
+            "freelistLeafPageNums": leaves,
+        }
+        for leaf_num in leaves:
             self._dbinfo["pages"][leaf_num] = {
                 "pageMetadata": {
                     "pageType": PageType.FREELIST_LEAF,
                     "pgnoRoot": iRootPg,
                 }
             }
-            offset += trunk_pg_format["leafPageNumLen"]
 
         return next_trunk_page
 
@@ -193,10 +644,9 @@ class SQLiteAnalyzer(object):
         assert(self._preallocDb)
         page1 = self._get_page_data(1)
         hFormat = DbFormatConfig.dbHeaderFormat
-        iMapPage_binstr = page1[hFormat["freelistMapHeadOffset"]:
-                                hFormat["freelistMapHeadOffset"] +
-                                hFormat["freelistMapHeadLen"]]
-        return _binstr2int_bigendian(iMapPage_binstr)
+        return unpackUint(page1,
+                          hFormat["freelistMapHeadOffset"],
+                          hFormat["freelistMapHeadLen"])
 
     def _get_freelist_trunk_heads_from_map(self):
         """
@@ -219,34 +669,23 @@ class SQLiteAnalyzer(object):
             }
 
             # Read metadata
-            iNextMap_binstr = aMap[0:4]
-            iNextMap = _binstr2int_bigendian(iNextMap_binstr)
-
-            nBtree_binstr = aMap[4:8]
-            nBtree = _binstr2int_bigendian(nBtree_binstr)
+            (iNextMap, nBtree) = unpackUint32Array(aMap, 0, 2)
 
             # Get trunk page nums
-            for i in range(nBtree):
-                pageSize = self._dbinfo["dbMetadata"]["pageSize"]
-                lenFreelistMapHead = 8
-                lenFreelistMapKey = 4
-                lenFreelistMapVal = 12
-                nMaxTrunk = int((pageSize - lenFreelistMapHead) /
-                                (lenFreelistMapVal + lenFreelistMapKey))
-
-                # root page num
-                iRootPgOffset = (lenFreelistMapHead + lenFreelistMapKey * i)
-                iRootPg_binstr = aMap[iRootPgOffset:
-                                      iRootPgOffset + lenFreelistMapKey]
-                iRootPg = _binstr2int_bigendian(iRootPg_binstr)
-
+            pageSize = self._dbinfo["dbMetadata"]["pageSize"]
+            lenFreelistMapHead = 8
+            lenFreelistMapKey = 4
+            lenFreelistMapVal = 12
+            nMaxTrunk = int((pageSize - lenFreelistMapHead) /
+                            (lenFreelistMapVal + lenFreelistMapKey))
+            # root page nums are packed right after map header
+            iRootPgs = unpackUint32Array(aMap, lenFreelistMapHead, nBtree)
+            for i, iRootPg in enumerate(iRootPgs):
                 # trunk head
                 iTrunkHeadOffset = (lenFreelistMapHead +
                                     lenFreelistMapKey * nMaxTrunk +
                                     lenFreelistMapVal * i)
-                iTrunkHead_binstr = aMap[iTrunkHeadOffset:
-                                         iTrunkHeadOffset + 4]
-                iTrunkHead = _binstr2int_bigendian(iTrunkHead_binstr)
+                iTrunkHead = unpackUint(aMap, iTrunkHeadOffset, 4)
 
                 if iTrunkHead > 0:
                     ret.append((iRootPg, iTrunkHead))
@@ -257,56 +696,88 @@ class SQLiteAnalyzer(object):
 
     def _read_page(self, pageNum):
         # Possibly page[pageNum] is already read (ex: overflow page)
-        if pageNum in self._dbinfo["pages"]:
+        pages = self._dbinfo["pages"]
+        if pageNum in pages:
             return
-        self._dbinfo["pages"][pageNum] = {
-            "pageMetadata": {
-                "pageType": PageType.UNCERTAIN,
-            },
-            "cells": []
-        }
-        this_page = self._dbinfo["pages"][pageNum]
+        self._profiler.count("pagesParsed")
 
-        self._read_page_metadata(pageNum)
-        page_metadata = this_page["pageMetadata"]
+        page_metadata = self._read_page_metadata(pageNum)
+        page_metadata["contentHash"] = self._page_hash(pageNum)
         page_type = page_metadata["pageType"]
+        page = {
+            "pageMetadata": page_metadata,
+            "cells": []
+        }
+        is_btree_page = page_type in (
+            PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
+            PageType.TABLE_LEAF, PageType.TABLE_INTERIOR)
+        if is_btree_page:
+            cell_pointer_array_offset = self._get_cell_pointer_array_offset(
+                pageNum, page_type)
+            page["freeBlocks"] = self._read_free_space(
+                pageNum, page_metadata, cell_pointer_array_offset)
+        pages[pageNum] = page
 
         # Read cells
-        if page_type in (PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
-                         PageType.TABLE_LEAF, PageType.TABLE_INTERIOR):
-            CPAFormat = DbFormatConfig.cellPointerArrayFormat
-            cell_pointer_array_offset = None
-            if page_type in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
-                cell_pointer_array_offset = CPAFormat["offsetInLeafPage"]
-            elif page_type in (PageType.INDEX_INTERIOR,
-                               PageType.TABLE_INTERIOR):
-                cell_pointer_array_offset = CPAFormat["offsetInInteriorPage"]
-            if pageNum == 1:
-                dbHLen = DbFormatConfig.dbHeaderFormat["len"]
-                cell_pointer_array_offset += dbHLen
-
+        if is_btree_page:
             self._read_cells(pageNum,
                              page_type,
                              page_metadata["nCells"],
                              cell_pointer_array_offset,
                              page_metadata["cellContentAreaOffset"])
-            assert len(this_page["cells"]) == page_metadata["nCells"]
+            assert pages.getCellCount(pageNum) == page_metadata["nCells"]
+
+    def _get_cell_pointer_array_offset(self, pageNum, page_type):
+        CPAFormat = DbFormatConfig.cellPointerArrayFormat
+        if page_type in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
+            cell_pointer_array_offset = CPAFormat["offsetInLeafPage"]
+        else:
+            cell_pointer_array_offset = CPAFormat["offsetInInteriorPage"]
+        if pageNum == 1:
+            cell_pointer_array_offset += DbFormatConfig.dbHeaderFormat["len"]
+        return cell_pointer_array_offset
+
+    def _read_free_space(self, pageNum, page_metadata,
+                         cell_pointer_array_offset):
+        """
+        @desc  Walks the freeblock chain and measures the unallocated space
+          between the cell pointer array and the cell content area.
+          Sets "nFreeBlockBytes" and "nUnallocatedBytes" of page_metadata
+          ("nFragmentedBytes" is in b-tree header).
+
+        @return  [{"offset": ..., "size": ...}, ...] of freeblocks
+
+        @methodology
+        See: README.org - Measure free space
+        """
+        page_data = self._get_page_data(pageNum)
+        usable_size = self._dbinfo["dbMetadata"]["usablePageSize"]
+        free_blocks = readFreeBlocks(page_data,
+                                     page_metadata["freeBlockOffset"],
+                                     usable_size)
+        page_metadata["nFreeBlockBytes"] = sum(
+            size for (offset, size) in free_blocks)
+
+        # 0 in b-tree header means 65536 (64KB page)
+        content_offset = page_metadata["cellContentAreaOffset"] or 65536
+        cell_pointer_array_end = (
+            cell_pointer_array_offset +
+            DbFormatConfig.cellPointerArrayFormat["elemLen"] *
+            page_metadata["nCells"])
+        page_metadata["nUnallocatedBytes"] = max(
+            0, min(content_offset, usable_size) - cell_pointer_array_end)
+        return [{"offset": offset, "size": size}
+                for (offset, size) in free_blocks]
 
     def _read_cells(self, pageNum, page_type, n_cells,
                     cell_pointer_array_offset,
                     cell_content_area_offset):
-        this_page = self._dbinfo["pages"][pageNum]
-        this_page["cells"] = []
-
         page_data = self._get_page_data(pageNum)
-        CPAFormat = DbFormatConfig.cellPointerArrayFormat
-        CPA_offset = cell_pointer_array_offset
-        CPA_elem_len = CPAFormat["elemLen"]
-        for CPA_elem_offset in range(CPA_offset,
-                                     CPA_offset + CPA_elem_len * n_cells,
-                                     CPA_elem_len):
-            CPA = page_data[CPA_elem_offset:CPA_elem_offset + CPA_elem_len]
-            cell_offset = _binstr2int_bigendian(CPA)
+        assert DbFormatConfig.cellPointerArrayFormat["elemLen"] == 2
+        # Decode whole cell pointer array at once
+        cell_offsets = unpackUint16Array(
+            page_data, cell_pointer_array_offset, n_cells)
+        for cell_offset in cell_offsets:
             assert cell_offset < len(page_data)
 
             self._readCell(pageNum, cell_offset, page_type)
@@ -314,7 +785,7 @@ class SQLiteAnalyzer(object):
     def _read_page_metadata(self, pageNum):
         """
         @note
-        Sets pageMetadata (See DbInfoTemplate.py)
+        Returns pageMetadata (See DbInfoTemplate.py)
 
         @requirement
         At least specify:
@@ -328,20 +799,16 @@ class SQLiteAnalyzer(object):
         @methodology
         See: README.org - Specify page types
         """
-        this_page = self._dbinfo["pages"][pageNum]
-
         btHFormat = DbFormatConfig.btreeHeaderFormat
         page_data = self._get_page_data(pageNum)
         bth_offset = (btHFormat["offsetInPage1"] if pageNum == 1
                       else btHFormat["offsetInPage"])
-        btree_header_data = page_data[
-            bth_offset:
-            bth_offset + max(btHFormat["leafLen"], btHFormat["interiorLen"])]
         (btree_header_flag,
          free_block_offset,
          n_cells,
          cell_content_area_offset,
-         rightmostChildPageNum) = self._get_btree_header(btree_header_data)
+         n_fragmented_bytes,
+         rightmostChildPageNum) = self._get_btree_header(page_data, bth_offset)
         page_type = _btree_header_flag_TO_PageType(btree_header_flag)
 
         page_size = len(page_data)
@@ -360,26 +827,33 @@ class SQLiteAnalyzer(object):
              cell_content_area_offset == 0) and
             0 <= n_cells <= page_size / min_cell_len):
 
-            this_page["pageMetadata"] = {
+            pageMetadata = {
                 "pageType": page_type,
                 "nCells": n_cells,
                 "freeBlockOffset": free_block_offset,
                 "cellContentAreaOffset": cell_content_area_offset,
-                "livingBtree": btHFormat["uncertainLivingBtreeStr"],
+                "nFragmentedBytes": n_fragmented_bytes,
+                "livingBtree": self._initial_living_btree(pageNum),
             }
-            # First page
-            if pageNum == 1:
-                sqlite_master_name = DbFormatConfig.sqlite_master["tableName"]
-                this_page["pageMetadata"]["livingBtree"] = sqlite_master_name
             # Rightmost child for interior pages
             if page_type in (PageType.TABLE_INTERIOR, PageType.INDEX_INTERIOR):
                 r = rightmostChildPageNum  # Just for PEP8
                 assert r is not None
-                this_page["pageMetadata"]["rightmostChildPageNum"] = r
+                pageMetadata["rightmostChildPageNum"] = r
         else:
-            this_page["pageMetadata"] = {
+            pageMetadata = {
                 "pageType": PageType.UNCERTAIN,
             }
+        return pageMetadata
+
+    def _initial_living_btree(self, pageNum):
+        """
+        @return  livingBtree of b-tree page until _mapBtreeAndPage
+        """
+        # First page
+        if pageNum == 1:
+            return DbFormatConfig.sqlite_master["tableName"]
+        return DbFormatConfig.btreeHeaderFormat["uncertainLivingBtreeStr"]
 
     def _readCell(self, pageNum, cellOffset, pageType):
         if pageType == PageType.TABLE_LEAF:
@@ -465,27 +939,41 @@ class SQLiteAnalyzer(object):
                         overflowPageHead, payloadSize - payloadSizeInCell)
 
         cellInfo["cellSize"] = cellSize
-        self._dbinfo["pages"][pageNum]["cells"].append(cellInfo)
+        self._dbinfo["pages"].appendCell(pageNum, cellInfo)
+        if self._profiler.enabled:
+            self._countCell(pageNum, cellInfo, cellContents)
+
+    def _countCell(self, pageNum, cellInfo, cellContents):
+        """
+        @desc  Counts the cell and varints decoded to read it
+          (only when profiling, since record headers are decoded again)
+        """
+        self._profiler.count("cellsParsed")
+        if not self._profiler.countVarints:
+            return
+        nVarints = 0
+        for content in cellContents:
+            if content in (CellContent.PAYLOAD_SIZE, CellContent.RID):
+                nVarints += 1
+            elif content == CellContent.PAYLOAD:
+                # Record header size and serial types
+                nVarints += 1 + countRecordFields(
+                    self._get_page_data(pageNum),
+                    cellInfo["payload"]["offset"] +
+                    DbFormatConfig.payloadFormat["headerSizeOffset"])
+        self._profiler.count("varintsDecoded", nVarints)
 
     def _getLeftChildPageNumFromCell(self, pageNum, offset):
         leftChildPageNumLen = DbFormatConfig.cellFormat["leftChildPageNumLen"]
-        leftChildPageNumBinstr = self._get_page_data(pageNum)[
-            offset:
-            offset + leftChildPageNumLen]
-        leftChildPageNum = _binstr2int_bigendian(leftChildPageNumBinstr)
+        leftChildPageNum = unpackUint(
+            self._get_page_data(pageNum), offset, leftChildPageNumLen)
         return (leftChildPageNumLen, leftChildPageNum)
 
     def _getPayloadSizeFromCell(self, pageNum, offset):
-        payloadSizeVarint = self._get_page_data(pageNum)[
-            offset:
-            offset + DbFormatConfig.varintFormat["maxLen"]]
-        return _varint2int_bigendian(payloadSizeVarint)
+        return readVarint(self._get_page_data(pageNum), offset)
 
     def _getRidFromCell(self, pageNum, offset):
-        ridVarint = self._get_page_data(pageNum)[
-            offset:
-            offset + DbFormatConfig.varintFormat["maxLen"]]
-        return _varint2int_bigendian(ridVarint)
+        return readVarint(self._get_page_data(pageNum), offset)
 
     def _getPayloadFromCell(self, pageNum, offset):
         (headerSize, bodySize) = self._getWholePayloadSize(pageNum, offset)
@@ -495,58 +983,29 @@ class SQLiteAnalyzer(object):
     def _getOverflowPageHeadFromCell(self, pageNum, offset,
                                      payloadSize, payloadSizeInCell):
         overflowPageHeadLen = DbFormatConfig.cellFormat["overflowPageNumLen"]
-        overflowPageHeadBinstr = self._get_page_data(pageNum)[
-            offset:
-            offset + overflowPageHeadLen]
-        overflowPageHead = _binstr2int_bigendian(overflowPageHeadBinstr)
         if payloadSizeInCell >= payloadSize:  # No overflow page
             overflowPageHeadLen = 0
             overflowPageHead = None
         else:  # Has overflow page
+            overflowPageHead = unpackUint(
+                self._get_page_data(pageNum), offset, overflowPageHeadLen)
             nPages = self._dbinfo["dbMetadata"]["nPages"]
             assert 1 <= overflowPageHead <= nPages
         return (overflowPageHeadLen, overflowPageHead)
 
-    def _get_btree_header(self, btree_header_data):
+    def _get_btree_header(self, page_data, bth_offset):
         """
         @example
         (btree_header_flag,
         free_block_offset,
         n_cells,
         cell_content_area_offset,
-        rightmostChildPageNum) = self._get_btree_header(btree_header_data)
+        n_fragmented_bytes,
+        rightmostChildPageNum) = self._get_btree_header(page_data, bth_offset)
 
         @rightmostChildPageNum  Meaningless if not interior page
         """
-        btHFormat = DbFormatConfig.btreeHeaderFormat
-        bth_data = btree_header_data
-        btree_header_flag = _binstr2int_bigendian(
-            bth_data[
-                btHFormat["btreeFlagOffset"]:
-                btHFormat["btreeFlagOffset"] + btHFormat["btreeFlagLen"]])
-        free_block_offset = _binstr2int_bigendian(
-            bth_data[
-                btHFormat["freeBlockOffset"]:
-                btHFormat["freeBlockOffset"] + btHFormat["freeBlockLen"]])
-        n_cells = _binstr2int_bigendian(
-            bth_data[
-                btHFormat["nCellsOffset"]:
-                btHFormat["nCellsOffset"] + btHFormat["nCellsLen"]])
-        cell_content_area = _binstr2int_bigendian(
-            bth_data[
-                btHFormat["cellContentAreaOffset"]:
-                (btHFormat["cellContentAreaOffset"] +
-                 btHFormat["cellContentAreaLen"])])
-        rightmostChildPageNum = _binstr2int_bigendian(
-            bth_data[
-                btHFormat["rightmostChildPageNumOffset"]:
-                (btHFormat["rightmostChildPageNumOffset"] +
-                 btHFormat["rightmostChildPageNumLen"])])
-        return (btree_header_flag,
-                free_block_offset,
-                n_cells,
-                cell_content_area,
-                rightmostChildPageNum)
+        return unpackBtreeHeader(page_data, bth_offset)
 
     def _getPayloadSizeInCell(self, payloadWholeSize):
         """
@@ -574,97 +1033,114 @@ class SQLiteAnalyzer(object):
         @return
         (payloadHeaderSize, payloadBodySize)
         """
-        page_data = self._get_page_data(pageNum)
-        payloadData = page_data[payloadOffset:]
-
-        payloadFormat = DbFormatConfig.payloadFormat
-        varintMaxLen = DbFormatConfig.varintFormat["maxLen"]
-
-        # Read header size
-        headerSizeVarint = payloadData[
-            payloadFormat["headerSizeOffset"]:
-            payloadFormat["headerSizeOffset"] + varintMaxLen]
-        (headerSizeLen, headerSize) = _varint2int_bigendian(headerSizeVarint)
-
-        # Read serial type in header and calculate bodySize
-        bodySize = 0
-        stypeOffset = headerSizeLen
-        while stypeOffset < headerSize:
-            stypeVarint = payloadData[stypeOffset:
-                                       stypeOffset + varintMaxLen]
-            (stypeLen, stype) = _varint2int_bigendian(stypeVarint)
-            bodySize += DbFormatConfig.serialType2ContentSize(stype)
-            stypeOffset += stypeLen
-
-        return headerSize, bodySize
+        return readRecordSizes(
+            self._get_page_data(pageNum),
+            payloadOffset + DbFormatConfig.payloadFormat["headerSizeOffset"])
 
     def _read_overflow_pages(self, pageNum, rem_len):
-        assert 1 <= pageNum <= self._dbinfo["dbMetadata"]["nPages"]
-
-        # Read for the first time
-        if not pageNum in self._dbinfo["pages"]:
-            self._dbinfo["pages"][pageNum] = {
-                "pageMetadata": {
-                    "pageType": PageType.OVERFLOW,
-                    "nCells": 1,
-                },
-                "cells": []
-            }
-            self._dbinfo["pages"][pageNum]["foobar"] = "ssss"
-
-        thisPage = self._dbinfo["pages"][pageNum]
-
-        page_data = self._get_page_data(pageNum)
-
-        # Read next overflow page num
+        """
+        @desc  Walks the overflow chain starting from pageNum.
+          A corrupt chain looping back to one of its pages is reported
+          and the walk stops there.
+        """
         ovflwPgFormat = DbFormatConfig.overflowPageFormat
-        next_ovflw_pg_binstr = page_data[
-            ovflwPgFormat["nextOverflowPageOffset"]:
-            (ovflwPgFormat["nextOverflowPageOffset"] +
-             ovflwPgFormat["nextOverflowPageLen"])]
-        next_ovflw_pg = _binstr2int_bigendian(next_ovflw_pg_binstr)
-        assert 0 <= next_ovflw_pg <= self._dbinfo["dbMetadata"]["nPages"]
-        thisPage["pageMetadata"]["nextOverflowPageNum"] = next_ovflw_pg
-
-        cell_size = None
         cell_area_len = (self._dbinfo["dbMetadata"]["usablePageSize"] -
                          ovflwPgFormat["nextOverflowPageLen"])
+        pages = self._dbinfo["pages"]
+        visited = set()
+
+        while True:
+            assert 1 <= pageNum <= self._dbinfo["dbMetadata"]["nPages"]
+            if pageNum in visited:
+                _warn("Overflow chain cycles back to page#%d" % (pageNum))
+                return
+            visited.add(pageNum)
+            self._profiler.count("overflowPagesFollowed")
+
+            # Read for the first time
+            # (or only guessed by _read_page_metadata before this chain
+            #  reached it, or copied from previousDbinfo)
+            if (not pageNum in pages or
+                _is_heuristically_read_type(pages.getPageType(pageNum)) or
+                pageNum in self._reusedPageNums):
+                self._reusedPageNums.discard(pageNum)
+                pages[pageNum] = {
+                    "pageMetadata": {
+                        "pageType": PageType.OVERFLOW,
+                        "nCells": 1,
+                        "contentHash": self._page_hash(pageNum),
+                    },
+                    "cells": []
+                }
 
-        # This page is the last overflow page
-        if next_ovflw_pg == ovflwPgFormat["pageNumForFinal"]:
-            assert rem_len <= cell_area_len
-            cell_size = rem_len
-        # Other overflow pages follow
-        else:
-            cell_size = cell_area_len
-            self._read_overflow_pages(next_ovflw_pg, rem_len - cell_size)
-
-        thisPage["cells"].append({
-            "offset": (ovflwPgFormat["nextOverflowPageOffset"] +
-                       ovflwPgFormat["nextOverflowPageLen"]),
-            "cellSize": cell_size,
-            # TODO: parameters to specify what (record|index) (in btree)
-            #   this overflow page belongs to
-            #   ex: RID, index key
-        })
+            page_data = self._get_page_data(pageNum)
+
+            # Read next overflow page num
+            next_ovflw_pg = unpackUint(
+                page_data,
+                ovflwPgFormat["nextOverflowPageOffset"],
+                ovflwPgFormat["nextOverflowPageLen"])
+            assert 0 <= next_ovflw_pg <= self._dbinfo["dbMetadata"]["nPages"]
+            pages.setPageMetadata(pageNum, "nextOverflowPageNum",
+                                  next_ovflw_pg)
+
+            # This page is the last overflow page
+            if next_ovflw_pg == ovflwPgFormat["pageNumForFinal"]:
+                assert rem_len <= cell_area_len
+                cell_size = rem_len
+            # Other overflow pages follow
+            else:
+                cell_size = cell_area_len
+
+            pages.appendCell(pageNum, {
+                "offset": (ovflwPgFormat["nextOverflowPageOffset"] +
+                           ovflwPgFormat["nextOverflowPageLen"]),
+                "cellSize": cell_size,
+                # TODO: parameters to specify what (record|index) (in btree)
+                #   this overflow page belongs to
+                #   ex: RID, index key
+            })
+
+            if next_ovflw_pg == ovflwPgFormat["pageNumForFinal"]:
+                return
+            rem_len -= cell_size
+            pageNum = next_ovflw_pg
 
     def _summarize_dbinfo(self):
         self._checkDbinfoValidity()
         self._mapBtreeAndPage()
+        self._markWalPages()
 
     def _checkDbinfoValidity(self):
         dbMdata = self._dbinfo["dbMetadata"]
         for k, v in dbMdata.iteritems():
             if k not in ("freelistTrunkHead", "nFreelistPages",
-                         "freelistMapHead"):
+                         "freelistMapHead", "filterBtrees", "wal"):
                 assert v is not None
             pages = self._dbinfo["pages"]
-            assert len(pages) >= 1
+            # (No page is read if no btree matches filterBtrees)
+            assert (len(pages) >= 1 or len(self._filterBtrees) > 0 or
+                    self._onlyPages is not None)
 
     def _mapBtreeAndPage(self):
-        self._listBtrees()  # Set self._dbinfo["dbMetadata"]["btrees"]
+        # (Btrees are listed by _read_db before reading pages)
+        if (self._traverse or len(self._filterBtrees) > 0 or
+                self._onlyPages is not None):
+            return  # Already marked while reading pages
         self._markBtreePages()
 
+    def _markWalPages(self):
+        """
+        @desc  Gives "walFrame" to analyzed pages read from the WAL.
+          They are the pages a checkpoint would write to the DB file.
+        """
+        if self._walIndex is None:
+            return
+        pages = self._dbinfo["pages"]
+        for pageNum, frameNum in self._walIndex["pageFrames"].iteritems():
+            if pageNum in pages:
+                pages.setPageMetadata(pageNum, "walFrame", frameNum)
+
     def _addSqliteMasterToBtreeList(self):
         # Add sqlite_master btree info
         self._dbinfo["dbMetadata"]["btrees"].append({
@@ -675,43 +1151,57 @@ class SQLiteAnalyzer(object):
         })
 
     def _markBtreePages(self):
-        btrees = self._dbinfo["dbMetadata"]["btrees"]
-        for btreeDict in btrees:
+        for btreeDict in self._targetBtrees():
             self._markBtreePagesByTraversing(btreeDict)
 
-    def _markBtreePagesByTraversing(self, btreeDict):
-        self._markBtreePagesByTraversingRec(
-            btreeDict["rootPage"],
-            btreeDict["name"])
-
-    def _markBtreePagesByTraversingRec(self, pageNum, btreeName):
-        # Give name to this page
-        pageMetadata = self._dbinfo["pages"][pageNum]["pageMetadata"]
-        pageMetadata["livingBtree"] = btreeName
+    def _markBtreePagesByTraversing(self, btreeDict, readPages=False):
+        """
+        @desc  Gives btree name to every page of the btree.
+          Uses an explicit stack instead of recursion so that deep btrees
+          do not hit the recursion limit. A corrupt btree referring to
+          one of its pages twice is reported and the page is not
+          traversed again.
+
+        @param readPages  True to read each page when reached
+          (See _read_btree_pages)
+        """
+        btreeName = btreeDict["name"]
+        pages = self._dbinfo["pages"]
+        visited = set()
+        stack = [btreeDict["rootPage"]]
 
         # Traverse btree pages by depth-first order
-        pageType = pageMetadata["pageType"]
-        if pageType in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
-            return
-        assert pageType in (PageType.INDEX_INTERIOR, PageType.TABLE_INTERIOR)
-        cells = self._dbinfo["pages"][pageNum]["cells"]
-        for cell in cells:
-            self._markBtreePagesByTraversingRec(
-                cell["leftChildPage"], btreeName)
-        # Rightmost child
-        self._markBtreePagesByTraversingRec(
-            pageMetadata["rightmostChildPageNum"], btreeName)
+        while stack:
+            pageNum = stack.pop()
+            if pageNum in visited:
+                _warn("Btree '%s' refers to page#%d more than once" %
+                      (btreeName, pageNum))
+                continue
+            visited.add(pageNum)
+            if readPages:
+                self._read_page(pageNum)
+
+            # Give name to this page
+            pages.setPageMetadata(pageNum, "livingBtree", btreeName)
+
+            pageType = pages.getPageType(pageNum)
+            if pageType in (PageType.INDEX_LEAF, PageType.TABLE_LEAF):
+                continue
+            assert pageType in (PageType.INDEX_INTERIOR,
+                                PageType.TABLE_INTERIOR)
+            # Pushed in reverse to visit left children first,
+            # rightmost child last
+            stack.append(pages.getPageMetadata(pageNum,
+                                               "rightmostChildPageNum"))
+            stack.extend(reversed(list(
+                pages.iterCellValues(pageNum, "leftChildPage"))))
 
     def _listBtrees(self):
         """
-        @TODO
-        Support other database encoding
+        @desc  Reads rows of sqlite_master from page#1 btree by itself,
+          so the DB is never opened (nor locked) by SQLite library.
         """
-        conn = sqlite3.connect(self._dbpath)
-        cursor = conn.cursor()
-
         btrees = self._dbinfo["dbMetadata"]["btrees"]
-        cursor.execute("select * from sqlite_master")
         # sqlite_master format:
         # CREATE TABLE sqlite_master (
         #   type text,
@@ -719,9 +1209,11 @@ class SQLiteAnalyzer(object):
         #   tbl_name text,
         #   rootpage integer,
         #   sql text);
-        for row in cursor:
-            if int(row[3]) == 0:
+        for row in self._iterTableRecords(
+                DbFormatConfig.sqlite_master["rootPage"]):
+            if not row[3]:
                 # Assuming the btree is VIRTUAL TABLE
+                # (views and triggers also have rootpage=0)
                 # TODO: is it really OK to asume rootPage=0
                 # always mean VIRTUAL TABLE?
                 continue
@@ -732,11 +1224,211 @@ class SQLiteAnalyzer(object):
                 "rootPage": int(row[3]),
             })
 
-        cursor.close()
-        conn.close()
-
         self._addSqliteMasterToBtreeList()
 
+    def _iterTableRecords(self, rootPage):
+        """
+        @desc  Decodes records of table btree#rootPage in RID order,
+          straight from page data. Pages are not registered to dbinfo.
+          A page reached twice (corrupt file) is warned and ends records.
+
+        @return  Iterator of [value, ...] (See DbDecoder.decodeRecord)
+
+        >>> import os, sqlite3, struct, tempfile
+        >>> (fd, dbpath) = tempfile.mkstemp(); os.close(fd)
+        >>> conn = sqlite3.connect(dbpath)
+        >>> _ = conn.execute("PRAGMA page_size=512")
+        >>> for i in range(40):
+        ...     _ = conn.execute("CREATE TABLE long_table_name_%d (x)" % i)
+        >>> conn.close()
+        >>> # Rightmost child of sqlite_master root (page#1) refers to itself
+        >>> with open(dbpath, "r+b") as f_db:
+        ...     f_db.seek(100 + 8)
+        ...     f_db.write(struct.pack(">I", 1))
+        >>> sys.stderr = sys.stdout
+        >>> analyzer = SQLiteAnalyzer(dbpath)  # doctest: +ELLIPSIS
+        Warning: Table btree#1 refers to page#1 more than once
+        ...
+        >>> sys.stderr = sys.__stderr__
+        >>> 1 < len(analyzer.getDbinfo()["dbMetadata"]["btrees"]) < 41
+        True
+        >>> os.remove(dbpath)
+        """
+        btHFormat = DbFormatConfig.btreeHeaderFormat
+        CPAFormat = DbFormatConfig.cellPointerArrayFormat
+        visited = set()
+        stack = [rootPage]
+        while stack:
+            pageNum = stack.pop()
+            if pageNum in visited:
+                # (Corrupt file: records of the rest are not read,
+                # as _read_overflow_pages stops at a cycle)
+                _warn("Table btree#%d refers to page#%d more than once" %
+                      (rootPage, pageNum))
+                return
+            visited.add(pageNum)
+
+            page_data = self._get_page_data(pageNum)
+            bth_offset = (btHFormat["offsetInPage1"] if pageNum == 1
+                          else btHFormat["offsetInPage"])
+            (btree_header_flag, free_block_offset, n_cells,
+             cell_content_area_offset, n_fragmented_bytes,
+             rightmostChildPageNum) = self._get_btree_header(page_data,
+                                                             bth_offset)
+            page_type = _btree_header_flag_TO_PageType(btree_header_flag)
+            assert page_type in (PageType.TABLE_LEAF,
+                                 PageType.TABLE_INTERIOR), (
+                "page#%d of table btree#%d is %s" %
+                (pageNum, rootPage, page_type))
+
+            if page_type == PageType.TABLE_LEAF:
+                cell_offsets = unpackUint16Array(
+                    page_data, bth_offset + CPAFormat["offsetInLeafPage"],
+                    n_cells)
+                for cell_offset in cell_offsets:
+                    yield decodeRecord(
+                        self._getWholePayload(pageNum, cell_offset),
+                        textEncoding=self._textEncoding)
+            else:
+                cell_offsets = unpackUint16Array(
+                    page_data, bth_offset + CPAFormat["offsetInInteriorPage"],
+                    n_cells)
+                # Pushed in reverse to visit left children first,
+                # rightmost child last
+                stack.append(rightmostChildPageNum)
+                stack.extend(reversed([
+                    self._getLeftChildPageNumFromCell(pageNum, offset)[1]
+                    for offset in cell_offsets]))
+
+    def _getWholePayload(self, pageNum, cellOffset):
+        """
+        @desc  Payload of a table leaf cell, joined with the part in its
+          overflow pages
+
+        @return  Payload bytes
+        """
+        page_data = self._get_page_data(pageNum)
+        (payloadSizeLen, payloadSize) = self._getPayloadSizeFromCell(
+            pageNum, cellOffset)
+        (ridLen, rid) = self._getRidFromCell(
+            pageNum, cellOffset + payloadSizeLen)
+        offset = cellOffset + payloadSizeLen + ridLen
+        payloadSizeInCell = self._getPayloadSizeInCell(payloadSize)
+        chunks = [page_data[offset:offset + payloadSizeInCell]]
+        remLen = payloadSize - payloadSizeInCell
+
+        ovflwPgFormat = DbFormatConfig.overflowPageFormat
+        contentOffset = (ovflwPgFormat["nextOverflowPageOffset"] +
+                         ovflwPgFormat["nextOverflowPageLen"])
+        contentLen = (self._dbinfo["dbMetadata"]["usablePageSize"] -
+                      contentOffset)
+        (overflowPageHeadLen,
+         ovflwPageNum) = self._getOverflowPageHeadFromCell(
+            pageNum, offset + payloadSizeInCell,
+            payloadSize, payloadSizeInCell)
+        while remLen > 0:
+            assert ovflwPageNum != ovflwPgFormat["pageNumForFinal"]
+            ovflwPageData = self._get_page_data(ovflwPageNum)
+            chunkLen = min(remLen, contentLen)
+            chunks.append(ovflwPageData[contentOffset:
+                                        contentOffset + chunkLen])
+            remLen -= chunkLen
+            ovflwPageNum = unpackUint(
+                ovflwPageData,
+                ovflwPgFormat["nextOverflowPageOffset"],
+                ovflwPgFormat["nextOverflowPageLen"])
+        return b"".join(bytes(chunk) for chunk in chunks)
+
+
+def _read_page_range_worker(args):
+    """
+    @desc  Process pool entry point of SQLiteAnalyzer._read_page_range_parallel
+
+    @return  (pages read in the range (and overflow pages reached from them),
+              numbers of unchanged pages (See _read_changed_pages) or [],
+              counters of the worker if profiling, or {})
+    """
+    (dbpath, preallocDb, walIndex, dbMetadata, freelistPages,
+     firstPage, lastPage, prevHashes, profile, countVarints) = args
+    analyzer = SQLiteAnalyzer.__new__(SQLiteAnalyzer)
+    analyzer._open(dbpath, preallocDb)
+    if walIndex is not None:  # (Not parsed again)
+        analyzer._pageSource.overlayWal(walIndex)
+    if profile:
+        analyzer._profiler = Profiler(countVarints=countVarints)
+        analyzer._pageSource.trackReads()
+    try:
+        analyzer._dbinfo["dbMetadata"] = dbMetadata
+        analyzer._dbinfo["pages"].update(freelistPages)
+        analyzer._pageSource.setPageSize(dbMetadata["pageSize"])
+        if prevHashes is None:
+            analyzer._read_page_range(firstPage, lastPage)
+            unchangedPageNums = []
+        else:
+            unchangedPageNums = analyzer._read_changed_pages(
+                firstPage, lastPage, prevHashes)
+    finally:
+        if profile:
+            analyzer._countPageSourceReads()
+        analyzer._pageSource.close()
+    pages = dict((pageNum, page)
+                 for pageNum, page in analyzer._dbinfo["pages"].iteritems()
+                 if pageNum not in freelistPages)
+    counters = {}
+    if profile:
+        counters = analyzer._profiler.getReport()["counters"]
+    return (pages, unchangedPageNums, counters)
+
+
+def _warn(message):
+    sys.stderr.write("Warning: %s\n" % (message))
+
+
+def _is_heuristically_read(page):
+    """
+    @return  True if the page type of `page' was guessed by
+      SQLiteAnalyzer._read_page_metadata
+    """
+    return _is_heuristically_read_type(page["pageMetadata"]["pageType"])
+
+
+def _is_heuristically_read_type(pageType):
+    return pageType in (
+        PageType.INDEX_LEAF, PageType.INDEX_INTERIOR,
+        PageType.TABLE_LEAF, PageType.TABLE_INTERIOR,
+        PageType.UNCERTAIN)
+
+
+def _is_content_derived(page):
+    """
+    @return  True if `page' was analyzed only from its own content
+      and the cells pointing to it, which is the case for pages
+      other than freelist pages
+    """
+    return (_is_heuristically_read(page) or
+            page["pageMetadata"]["pageType"] == PageType.OVERFLOW)
+
+
+def _lacks_free_space(page):
+    """
+    @return  True if `page' is a b-tree page analyzed without free space
+      (ex: previousDbinfo written by an older version)
+    """
+    return (page["pageMetadata"]["pageType"] != PageType.UNCERTAIN and
+            _is_heuristically_read(page) and
+            "nFreeBlockBytes" not in page["pageMetadata"])
+
+
+def _get_page(pages, pageNum):
+    """
+    @return  page#pageNum of either int keyed pages (SQLiteAnalyzer)
+      or str keyed ones (loaded from JSON), or None
+    """
+    page = pages.get(pageNum)
+    if page is None:
+        page = pages.get(str(pageNum))
+    return page
+
 
 def _btree_header_flag_TO_PageType(btree_header_flag):
     """
@@ -763,58 +1455,6 @@ def _print_intlist_in_hex(intlist):
     print [hex(i) for i in intlist]
 
 
-def _binstr2int_bigendian(binstr):
-    """
-    >>> s = chr(int('00000001', 2)) + chr(int('00000001', 2))
-    >>> _binstr2int_bigendian(s)
-    257
-    """
-    ret = 0
-    rev_byte_list = reversed(binstr)
-    for n_dig, byte in enumerate(rev_byte_list):
-        ret += ord(byte) * pow(256, n_dig)
-    return ret
-
-
-def _varint2int_bigendian(binstr):
-    """
-    @note
-    See varint format (very simple):
-    http://www.sqlite.org/fileformat2.html - 'A variable-length integer ...'
-
-    @return
-    (VarintLength, effNumber)
-
-    >>> s = chr(int('10000001', 2)) + chr(int('00101001', 2))
-    >>> _varint2int_bigendian(s)
-    (2, 169)
-    >>> s = chr(int('10000001', 2)) + chr(int('00000001', 2))
-    >>> _varint2int_bigendian(s)
-    (2, 129)
-    >>> s = chr(int('10000000', 2)) + chr(int('10000000', 2)) + \
-            chr(int('10000000', 2)) +  chr(int('10000000', 2)) + \
-            chr(int('10000000', 2)) +  chr(int('10000000', 2)) + \
-            chr(int('10000000', 2)) +  chr(int('10000000', 2)) + \
-            chr(int('10000000', 2))
-    >>> _varint2int_bigendian(s)
-    (9, 128)
-    """
-    s01 = ""
-    i = 0
-    for i, c in enumerate(binstr):
-        byte = ord(c)
-        if i == DbFormatConfig.varintFormat["maxLen"] - 1:
-            s01 += "%08s" % (bin(byte)[2:])
-        else:
-            eff7bit = int("01111111", 2) & byte
-            s01 += "%07s" % (bin(eff7bit)[2:])
-            msb = (byte & int("10000000", 2)) >> 7
-            if msb == 0:
-                break
-    s01 = s01.replace(' ', '0')
-    return (i + 1, int(s01, 2))
-
-
 def _getSqliteString(data):
     # TODO: Support non UTF-8 data
     return data
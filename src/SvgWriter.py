@@ -0,0 +1,100 @@
+from xml.sax.saxutils import escape, quoteattr
+
+
+class SvgWriter(object):
+    """
+    @desc  Writes SVG elements straight to a file as they are drawn.
+      Nothing but the file buffer is kept in memory, so drawing any number
+      of elements takes constant memory.
+
+    @param fileObj  File opened in binary mode
+    @param width, height  Size of the image, or None to leave it to viewers
+
+    Numbers of elements and bytes written so far are in
+    nElements and bytesWritten.
+
+    @usage
+    with open('/path/to/out.svg', 'wb') as f_svg:
+        writer = SvgWriter(f_svg)
+        writer.rect(0, 0, 10, 10, fill='Pink')
+        writer.text('T0', 12, 8, fontSize=6)
+        writer.close()
+
+    >>> import StringIO
+    >>> f = StringIO.StringIO()
+    >>> writer = SvgWriter(f)
+    >>> writer.rect(1, 2, 3, 4, fill='Pink', stroke='#000000')
+    >>> writer.polygon([(0, 0), (2, 0), (1, 1)], fill='Pink')
+    >>> writer.text('<T0>', 5, 6, fontSize=6)
+    >>> writer.close()
+    >>> (writer.nElements, writer.bytesWritten == len(f.getvalue()))
+    (3, True)
+    >>> print f.getvalue()
+    <?xml version="1.0" encoding="utf-8" standalone="no"?>
+    <svg xmlns="http://www.w3.org/2000/svg" version="1.1">
+    <rect x="1" y="2" width="3" height="4" style="fill:Pink;stroke:#000000;stroke-width:1"/>
+    <polygon points="0,0 2,0 1,1" style="fill:Pink;stroke:black;stroke-width:1"/>
+    <text x="5" y="6" font-size="6">&lt;T0&gt;</text>
+    </svg>
+    <BLANKLINE>
+    """
+    def __init__(self, fileObj, encoding="utf-8", width=None, height=None):
+        self._f = fileObj
+        self._encoding = encoding
+        self.nElements = 0
+        self.bytesWritten = 0
+        size = ""
+        if width is not None and height is not None:
+            size = ' width="%s" height="%s"' % (width, height)
+        self._write(
+            '<?xml version="1.0" encoding="%s" standalone="no"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" version="1.1"%s>\n' %
+            (encoding, size))
+
+    def rect(self, x, y, width, height,
+             fill="none", stroke="black", strokeWidth=1):
+        """
+        @desc  Defaults are the same as pysvg.builders.ShapeBuilder.createRect
+        """
+        self.nElements += 1
+        self._write(
+            '<rect x="%s" y="%s" width="%s" height="%s" '
+            'style="fill:%s;stroke:%s;stroke-width:%s"/>\n' %
+            (x, y, width, height, fill, stroke, strokeWidth))
+
+    def polygon(self, points,
+                fill="none", stroke="black", strokeWidth=1):
+        """
+        @param points  [(x, y), ...]
+        """
+        self.nElements += 1
+        self._write(
+            '<polygon points="%s" '
+            'style="fill:%s;stroke:%s;stroke-width:%s"/>\n' %
+            (" ".join("%s,%s" % point for point in points),
+             fill, stroke, strokeWidth))
+
+    def text(self, s, x, y, fontSize):
+        self.nElements += 1
+        self._write('<text x="%s" y="%s" font-size=%s>%s</text>\n' %
+                    (x, y, quoteattr(str(fontSize)), escape(s)))
+
+    def close(self):
+        """
+        @desc  Closes the svg element. The file itself is left open.
+        """
+        self._write("</svg>\n")
+
+    def _write(self, s):
+        if not isinstance(s, bytes):
+            s = s.encode(self._encoding)
+        self.bytesWritten += len(s)
+        self._f.write(s)
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
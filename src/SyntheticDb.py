@@ -0,0 +1,174 @@
+import DbFormatConfig
+from DbDecoder import unpackUint, unpackPageSize, unpackUint32Array
+import os
+import random
+import sqlite3
+import struct
+
+
+def createSyntheticDb(path,
+                      pageSize=1024,
+                      nTables=2,
+                      nIndexesPerTable=1,
+                      nRows=1000,
+                      blobSize=100,
+                      deleteRatio=0.0,
+                      prealloc=False,
+                      seed=0):
+    """
+    @desc  Creates a SQLite DB of the given shape for benchmarks.
+      The same parameters always give the same DB.
+      - Rows are inserted into tables in turn, so pages of tables
+        (and indexes) interleave.
+      - A row has a BLOB of about blobSize bytes. Larger BLOBs than
+        a page makes overflow chains.
+      - deleteRatio of rows are deleted at random at the end, leaving
+        freelist pages and half-empty pages (fragmentation).
+      - If prealloc, the freelist is rewritten in the layout of
+        prealloc SQLite: free pages are handed to btrees in turn
+        and listed in a freelist map page (See
+        SQLiteAnalyzer._get_freelist_trunk_heads_from_map).
+        Then the DB must be analyzed with preallocDb=True,
+        and it is not for SQLite library any more.
+
+    @param nRows  Number of rows in each table
+    """
+    assert nTables >= 1 and nRows >= 0 and blobSize >= 0
+    assert 0.0 <= deleteRatio <= 1.0
+    assert not os.path.exists(path)
+    rand = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA page_size = %d" % (pageSize))
+    conn.execute("PRAGMA auto_vacuum = NONE")
+
+    # BLOBs are slices of it (generating each byte is too slow)
+    blobPool = bytes(bytearray(rand.getrandbits(8)
+                               for i in range(max(blobSize, 1) * 2)))
+
+    tableNames = ["T%d" % (i) for i in range(nTables)]
+    for tableName in tableNames:
+        conn.execute("CREATE TABLE %s (id INTEGER PRIMARY KEY, "
+                     "num INTEGER, str TEXT, data BLOB)" % (tableName))
+        for iIndex in range(nIndexesPerTable):
+            column = ("num", "str")[iIndex % 2]
+            conn.execute("CREATE INDEX %s_idx%d ON %s (%s)" %
+                         (tableName, iIndex, tableName, column))
+
+    for iRow in range(nRows):
+        for tableName in tableNames:
+            size = rand.randint(blobSize / 2, blobSize)
+            offset = rand.randint(0, len(blobPool) - size)
+            conn.execute(
+                "INSERT INTO %s (num, str, data) VALUES (?, ?, ?)" %
+                (tableName),
+                (rand.randint(0, 1 << 30), "s%08x" % (rand.getrandbits(32)),
+                 sqlite3.Binary(blobPool[offset:offset + size])))
+    conn.commit()
+
+    if deleteRatio > 0.0:
+        for tableName in tableNames:
+            rids = range(1, nRows + 1)
+            rand.shuffle(rids)
+            conn.executemany(
+                "DELETE FROM %s WHERE id = ?" % (tableName),
+                [(rid, ) for rid in rids[:int(nRows * deleteRatio)]])
+        conn.commit()
+
+    rootPages = [row[0] for row in conn.execute(
+        "SELECT rootpage FROM sqlite_master WHERE rootpage > 0 "
+        "ORDER BY rootpage")]
+    conn.close()
+
+    if prealloc:
+        _rewriteFreelistForPrealloc(path, rootPages)
+
+
+def _rewriteFreelistForPrealloc(path, rootPages):
+    """
+    @desc  Turns the freelist of a normal SQLite DB into a freelist map
+      page and per-btree freelist trunk chains of prealloc SQLite.
+      One of the free pages becomes the map page.
+    """
+    hFormat = DbFormatConfig.dbHeaderFormat
+    trunkFormat = DbFormatConfig.freelistTrunkPageFormat
+    with open(path, "r+b") as f_db:
+        header = f_db.read(hFormat["len"])
+        pageSize = unpackPageSize(header)
+        usableSize = pageSize - unpackUint(
+            header, hFormat["reservedSpaceOffset"],
+            hFormat["reservedSpaceLen"])
+
+        def readPage(pageNum):
+            f_db.seek((pageNum - 1) * pageSize)
+            return f_db.read(pageSize)
+
+        def writePage(pageNum, data):
+            assert len(data) <= pageSize
+            f_db.seek((pageNum - 1) * pageSize)
+            f_db.write(data + b"\x00" * (pageSize - len(data)))
+
+        # Every page in the current freelist (trunks and leaves)
+        freePages = []
+        trunk = unpackUint(header, hFormat["freelistTrunkHeadOffset"],
+                           hFormat["freelistTrunkHeadLen"])
+        while trunk > 0:
+            data = readPage(trunk)
+            nLeaves = unpackUint(data, trunkFormat["nLeavesOffset"],
+                                 trunkFormat["nLeavesLen"])
+            freePages.append(trunk)
+            freePages.extend(unpackUint32Array(
+                data, trunkFormat["firstLeafPageNumOffset"], nLeaves))
+            trunk = unpackUint(data, trunkFormat["nextTrunkPageOffset"],
+                               trunkFormat["nextTrunkPageLen"])
+        if len(freePages) == 0:
+            return  # No freelist map without free pages
+        freePages.sort()
+
+        # Same layout as SQLiteAnalyzer._get_freelist_trunk_heads_from_map
+        lenFreelistMapHead = 8
+        lenFreelistMapKey = 4
+        lenFreelistMapVal = 12
+        nMaxTrunk = ((pageSize - lenFreelistMapHead) /
+                     (lenFreelistMapVal + lenFreelistMapKey))
+        rootPages = rootPages[:nMaxTrunk]
+        mapPage = freePages.pop(0)
+        btreeFreePages = [freePages[i::len(rootPages)]
+                          for i in range(len(rootPages))]
+
+        # Trunk chains: each trunk page holds as many leaves as it can
+        nMaxLeaves = usableSize / trunkFormat["leafPageNumLen"] - 2
+        trunkHeads = []
+        for pages in btreeFreePages:
+            head = 0
+            # Built from the tail so that each trunk knows the next one
+            chunks = [pages[i:i + nMaxLeaves + 1]
+                      for i in range(0, len(pages), nMaxLeaves + 1)]
+            for chunk in reversed(chunks):
+                leaves = chunk[1:]
+                writePage(chunk[0], struct.pack(
+                    ">II%dI" % (len(leaves)), head, len(leaves), *leaves))
+                head = chunk[0]
+            trunkHeads.append(head)
+
+        mapData = bytearray(pageSize)
+        struct.pack_into(">II", mapData, 0, 0, len(rootPages))
+        struct.pack_into(">%dI" % (len(rootPages)), mapData,
+                         lenFreelistMapHead, *rootPages)
+        for i, head in enumerate(trunkHeads):
+            struct.pack_into(">I", mapData,
+                             lenFreelistMapHead +
+                             lenFreelistMapKey * nMaxTrunk +
+                             lenFreelistMapVal * i,
+                             head)
+        writePage(mapPage, bytes(mapData))
+
+        f_db.seek(hFormat["freelistMapHeadOffset"])
+        f_db.write(struct.pack(">I", mapPage))
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,175 @@
+# Index of committed frames in the write-ahead log of a WAL mode database.
+# See: http://www.sqlite.org/fileformat2.html - The Write-Ahead Log
+import DbFormatConfig
+import mmap
+import os
+import struct
+
+
+_walHeaderStruct = struct.Struct(
+    DbFormatConfig.walHeaderFormat["structFormat"])
+_frameHeaderStruct = struct.Struct(
+    DbFormatConfig.walFrameHeaderFormat["structFormat"])
+
+
+def getWalPath(dbpath):
+    return dbpath + DbFormatConfig.walHeaderFormat["suffix"]
+
+
+def readWalIndex(walPath):
+    """
+    @desc  Validates frames of a WAL file as SQLite does when it recovers
+      the WAL: frames are valid while their salts are the same as in the
+      WAL header and their cumulative checksums match.
+      Only frames up to the last valid commit frame are indexed; the rest
+      are uncommitted (or left by an older generation of the WAL).
+      The database is never opened nor locked by SQLite library, so the
+      WAL header or frames may change while they are read on a busy
+      database like the database file itself.
+
+    @return  None if walPath has no valid header or no committed frame.
+      Otherwise picklable index (ex: for SQLiteAnalyzer jobs):
+      {"path": walPath,
+       "pageSize": ...,
+       "nPages": database size in pages after the last commit,
+       "nFrames": number of committed frames,
+       "checkpointSequence": ...,
+       "pageFrames": {pageNum: latest committed frame# (1-origin), ...}}
+
+    >>> import tempfile
+    >>> f = tempfile.NamedTemporaryFile()
+    >>> header = _packWalHeader(pageSize=512, salts=(1, 2))
+    >>> (s0, s1) = header[1]
+    >>> frames = b""
+    >>> for (pageNum, dbSize) in ((2, 0), (3, 3), (2, 3), (4, 0)):
+    ...     (frame, s0, s1) = _packFrame(pageNum, dbSize, (1, 2), s0, s1,
+    ...                                  b"%d" % pageNum * 512)
+    ...     frames += frame
+    >>> _ = f.write(header[0] + frames); f.flush()
+    >>> walIndex = readWalIndex(f.name)
+    >>> (walIndex["nPages"], walIndex["nFrames"], walIndex["pageFrames"])
+    (3, 3, {2: 3, 3: 2})
+    >>> readWalIndex(f.name + ".nonexistent") is None
+    True
+    """
+    if not os.path.exists(walPath):
+        return None
+    with open(walPath, "rb") as f_wal:
+        f_wal.seek(0, 2)
+        if f_wal.tell() < DbFormatConfig.walHeaderFormat["len"]:
+            return None
+        data = mmap.mmap(f_wal.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _readWalIndex(walPath, data)
+    finally:
+        data.close()
+
+
+def getWalFrameOffset(walIndex, frameNum):
+    """
+    @return  Offset of the page image of frame#frameNum in the WAL file
+
+    >>> getWalFrameOffset({"pageSize": 1024}, 2)
+    1104
+    """
+    frameLen = (DbFormatConfig.walFrameHeaderFormat["len"] +
+                walIndex["pageSize"])
+    return (DbFormatConfig.walHeaderFormat["len"] +
+            frameLen * (frameNum - 1) +
+            DbFormatConfig.walFrameHeaderFormat["len"])
+
+
+def _readWalIndex(walPath, data):
+    hFormat = DbFormatConfig.walHeaderFormat
+    fhFormat = DbFormatConfig.walFrameHeaderFormat
+    (magic, formatVersion, pageSize, checkpointSequence,
+     salt1, salt2, checksum1, checksum2) = _walHeaderStruct.unpack_from(data, 0)
+    if (magic not in (hFormat["magicLittleEndian"], hFormat["magicBigEndian"])
+        or formatVersion != hFormat["formatVersion"]):
+        return None
+    wordFormat = ">" if magic == hFormat["magicBigEndian"] else "<"
+    (s0, s1) = _checksum(data, 0, hFormat["checksumCoveredLen"],
+                         wordFormat, 0, 0)
+    if ((s0, s1) != (checksum1, checksum2) or
+        pageSize < 512 or pageSize & (pageSize - 1) != 0):
+        return None
+
+    walIndex = {
+        "path": walPath,
+        "pageSize": pageSize,
+        "nPages": None,
+        "nFrames": 0,
+        "checkpointSequence": checkpointSequence,
+        "pageFrames": {},
+    }
+    frameLen = fhFormat["len"] + pageSize
+    pendingFrames = {}  # Frames of the transaction not committed yet
+    frameNum = 0
+    offset = hFormat["len"]
+    while offset + frameLen <= len(data):
+        (pageNum, dbSize, frameSalt1, frameSalt2,
+         checksum1, checksum2) = _frameHeaderStruct.unpack_from(data, offset)
+        if (frameSalt1, frameSalt2) != (salt1, salt2) or pageNum == 0:
+            break
+        (s0, s1) = _checksum(data, offset, fhFormat["checksumCoveredLen"],
+                             wordFormat, s0, s1)
+        (s0, s1) = _checksum(data, offset + fhFormat["len"], pageSize,
+                             wordFormat, s0, s1)
+        if (s0, s1) != (checksum1, checksum2):
+            break
+        frameNum += 1
+        pendingFrames[pageNum] = frameNum
+        if dbSize != 0:  # Commit frame
+            walIndex["pageFrames"].update(pendingFrames)
+            pendingFrames = {}
+            walIndex["nPages"] = dbSize
+            walIndex["nFrames"] = frameNum
+        offset += frameLen
+
+    if walIndex["nFrames"] == 0:
+        return None
+    return walIndex
+
+
+def _checksum(data, offset, length, wordFormat, s0, s1):
+    """
+    @desc  Continues the cumulative WAL checksum (s0, s1) over
+      data[offset:offset + length] (length is a multiple of 8)
+    """
+    words = struct.unpack_from("%s%dI" % (wordFormat, length / 4),
+                               data, offset)
+    for i in xrange(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xffffffff
+        s1 = (s1 + words[i + 1] + s0) & 0xffffffff
+    return (s0, s1)
+
+
+def _packWalHeader(pageSize, salts, checkpointSequence=0):
+    """
+    @return  (WAL header with big-endian checksums, its checksum)
+      (For tests)
+    """
+    hFormat = DbFormatConfig.walHeaderFormat
+    header = struct.pack(">IIIIII", hFormat["magicBigEndian"],
+                         hFormat["formatVersion"], pageSize,
+                         checkpointSequence, salts[0], salts[1])
+    checksum = _checksum(header, 0, len(header), ">", 0, 0)
+    return (header + struct.pack(">II", *checksum), checksum)
+
+
+def _packFrame(pageNum, dbSize, salts, s0, s1, pageData):
+    """
+    @return  (frame, checksum after it) (For tests)
+    """
+    header = struct.pack(">IIII", pageNum, dbSize, salts[0], salts[1])
+    (s0, s1) = _checksum(header, 0, 8, ">", s0, s1)
+    (s0, s1) = _checksum(pageData, 0, len(pageData), ">", s0, s1)
+    return (header + struct.pack(">II", s0, s1) + pageData, s0, s1)
+
+
+def _test():
+    import doctest
+    doctest.testmod()
+
+if __name__ == '__main__':
+    _test()